@@ -15,8 +15,9 @@ export function initSocket() {
     reconnectionAttempts: 5,
   })
   socket.on('refetch_resource', (data) => {
-    if (data.cache_key) {
-      let resource = getCachedResource(data.cache_key) || getCachedListResource(data.cache_key)
+    let cacheKeys = data.cache_keys || (data.cache_key ? [data.cache_key] : [])
+    for (let cacheKey of cacheKeys) {
+      let resource = getCachedResource(cacheKey) || getCachedListResource(cacheKey)
       if (resource) {
         resource.reload()
       }
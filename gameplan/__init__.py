@@ -3,10 +3,11 @@ import frappe
 __version__ = "0.0.1"
 
 
-def is_guest():
-    if frappe.session.user == "Administrator":
+def is_guest(user=None):
+    user = user or frappe.session.user
+    if user == "Administrator":
         return False
-    roles = frappe.get_roles()
+    roles = frappe.get_roles(user)
     if "Gameplan Member" in roles or "Gameplan Admin" in roles:
         return False
     return "Gameplan Guest" in roles
@@ -19,3 +20,13 @@ def refetch_resource(cache_key: str | list, user=None):
         user=user or frappe.session.user,
         after_commit=True,
     )
+
+
+def refetch_resources(cache_keys: list, user=None):
+    """Refetch several resources with one event"""
+    frappe.publish_realtime(
+        "refetch_resource",
+        {"cache_keys": cache_keys},
+        user=user or frappe.session.user,
+        after_commit=True,
+    )
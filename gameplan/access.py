@@ -0,0 +1,140 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+
+import hashlib
+
+import frappe
+from frappe.utils import cstr
+from pypika.terms import ExistsCriterion
+
+import gameplan
+
+ACCESSIBLE_PROJECTS_KEY = "gameplan:accessible_projects"
+ACCESSIBLE_TEAMS_KEY = "gameplan:accessible_teams"
+VISIBILITY_TAGS_KEY = "gameplan:visibility_tags"
+PROJECT_TEAMS_KEY = "gameplan:project_teams"
+
+PUBLIC = "public"
+
+
+def get_accessible_projects(user=None):
+	"""Names of the projects `user` can read, cached per user"""
+	user = user or frappe.session.user
+	return frappe.cache().hget(
+		ACCESSIBLE_PROJECTS_KEY, user, generator=lambda: _get_accessible_projects(user)
+	)
+
+
+def get_accessible_teams(user=None):
+	"""Names of the teams `user` can read, cached per user"""
+	user = user or frappe.session.user
+	return frappe.cache().hget(ACCESSIBLE_TEAMS_KEY, user, generator=lambda: _get_accessible_teams(user))
+
+
+def get_visibility_tags(user=None):
+	"""Visibility tags (see `get_visibility_tag`) of the documents `user` can read, cached per user.
+	Empty for guests, whose access is granted per project."""
+	user = user or frappe.session.user
+	return frappe.cache().hget(VISIBILITY_TAGS_KEY, user, generator=lambda: _get_visibility_tags(user))
+
+
+def get_visibility_tag(is_private, team):
+	"""Who can read the documents of a project: everyone but guests for public projects, members of
+	its team for private ones. Tags of private projects are a digest of the team, so that they need
+	no escaping in search queries."""
+	if not is_private:
+		return PUBLIC
+	return f"team_{hashlib.sha1(cstr(team).encode()).hexdigest()[:16]}"
+
+
+def get_project_teams():
+	"""Map of every project to its team, cached for everyone"""
+	return frappe.cache().get_value(
+		PROJECT_TEAMS_KEY,
+		generator=lambda: {
+			cstr(p.name): p.team for p in frappe.db.get_all("GP Project", fields=["name", "team"])
+		},
+	)
+
+
+def clear_access_cache(user=None):
+	"""Clear cached access for `user`, or for everyone if no user is passed"""
+	if user:
+		frappe.cache().hdel(ACCESSIBLE_PROJECTS_KEY, user)
+		frappe.cache().hdel(ACCESSIBLE_TEAMS_KEY, user)
+		frappe.cache().hdel(VISIBILITY_TAGS_KEY, user)
+	else:
+		frappe.cache().delete_value(
+			[ACCESSIBLE_PROJECTS_KEY, ACCESSIBLE_TEAMS_KEY, VISIBILITY_TAGS_KEY, PROJECT_TEAMS_KEY]
+		)
+
+
+def on_user_update(doc, method=None):
+	# roles decide whether the user is a guest
+	clear_access_cache(doc.name)
+
+
+def _get_accessible_projects(user):
+	if gameplan.is_guest(user):
+		return _get_guest_access(user, "project")
+
+	Project = frappe.qb.DocType("GP Project")
+	Member = frappe.qb.DocType("GP Member")
+	member_exists = (
+		frappe.qb.from_(Member)
+		.select(Member.name)
+		.where(Member.parenttype == "GP Team")
+		.where(Member.parent == Project.team)
+		.where(Member.user == user)
+	)
+	query = (
+		frappe.qb.from_(Project)
+		.select(Project.name)
+		.distinct()
+		.where((Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists)))
+	)
+	return [cstr(p) for p in query.run(pluck=True)]
+
+
+def _get_accessible_teams(user):
+	if gameplan.is_guest(user):
+		return _get_guest_access(user, "team")
+
+	Team = frappe.qb.DocType("GP Team")
+	Member = frappe.qb.DocType("GP Member")
+	member_exists = (
+		frappe.qb.from_(Member)
+		.select(Member.name)
+		.where(Member.parenttype == "GP Team")
+		.where(Member.parent == Team.name)
+		.where(Member.user == user)
+	)
+	query = (
+		frappe.qb.from_(Team)
+		.select(Team.name)
+		.where((Team.is_private == 0) | ((Team.is_private == 1) & ExistsCriterion(member_exists)))
+	)
+	return [cstr(t) for t in query.run(pluck=True)]
+
+
+def _get_guest_access(user, field):
+	"""Projects or teams, by `field`, that guest `user` was given access to, private or not"""
+	GuestAccess = frappe.qb.DocType("GP Guest Access")
+	query = (
+		frappe.qb.from_(GuestAccess)
+		.select(GuestAccess[field])
+		.distinct()
+		.where(GuestAccess.user == user)
+		.where(GuestAccess[field].isnotnull())
+	)
+	return [cstr(name) for name in query.run(pluck=True)]
+
+
+def _get_visibility_tags(user):
+	if gameplan.is_guest(user):
+		return []
+	teams = frappe.db.get_all(
+		"GP Member", filters={"parenttype": "GP Team", "user": user}, pluck="parent", distinct=True
+	)
+	return [PUBLIC, *(get_visibility_tag(True, team) for team in teams)]
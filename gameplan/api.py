@@ -4,7 +4,7 @@
 
 import frappe
 from frappe.translate import get_all_translations
-from frappe.utils import cstr, split_emails, validate_email_address
+from frappe.utils import cint, split_emails, validate_email_address
 from frappe import _
 
 import gameplan
@@ -199,85 +199,34 @@ def get_unsplash_photos(keyword=None):
 
 @frappe.whitelist()
 def get_unread_items():
-    from frappe.query_builder.functions import Count
-
-    Discussion = frappe.qb.DocType("GP Discussion")
-    Visit = frappe.qb.DocType("GP Discussion Visit")
-    query = (
-        frappe.qb.from_(Discussion)
-        .select(Discussion.team, Count(Discussion.team).as_("count"))
-        .left_join(Visit)
-        .on((Visit.discussion == Discussion.name) & (Visit.user == frappe.session.user))
-        .where(
-            (Visit.last_visit.isnull()) | (Visit.last_visit < Discussion.last_post_at)
-        )
-        .groupby(Discussion.team)
-    )
+    from gameplan.unread import get_unread_counts_by_team
 
-    is_guest = gameplan.is_guest()
-    if is_guest:
-        GuestAccess = frappe.qb.DocType("GP Guest Access")
-        project_list = GuestAccess.select(GuestAccess.project).where(
-            GuestAccess.user == frappe.session.user
-        )
-        query = query.where(Discussion.project.isin(project_list))
-
-    # pypika doesn't have any API for "FORCE INDEX FOR JOIN"
-    sql = query.get_sql()
-    sql = sql.replace(
-        "LEFT JOIN `tabGP Discussion Visit`",
-        "LEFT JOIN `tabGP Discussion Visit` FORCE INDEX FOR JOIN(discussion_user_index)",
-    )
-    data = frappe.db.sql(sql, as_dict=1)
-
-    out = {}
-    for d in data:
-        out[d.team] = d.count
-    return out
+    return get_unread_counts_by_team()
 
 
 @frappe.whitelist()
 def get_unread_items_by_project(projects):
-    from frappe.query_builder.functions import Count
+    from gameplan.unread import get_unread_counts
 
-    project_names = frappe.parse_json(projects)
-    Discussion = frappe.qb.DocType("GP Discussion")
-    Visit = frappe.qb.DocType("GP Discussion Visit")
-    query = (
-        frappe.qb.from_(Discussion)
-        .select(Discussion.project, Count(Discussion.project).as_("count"))
-        .left_join(Visit)
-        .on((Visit.discussion == Discussion.name) & (Visit.user == frappe.session.user))
-        .where(
-            (Visit.last_visit.isnull()) | (Visit.last_visit < Discussion.last_post_at)
-        )
-        .where(Discussion.project.isin(project_names))
-        .groupby(Discussion.project)
-    )
-
-    data = query.run(as_dict=1)
-    out = {}
-    for d in data:
-        out[d.project] = d.count
-    return out
+    project_names = {str(p) for p in frappe.parse_json(projects)}
+    return {
+        project: count for project, count in get_unread_counts().items() if project in project_names
+    }
 
 
 @frappe.whitelist()
 def mark_all_notifications_as_read():
-    for d in frappe.db.get_all(
-        "GP Notification",
-        filters={"to_user": frappe.session.user, "read": 0},
-        pluck="name",
-    ):
-        doc = frappe.get_doc("GP Notification", d)
-        doc.read = 1
-        doc.save(ignore_permissions=True)
+    from gameplan.gameplan.doctype.gp_notification.gp_notification import GPNotification
+
+    return GPNotification.mark_as_read()
 
 
 @frappe.whitelist()
 def recent_projects():
     from frappe.query_builder.functions import Max
 
+    from gameplan.visits import get_buffered_visits_of_user, max_visit
+
     ProjectVisit = frappe.qb.DocType("GP Project Visit")
     Team = frappe.qb.DocType("GP Team")
     Project = frappe.qb.DocType("GP Project")
@@ -304,9 +253,36 @@ def recent_projects():
         .where(ProjectVisit.project.notin(pinned_projects_query))
         .orderby(ProjectVisit.last_visit, order=frappe.qb.desc)
         .limit(12)
-    )
+    ).run(as_dict=1)
+
+    # visits not written to the visit table yet
+    buffered = get_buffered_visits_of_user("GP Project", frappe.session.user)
+    if not buffered:
+        return projects
+
+    for project in projects:
+        project.timestamp = max_visit(project.timestamp, buffered.pop(str(project.name), None))
+    if buffered:
+        buffered_only = (
+            frappe.qb.from_(Project)
+            .select(
+                Project.name,
+                Project.team,
+                Project.title.as_("project_title"),
+                Team.title.as_("team_title"),
+                Project.icon,
+            )
+            .left_join(Team)
+            .on(Team.name == Project.team)
+            .where(Project.name.isin(list(buffered)))
+            .where(Project.name.notin(pinned_projects_query))
+        ).run(as_dict=1)
+        for project in buffered_only:
+            project.timestamp = buffered[str(project.name)]
+        projects += buffered_only
 
-    return projects.run(as_dict=1)
+    projects.sort(key=lambda project: project.timestamp, reverse=True)
+    return projects[:12]
 
 
 @frappe.whitelist()
@@ -404,81 +380,23 @@ def oauth_providers():
 
 @frappe.whitelist()
 def search(query, start=0):
-    from gameplan.search import GameplanSearch
+    from gameplan.search import GameplanSearch, hydrate_results
 
     search = GameplanSearch()
     query = search.clean_query(query)
-
-    query_parts = query.split(" ")
-    if len(query_parts) == 1 and not query_parts[0].endswith("*"):
-        query = f"{query_parts[0]}*"
-    if len(query_parts) > 1:
-        query = " ".join([f"%%{q}%%" for q in query_parts])
-
-    result = search.search(
-        f"@title|content:({query})",
-        start=start,
+    result = search.tiered_search(
+        query,
+        start=cint(start),
         sort_by="modified desc",
         highlight=True,
         with_payloads=True,
+        with_scores=True,
     )
 
-    comments_by_doctype = {}
-    grouped_results = {}
-    for d in result.docs:
-        doctype, name = d.id.split(":")
-        d.doctype = doctype
-        d.name = name
-        del d.id
-        if doctype == "GP Comment":
-            comments_by_doctype.setdefault(d.payload["reference_doctype"], []).append(d)
-        else:
-            d.project = d.payload.get("project")
-            d.team = d.payload.get("team")
-            del d.payload
-            grouped_results.setdefault(doctype, []).append(d)
-
-    discussion_names = [
-        d.payload["reference_name"]
-        for d in comments_by_doctype.get("GP Discussion", [])
-    ]
-    task_names = [
-        d.payload["reference_name"] for d in comments_by_doctype.get("GP Task", [])
-    ]
-
-    if discussion_names:
-        for d in frappe.get_all(
-            "GP Discussion",
-            fields=["name", "title", "last_post_at", "project", "team"],
-            filters={"name": ("in", discussion_names)},
-        ):
-            d.doctype = "GP Discussion"
-            d.name = cstr(d.name)
-            d.content = ""
-            d.via_comment = True
-            d.modified = d.last_post_at
-            for c in comments_by_doctype.get("GP Discussion", []):
-                if c.payload["reference_name"] == d.name:
-                    d.content = c.content
-            grouped_results.setdefault("GP Discussion", []).append(d)
-
-    if task_names:
-        for d in frappe.get_all(
-            "GP Task",
-            fields=["name", "title", "modified", "project", "team"],
-            filters={"name": ("in", task_names)},
-        ):
-            d.doctype = "GP Task"
-            d.name = cstr(d.name)
-            d.content = ""
-            d.via_comment = True
-            for c in comments_by_doctype.get("GP Task", []):
-                if c.payload["reference_name"] == d.name:
-                    d.content = c.content
-            grouped_results.setdefault("GP Task", []).append(d)
-
     return {
-        "results": grouped_results,
+        "results": hydrate_results(result.docs, snippet_terms=query.split() if search.compact else None),
         "total": result.total,
         "duration": result.duration,
+        "tier": result.tier,
+        "tiers": result.tiers,
     }
@@ -0,0 +1,367 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+
+import statistics
+import time
+
+import frappe
+
+
+def get_percentiles(timings):
+	"""p50, p95 and p99 of `timings`"""
+	if len(timings) < 2:
+		value = timings[0] if timings else 0
+		return value, value, value
+	cuts = statistics.quantiles(timings, n=100, method="inclusive")
+	return cuts[49], cuts[94], cuts[98]
+
+
+def benchmark_search_backends(backends=None, limit=None, queries=None, repeat=20, chunk_size=500):
+	"""Index the same records into each search backend and compare indexing throughput and
+	query latency. Uses a separate index, the live search index is not touched."""
+	from gameplan.search import GameplanSearch
+
+	backends = backends or ["redisearch", "sqlite"]
+	queries = queries or get_sample_queries()
+	version = 1
+	results = []
+	for backend in backends:
+		search = GameplanSearch(backend=backend, index_name="gameplan_benchmark_idx", prefix="benchmark_doc")
+		search.drop_index_version(version)
+		search.create_index(version)
+		try:
+			indexed = 0
+			start = time.monotonic()
+			for records in search.get_record_chunks(chunk_size):
+				indexed += search.index_docs(records, version=version)
+				if limit and indexed >= limit:
+					break
+			index_duration = time.monotonic() - start
+
+			timings = []
+			for _i in range(repeat):
+				for query in queries:
+					start = time.perf_counter()
+					search.backend.search(
+						version,
+						f"@title|content:({query}*)",
+						start=0,
+						page_length=50,
+						sort_by="modified desc",
+						highlight=True,
+						with_payloads=True,
+						with_scores=False,
+					)
+					timings.append((time.perf_counter() - start) * 1000)
+		finally:
+			search.drop_index_version(version)
+
+		p50, p95, p99 = get_percentiles(timings)
+		results.append(
+			frappe._dict(
+				backend=backend,
+				documents=indexed,
+				index_seconds=index_duration,
+				docs_per_sec=indexed / index_duration if index_duration else indexed,
+				p50_ms=p50,
+				p95_ms=p95,
+				p99_ms=p99,
+			)
+		)
+
+	print(
+		f"{'backend':<12}{'docs':>10}{'index s':>10}{'docs/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+	)
+	for r in results:
+		print(
+			f"{r.backend:<12}{r.documents:>10}{r.index_seconds:>10.1f}{r.docs_per_sec:>10.0f}"
+			f"{r.p50_ms:>10.2f}{r.p95_ms:>10.2f}{r.p99_ms:>10.2f}"
+		)
+	return results
+
+
+def benchmark_index_memory(limit=None, sample_size=200, chunk_size=500):
+	"""Index the same records into a regular and a compact RediSearch index and compare the memory
+	they take per document: the document hashes, sampled with MEMORY USAGE, and the index
+	structures as reported by FT.INFO. Uses a separate index, the live search index is not touched."""
+	from gameplan.search import GameplanSearch
+
+	version = 1
+	results = []
+	for compact in (False, True):
+		search = GameplanSearch(
+			backend="redisearch", index_name="gameplan_benchmark_idx", prefix="benchmark_doc", compact=compact
+		)
+		search.drop_index_version(version)
+		search.create_index(version)
+		try:
+			indexed = 0
+			sample_ids = []
+			for records in search.get_record_chunks(chunk_size):
+				indexed += search.index_docs(records, version=version)
+				sample_ids += [f"{d.doctype}:{d.name}" for d in records[: sample_size - len(sample_ids)]]
+				if limit and indexed >= limit:
+					break
+
+			info = search.backend.ft(version).info()
+			usage = [
+				search.redis.memory_usage(search.backend.get_doc_id(id, version)) or 0 for id in sample_ids
+			]
+			index_mb = sum(
+				float(info.get(key) or 0)
+				for key in [
+					"inverted_sz_mb",
+					"offset_vectors_sz_mb",
+					"doc_table_size_mb",
+					"sortable_values_size_mb",
+					"key_table_size_mb",
+				]
+			)
+		finally:
+			search.drop_index_version(version)
+
+		hash_bytes = statistics.mean(usage) if usage else 0
+		index_bytes = index_mb * 1024 * 1024 / indexed if indexed else 0
+		results.append(
+			frappe._dict(
+				mode="compact" if compact else "regular",
+				documents=indexed,
+				hash_bytes=hash_bytes,
+				index_bytes=index_bytes,
+				total_bytes=hash_bytes + index_bytes,
+			)
+		)
+
+	print(f"{'mode':<12}{'docs':>10}{'hash B':>12}{'index B':>12}{'total B':>12}")
+	for r in results:
+		print(
+			f"{r.mode:<12}{r.documents:>10}{r.hash_bytes:>12.0f}{r.index_bytes:>12.0f}{r.total_bytes:>12.0f}"
+		)
+	if results[0].total_bytes:
+		print(
+			f"compact saves {100 * (1 - results[1].total_bytes / results[0].total_bytes):.0f}% per document"
+		)
+	return results
+
+
+def benchmark_access_filter(project_counts=None, queries=None, repeat=20):
+	"""Query latency of the live search index when filtering by a list of `project_counts` accessible
+	projects, against filtering by the visibility tags of the current user. Project lists are made
+	of the existing projects, padded with names that match nothing."""
+	from gameplan.access import get_visibility_tags
+	from gameplan.search import GameplanSearch
+
+	search = GameplanSearch()
+	if not search.has_current_schema():
+		frappe.throw("The search index has no visibility tags yet, rebuild it first")
+
+	project_counts = project_counts or [10, 100, 1000, 5000]
+	queries = queries or get_sample_queries()
+	projects = frappe.db.get_all(
+		"GP Project", pluck="name", order_by="modified desc", limit=max(project_counts)
+	)
+	projects = [str(p) for p in projects]
+	filters = [
+		(f"{count} projects", build_tag_filter("project", pad_names(projects, count)))
+		for count in project_counts
+	]
+	tags = get_visibility_tags() or ["public"]
+	filters.append((f"{len(tags)} visibility tags", build_tag_filter("visibility", tags)))
+
+	results = []
+	for label, access_query in filters:
+		timings = []
+		for _i in range(repeat):
+			for query in queries:
+				start = time.perf_counter()
+				search.backend.search(
+					search.get_active_version(),
+					f"@title|content:({query}*) {access_query}",
+					start=0,
+					page_length=50,
+					sort_by="modified desc",
+					highlight=False,
+					with_payloads=True,
+					with_scores=False,
+				)
+				timings.append((time.perf_counter() - start) * 1000)
+
+		p50, p95, p99 = get_percentiles(timings)
+		results.append(
+			frappe._dict(filter=label, query_length=len(access_query), p50_ms=p50, p95_ms=p95, p99_ms=p99)
+		)
+
+	print(f"{'filter':<24}{'chars':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+	for r in results:
+		print(f"{r.filter:<24}{r.query_length:>10}{r.p50_ms:>10.2f}{r.p95_ms:>10.2f}{r.p99_ms:>10.2f}")
+	return results
+
+
+def benchmark_notification_updates(rows=10000):
+	"""Time marking `rows` unread notifications of the current user as read one document at a time,
+	as before, and with the single update of `GPNotification.mark_as_read`. The notifications are
+	created for the benchmark and everything is rolled back at the end."""
+	from gameplan.gameplan.doctype.gp_notification.gp_notification import GPNotification
+
+	user = frappe.session.user
+	Notification = frappe.qb.DocType("GP Notification")
+	now = frappe.utils.now()
+	names = [frappe.db.get_next_sequence_val("GP Notification") for _i in range(rows)]
+	frappe.db.bulk_insert(
+		"GP Notification",
+		fields=["name", "to_user", "from_user", "type", "message", "read", "creation", "modified", "owner"],
+		values=[(name, user, user, "Mention", "Benchmark", 0, now, now, user) for name in names],
+	)
+	benchmark = Notification.name.isin(names)
+
+	def mark_one_by_one():
+		unread = frappe.db.get_all(
+			"GP Notification", filters={"name": ["in", names], "read": 0}, pluck="name"
+		)
+		for name in unread:
+			doc = frappe.get_doc("GP Notification", name)
+			doc.read = 1
+			doc.save(ignore_permissions=True)
+		return len(unread)
+
+	results = []
+	try:
+		for label, mark in [
+			("one by one", mark_one_by_one),
+			("single update", lambda: GPNotification.mark_as_read([benchmark], refetch=False)),
+		]:
+			frappe.qb.update(Notification).set(Notification.read, 0).where(benchmark).run()
+			start = time.monotonic()
+			marked = mark()
+			duration = time.monotonic() - start
+			results.append(
+				frappe._dict(
+					path=label,
+					rows=marked,
+					seconds=duration,
+					rows_per_sec=marked / duration if duration else marked,
+				)
+			)
+	finally:
+		frappe.db.rollback()
+
+	print(f"{'path':<16}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+	for r in results:
+		print(f"{r.path:<16}{r.rows:>10}{r.seconds:>10.2f}{r.rows_per_sec:>12.0f}")
+	return results
+
+
+def benchmark_comment_post(discussion=None, count=20):
+	"""Latency of posting `count` comments as the current user on `discussion`, by default the one
+	with the most comments. Everything is rolled back at the end. Changes to the unread counters
+	are only applied on commit, but posting buffers a visit of the discussion in Redis right away,
+	so the buffered visit of the user is restored too. Visits are not flushed meanwhile, which would
+	write the benchmark's visit to the database."""
+	from gameplan import visits
+
+	if not discussion:
+		discussion = frappe.db.get_value(
+			"GP Discussion", {"closed_at": ("is", "not set")}, "name", order_by="comments_count desc"
+		)
+	if not discussion:
+		frappe.throw("There is no open discussion to comment on")
+
+	cache = frappe.cache()
+	lock_key = cache.make_key(visits.FLUSH_LOCK_KEY)
+	if not cache.set(lock_key, 1, nx=True, ex=visits.FLUSH_LOCK_TIMEOUT):
+		frappe.throw("Visits are being flushed, try again in a few seconds")
+
+	buffer_key = visits.get_key("GP Discussion")
+	field = visits.get_field(discussion, frappe.session.user)
+	buffered_visit = cache.pipeline(transaction=False).hget(buffer_key, field).execute()[0]
+
+	timings = []
+	try:
+		for i in range(count):
+			start = time.perf_counter()
+			frappe.get_doc(
+				doctype="GP Comment",
+				reference_doctype="GP Discussion",
+				reference_name=discussion,
+				content=f"<p>Benchmark comment {i}</p>",
+			).insert()
+			timings.append((time.perf_counter() - start) * 1000)
+	finally:
+		frappe.db.rollback()
+		pipeline = cache.pipeline(transaction=False)
+		if buffered_visit:
+			pipeline.hset(buffer_key, field, buffered_visit)
+		else:
+			pipeline.hdel(buffer_key, field)
+		pipeline.delete(lock_key)
+		pipeline.execute()
+
+	comments = frappe.db.get_value("GP Discussion", discussion, "comments_count")
+	p50, p95, p99 = get_percentiles(timings)
+	print(f"{'discussion':<12}{'comments':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+	print(f"{discussion!s:<12}{comments:>10}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+	return frappe._dict(discussion=discussion, comments=comments, p50_ms=p50, p95_ms=p95, p99_ms=p99)
+
+
+def benchmark_content_processing(sizes=None, repeat=5):
+	"""Time processing HTML bodies of `sizes` bytes the way a save did before, parsing them once to
+	clean them, once to find mentions and once for the search text, against one parse with
+	`process_content`"""
+	from frappe.core.utils import html2text
+
+	from gameplan.utils import extract_mentions, process_content, remove_empty_trailing_paragraphs
+
+	sizes = sizes or [1024, 50 * 1024, 1024 * 1024]
+	results = []
+	for size in sizes:
+		html = make_html(size)
+		paths = [
+			(
+				"separate parses",
+				lambda html=html: (
+					extract_mentions(remove_empty_trailing_paragraphs(html)),
+					html2text(html),
+				),
+			),
+			("single parse", lambda html=html: process_content(html)),
+		]
+		for label, process in paths:
+			timings = []
+			for _i in range(repeat):
+				start = time.perf_counter()
+				process()
+				timings.append((time.perf_counter() - start) * 1000)
+			results.append(frappe._dict(size=len(html), path=label, ms=statistics.median(timings)))
+
+	print(f"{'bytes':>10}  {'path':<18}{'median ms':>12}")
+	for r in results:
+		print(f"{r.size:>10}  {r.path:<18}{r.ms:>12.2f}")
+	return results
+
+
+def make_html(size):
+	"""Text editor HTML of about `size` bytes, with a mention per paragraph and empty trailing
+	paragraphs"""
+	paragraph = (
+		"<p>Some <strong>text</strong> with a "
+		'<span class="mention" data-type="mention" data-id="user@example.com" data-label="User">'
+		'@User</span> and a <a href="https://example.com">link</a>.</p>'
+	)
+	return paragraph * max(1, size // len(paragraph)) + "<p></p><p><br></p>"
+
+
+def pad_names(names, count):
+	"""`names` cut or padded to `count` with names that are not in the index"""
+	return names[:count] + [f"benchmark-{i}" for i in range(count - len(names[:count]))]
+
+
+def build_tag_filter(field, tags):
+	return f"@{field}:{{{'|'.join(tags)}}}"
+
+
+def get_sample_queries(count=20):
+	"""First words of recent discussion titles, to query for words that exist in the corpus"""
+	titles = frappe.db.get_all("GP Discussion", pluck="title", order_by="modified desc", limit=count)
+	words = [title.split()[0].lower() for title in titles if title and title.split()]
+	return list(dict.fromkeys(w for w in words if w.isalnum())) or ["the"]
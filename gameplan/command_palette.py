@@ -4,14 +4,48 @@
 
 import frappe
 
+from gameplan.access import get_accessible_projects
 from gameplan.search import GameplanSearch
+from gameplan.suggestions import TitleSuggestions
+
+# results per group
+LIMIT = 10
+
+GROUPS = {
+    "GP Discussion": "Discussions",
+    "GP Task": "Tasks",
+    "GP Page": "Pages",
+    "GP Project": "Projects",
+}
 
 
 @frappe.whitelist()
 def search(query):
     search = GameplanSearch()
     query = search.clean_query(query)
+    if not query:
+        return []
+
+    results = {}
+    if search.backend.supports_suggestions:
+        results = TitleSuggestions().get_suggestions(query, get_accessible_projects(), limit=LIMIT)
+
+    # suggestions only match titles from their start, search titles matching anywhere only when
+    # none does, so that most keystrokes cost no full text search
+    if not results:
+        for r in search_titles(search, query):
+            items = results.setdefault(r.doctype, [])
+            if len(items) < LIMIT and not any(item.name == r.name for item in items):
+                items.append(r)
+
+    out = []
+    for doctype, title in GROUPS.items():
+        if results.get(doctype):
+            out.append({"title": title, "items": results[doctype]})
+    return out
+
 
+def search_titles(search, query):
     query_parts = query.split(" ")
     if len(query_parts) == 1 and not query_parts[0].endswith("*"):
         query = f"{query_parts[0]}*"
@@ -21,20 +55,11 @@ def search(query):
     query = f"@title:({query})"
     result = search.search(query, start=0, sort_by="modified desc", with_payloads=True)
 
-    groups = {}
     for r in result.docs:
         doctype, name = r.id.split(":")
         r.doctype = doctype
         r.name = name
-
-        if doctype == "GP Discussion":
-            groups.setdefault("Discussions", []).append(r)
-        elif doctype == "GP Task":
-            groups.setdefault("Tasks", []).append(r)
-        elif doctype == "GP Page":
-            groups.setdefault("Pages", []).append(r)
-
-    out = []
-    for key in groups:
-        out.append({"title": key, "items": groups[key]})
-    return out
+        # compact indexes keep team and project as fields only
+        r.payload = r.payload or {"project": r.get("project"), "team": r.get("team")}
+        if doctype in GROUPS:
+            yield r
@@ -0,0 +1,147 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.group("gameplan")
+def gameplan():
+	"Gameplan commands"
+
+
+@gameplan.command("build-search-index")
+@click.option("--workers", default=1, type=int, help="Number of processes to index with")
+@click.option("--chunk-size", default=None, type=int, help="Records read and indexed per round trip")
+@pass_context
+def build_search_index(context, workers=1, chunk_size=None):
+	"Rebuild the search index"
+	from gameplan.search import CHUNK_SIZE, build_index
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		build_index(chunk_size=chunk_size or CHUNK_SIZE, workers=max(workers, 1))
+	finally:
+		frappe.destroy()
+
+
+@gameplan.command("benchmark-search-backends")
+@click.option("--backend", "backends", multiple=True, help="Backends to compare, all by default")
+@click.option("--limit", default=None, type=int, help="Index at most this many records")
+@click.option("--query", "queries", multiple=True, help="Terms to search for, sampled by default")
+@click.option("--repeat", default=20, type=int, help="Times each query is run")
+@pass_context
+def benchmark_search_backends(context, backends=None, limit=None, queries=None, repeat=20):
+	"Compare indexing throughput and query latency of the search backends"
+	from gameplan import benchmarks
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		benchmarks.benchmark_search_backends(
+			backends=list(backends) or None, limit=limit, queries=list(queries) or None, repeat=repeat
+		)
+	finally:
+		frappe.destroy()
+
+
+@gameplan.command("benchmark-search-memory")
+@click.option("--limit", default=None, type=int, help="Index at most this many records")
+@click.option("--sample-size", default=200, type=int, help="Documents to measure the memory of")
+@pass_context
+def benchmark_search_memory(context, limit=None, sample_size=200):
+	"Compare the memory per document of the regular and compact search index"
+	from gameplan import benchmarks
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		benchmarks.benchmark_index_memory(limit=limit, sample_size=sample_size)
+	finally:
+		frappe.destroy()
+
+
+@gameplan.command("benchmark-search-access")
+@click.option("--projects", "project_counts", multiple=True, type=int, help="Numbers of accessible projects")
+@click.option("--query", "queries", multiple=True, help="Terms to search for, sampled by default")
+@click.option("--repeat", default=20, type=int, help="Times each query is run")
+@pass_context
+def benchmark_search_access(context, project_counts=None, queries=None, repeat=20):
+	"Compare search latency when filtering by accessible projects and by visibility tags"
+	from gameplan import benchmarks
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		frappe.set_user("Administrator")
+		benchmarks.benchmark_access_filter(
+			project_counts=list(project_counts) or None, queries=list(queries) or None, repeat=repeat
+		)
+	finally:
+		frappe.destroy()
+
+
+@gameplan.command("benchmark-notification-updates")
+@click.option("--rows", default=10000, type=int, help="Unread notifications to mark as read")
+@click.option("--user", default="Administrator", help="User to create the notifications for")
+@pass_context
+def benchmark_notification_updates(context, rows=10000, user="Administrator"):
+	"Compare marking notifications as read one by one and with a single update"
+	from gameplan import benchmarks
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		frappe.set_user(user)
+		benchmarks.benchmark_notification_updates(rows=rows)
+	finally:
+		frappe.destroy()
+
+
+@gameplan.command("benchmark-comment-post")
+@click.option("--discussion", default=None, help="Discussion to comment on, the most commented by default")
+@click.option("--count", default=20, type=int, help="Comments to post")
+@click.option("--user", default="Administrator", help="User to post the comments as")
+@pass_context
+def benchmark_comment_post(context, discussion=None, count=20, user="Administrator"):
+	"Measure the latency of posting comments on a discussion"
+	from gameplan import benchmarks
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		frappe.set_user(user)
+		benchmarks.benchmark_comment_post(discussion=discussion, count=count)
+	finally:
+		frappe.destroy()
+
+
+@gameplan.command("benchmark-content-processing")
+@click.option(
+	"--size", "sizes", multiple=True, type=int, help="Body size in bytes, 1KB, 50KB and 1MB if not set"
+)
+@click.option("--repeat", default=5, type=int, help="Times each body is processed")
+@pass_context
+def benchmark_content_processing(context, sizes=None, repeat=5):
+	"Compare parsing content once per save against parsing it for every step"
+	from gameplan import benchmarks
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		benchmarks.benchmark_content_processing(sizes=list(sizes) or None, repeat=repeat)
+	finally:
+		frappe.destroy()
+
+
+commands = [gameplan]
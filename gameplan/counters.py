@@ -0,0 +1,77 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Counts of records kept on the records they belong to, like the discussions of a project. They are
+changed with atomic `field = field + delta` updates instead of being read and written back, so that
+concurrent changes neither overwrite each other nor save the whole parent document, and
+`reconcile_counters` recomputes them all from the records to correct any drift.
+"""
+
+import frappe
+from frappe.query_builder.functions import Coalesce
+
+from gameplan.utils.utils import get_affected_rows
+
+# counted records of each counter field, as (doctype, link field, filters)
+COUNTERS = {
+	"GP Project": {
+		"discussions_count": [("GP Discussion", "project", {})],
+		"tasks_count": [("GP Task", "project", {})],
+	},
+	"GP Discussion": {
+		# polls are posted as replies too
+		"comments_count": [
+			("GP Comment", "reference_name", {"reference_doctype": "GP Discussion"}),
+			("GP Poll", "discussion", {}),
+		],
+		"participants_count": [("GP Discussion Participant", "discussion", {})],
+	},
+	"GP Task": {
+		"comments_count": [("GP Comment", "reference_name", {"reference_doctype": "GP Task"})],
+	},
+}
+
+
+def increment(doctype, name, **deltas):
+	"""Add `deltas`, by counter field, to the counters of `name` of `doctype` with one update. The
+	record is marked modified, as saving it with the new counts did."""
+	deltas = {field: delta for field, delta in deltas.items() if delta}
+	if not name or not deltas:
+		return
+
+	Table = frappe.qb.DocType(doctype)
+	query = frappe.qb.update(Table).set(Table.modified, frappe.utils.now()).where(Table.name == name)
+	for field, delta in deltas.items():
+		query = query.set(Table[field], Coalesce(Table[field], 0) + delta)
+	query.run()
+
+
+def reconcile_counters():
+	"""Recompute every counter from the counted records, with one update per counter field.
+	Returns the number of records whose counters were wrong."""
+	fixed = 0
+	for doctype, counters in COUNTERS.items():
+		for field, sources in counters.items():
+			fixed += reconcile_counter(doctype, field, sources)
+	return fixed
+
+
+def reconcile_counter(doctype, field, sources):
+	parents = None
+	for source_doctype, link_field, filters in sources:
+		Source = frappe.qb.DocType(source_doctype)
+		query = frappe.qb.from_(Source).select(Source[link_field].as_("parent"))
+		for key, value in filters.items():
+			query = query.where(Source[key] == value)
+		parents = query if parents is None else parents.union_all(query)
+
+	frappe.db.sql(
+		f"""UPDATE `tab{doctype}` t
+		LEFT JOIN (
+			SELECT parent, COUNT(*) AS count FROM ({parents.get_sql()}) parents GROUP BY parent
+		) c ON c.parent = t.name
+		SET t.`{field}` = COALESCE(c.count, 0)
+		WHERE t.`{field}` IS NULL OR t.`{field}` != COALESCE(c.count, 0)"""
+	)
+	return get_affected_rows()
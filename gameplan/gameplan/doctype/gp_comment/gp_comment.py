@@ -5,10 +5,13 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from gameplan import counters
+from gameplan.gameplan.doctype.gp_discussion.gp_discussion import add_post
+from gameplan.gameplan.doctype.gp_discussion_participant.gp_discussion_participant import remove_reply
 from gameplan.mixins.mentions import HasMentions
 from gameplan.mixins.reactions import HasReactions
-from gameplan.search import GameplanSearch
-from gameplan.utils import remove_empty_trailing_paragraphs
+from gameplan.search import queue_index_update
+from gameplan.utils import get_content
 
 
 class GPComment(HasMentions, HasReactions, Document):
@@ -19,35 +22,25 @@ class GPComment(HasMentions, HasReactions, Document):
 		if self.reference_doctype not in ["GP Discussion"]:
 			return
 
-		reference_doc = frappe.get_doc(self.reference_doctype, self.reference_name)
-		if reference_doc.meta.has_field("closed_at"):
-			if reference_doc.closed_at:
-				frappe.throw(_("Cannot add comment to a closed discussion"))
+		if frappe.db.get_value(self.reference_doctype, self.reference_name, "closed_at"):
+			frappe.throw(_("Cannot add comment to a closed discussion"))
 
 	def after_insert(self):
-		if self.reference_doctype not in ["GP Discussion", "GP Task"]:
-			return
-		reference_doc = frappe.get_doc(self.reference_doctype, self.reference_name)
-		if reference_doc.meta.has_field("last_post_at"):
-			reference_doc.set("last_post_at", frappe.utils.now())
-		if reference_doc.meta.has_field("last_post_by"):
-			reference_doc.set("last_post_by", frappe.session.user)
-		if reference_doc.meta.has_field("comments_count"):
-			reference_doc.set("comments_count", reference_doc.comments_count + 1)
-		if reference_doc.doctype == "GP Discussion":
-			reference_doc.update_participants_count()
-			reference_doc.track_visit()
-		reference_doc.save(ignore_permissions=True)
+		if self.reference_doctype == "GP Discussion":
+			add_post(self.reference_name, self.owner)
+		elif self.reference_doctype == "GP Task":
+			counters.increment("GP Task", self.reference_name, comments_count=1)
 
 	def on_trash(self):
 		if self.reference_doctype not in ["GP Discussion", "GP Task"]:
 			return
-		reference_doc = frappe.get_doc(self.reference_doctype, self.reference_name)
-		if reference_doc.meta.has_field("comments_count"):
-			reference_doc.db_set("comments_count", reference_doc.comments_count - 1)
+		queue_index_update(self)
+		if self.reference_doctype == "GP Discussion":
+			remove_reply(self.reference_name, self.owner)
+		counters.increment(self.reference_doctype, self.reference_name, comments_count=-1)
 
 	def validate(self):
-		self.content = remove_empty_trailing_paragraphs(self.content)
+		self.content = get_content(self, "content").html
 		self.de_duplicate_reactions()
 
 	def on_update(self):
@@ -57,8 +50,4 @@ class GPComment(HasMentions, HasReactions, Document):
 
 	def update_discussion_index(self):
 		if self.reference_doctype in ["GP Discussion", "GP Task"]:
-			search = GameplanSearch()
-			if self.deleted_at:
-				search.remove_doc(self)
-			else:
-				search.index_doc(self)
+			queue_index_update(self)
@@ -1,9 +1,65 @@
 # Copyright (c) 2022, Frappe Technologies Pvt Ltd and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
+from bs4 import BeautifulSoup
 from frappe.tests.utils import FrappeTestCase
 
+from gameplan.gameplan.doctype.gp_discussion.test_gp_discussion import (
+	make_discussion,
+	make_project,
+	make_user,
+)
+from gameplan.utils import extract_mentions, process_content, remove_empty_trailing_paragraphs
+
+
+def mention(email, label="Test"):
+	# attributes in the order the parser writes them back
+	return f'<span class="mention" data-id="{email}" data-label="{label}" data-type="mention">@{label}</span>'
+
 
 class TestGPComment(FrappeTestCase):
-	pass
+	def setUp(self):
+		self.user = make_user()
+		self.discussion = make_discussion(make_project())
+
+	def make_comment(self, content):
+		return frappe.get_doc(
+			doctype="GP Comment",
+			reference_doctype="GP Discussion",
+			reference_name=self.discussion.name,
+			content=content,
+		).insert()
+
+	def get_mention_notifications(self, comment):
+		return frappe.db.get_all("GP Notification", filters={"comment": comment.name}, pluck="to_user")
+
+	def test_process_content(self):
+		html = f"<p>Hello  {mention(self.user)}, see   <b>this</b></p><p><br></p><p></p>"
+		content = process_content(html)
+		self.assertEqual(content.source, html)
+		self.assertEqual(content.html, f"<p>Hello  {mention(self.user)}, see   <b>this</b></p>")
+		self.assertEqual(content.mentions, [{"full_name": "Test", "email": self.user}])
+		self.assertEqual(content.text, "Hello @Test , see this")
+
+		# the same as the separate helpers it replaces
+		self.assertEqual(content.html, remove_empty_trailing_paragraphs(html))
+		self.assertEqual(content.mentions, extract_mentions(html))
+
+	def test_content_is_parsed_once_per_save(self):
+		html = f"<p>Hi {mention(self.user)}</p><p></p>"
+		with patch("gameplan.utils.content.BeautifulSoup", wraps=BeautifulSoup) as parse:
+			comment = self.make_comment(html)
+		self.assertEqual(parse.call_count, 1)
+		self.assertEqual(comment.content, f"<p>Hi {mention(self.user)}</p>")
+		self.assertEqual(self.get_mention_notifications(comment), [self.user])
+
+	def test_changed_content_is_parsed_again(self):
+		comment = self.make_comment("<p>No mentions</p>")
+		self.assertEqual(self.get_mention_notifications(comment), [])
+
+		comment.content = f"<p>Now {mention(self.user)}</p>"
+		comment.save()
+		self.assertEqual(self.get_mention_notifications(comment), [self.user])
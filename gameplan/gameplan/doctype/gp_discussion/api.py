@@ -2,37 +2,320 @@
 # MIT License. See license.txt
 
 
+import base64
+import json
+import operator
+
 import frappe
-from pypika.terms import ExistsCriterion
 from frappe import _
+from frappe.query_builder.functions import Min
+from frappe.utils import cint, cstr, get_datetime
+from pypika.terms import Case, ExistsCriterion
 
 import gameplan
+from gameplan.access import get_accessible_projects
+from gameplan.gameplan.doctype.gp_notification.gp_notification import GPNotification
+from gameplan.unread import reset_read_counter
+from gameplan.visits import get_buffered_visits, get_last_visits, max_visit
+
+
+# orderings that `get_discussion_feed` can page through with a cursor
+CURSOR_FIELDS = ("last_post_at", "creation")
+# of those, the ones that can be NULL, whose NULL rows are paged separately
+NULLABLE_CURSOR_FIELDS = ("last_post_at",)
+
+# comments `get_discussion_detail` returns before and from the first unread one
+COMMENTS_BEFORE = 10
+COMMENTS_AFTER = 40
 
 
 @frappe.whitelist()
 def get_discussions(filters=None, order_by=None, limit_start=None, limit_page_length=None):
-	if not frappe.has_permission("GP Discussion", "read"):
-		frappe.throw(_("Insufficient Permission for GP Discussion"), frappe.PermissionError)
-
 	filters = frappe.parse_json(filters) if filters else None
-	feed_type = filters.pop("feed_type", None) if filters else None
-	participator = filters.pop("participator", None) if filters else None
-	user_bookmarks = filters.pop("user_bookmarks", None) if filters else None
 	order_by = order_by or "last_post_at desc"
 	order_field, order_direction = order_by.split(" ", 1)
 
+	Discussion = frappe.qb.DocType("GP Discussion")
+	query = get_discussions_query(filters)
+	query = query.limit(limit_page_length).offset(limit_start or 0)
+	# order by pinned_at desc if project is selected
+	if filters and filters.get("project"):
+		query = query.orderby(Discussion.pinned_at, order=frappe._dict(value="desc"))
+
+	# default order by last_post_at desc
+	query = query.orderby(Discussion[order_field], order=frappe._dict(value=order_direction))
+
+	discussions = set_buffered_visits(query.run(as_dict=1), filters)
+	set_ongoing_polls(discussions)
+	return discussions
+
+
+@frappe.whitelist()
+def get_discussion_feed(filters=None, order_by=None, cursor=None, page_length=50):
+	"""Discussions matching `filters` a page at a time. Pages start after the order field and name
+	of the last row of the previous page, held in an opaque `cursor`, instead of at an offset, so
+	that every page costs the same to read however deep it is. Returns the `discussions` of the
+	page and the `next_cursor`, which is `None` after the last page. In project views pinned
+	discussions come first, all on the first page. Rows without a value of the order field come
+	last in descending order and first in ascending order, and are paged by name with a query of
+	their own, so that each query is a plain range of the index."""
+	filters = frappe.parse_json(filters) if filters else {}
+	page_length = cint(page_length) or 50
+	order_by = order_by or "last_post_at desc"
+	order_field, order_direction = order_by.split(" ", 1)
+	if order_field not in CURSOR_FIELDS or order_direction not in ("asc", "desc"):
+		frappe.throw(_("Cannot page discussions ordered by {0}").format(order_by))
+	position = decode_cursor(cursor, order_field) if cursor else None
+
+	out = frappe._dict(discussions=[], next_cursor=None)
+	query = get_discussions_query(filters)
+	Discussion = frappe.qb.DocType("GP Discussion")
+	order = frappe._dict(value=order_direction)
+	if filters.get("project"):
+		if not position:
+			out.discussions = (
+				query.where(Discussion.pinned_at.isnotnull())
+				.orderby(Discussion.pinned_at, order=frappe._dict(value="desc"))
+				.run(as_dict=1)
+			)
+		query = query.where(Discussion.pinned_at.isnull())
+
+	field = Discussion[order_field]
+	groups = [True]
+	if order_field in NULLABLE_CURSOR_FIELDS:
+		groups = [True, False] if order_direction == "desc" else [False, True]
+	if position:
+		if (position[0] is not None) not in groups:
+			frappe.throw(_("Invalid cursor"))
+		groups = groups[groups.index(position[0] is not None) :]
+
+	# one row more than a page tells whether there is a next page. Rows that buffered visits make
+	# read are only dropped from unread feeds after they are read, so reading goes on until the
+	# page is full or the rows run out.
+	rows = []
+	for has_value in groups:
+		group = query.where(field.isnotnull() if has_value else field.isnull())
+		while len(rows) <= page_length:
+			limit = page_length + 1 - len(rows)
+			page = group
+			if position:
+				page = page.where(get_cursor_condition(field, order_direction, *position))
+			if has_value:
+				page = page.orderby(field, order=order)
+			batch = page.orderby(Discussion.name, order=order).limit(limit).run(as_dict=1)
+			if batch:
+				position = (batch[-1][order_field], batch[-1].name)
+			rows += set_buffered_visits(batch, filters)
+			if len(batch) < limit:
+				break
+		position = None
+
+	if len(rows) > page_length:
+		rows = rows[:page_length]
+		out.next_cursor = encode_cursor(order_field, rows[-1])
+
+	out.discussions = set_buffered_visits(out.discussions, filters) + rows
+	set_ongoing_polls(out.discussions)
+	return out
+
+
+@frappe.whitelist(methods=["POST"])
+def mark_all_as_read(team=None, project=None):
+	"""Mark every discussion the user can read in `project`, in `team`, or anywhere if neither is
+	passed, as read. The unread discussions are upserted into the visit table and the notifications
+	of all of them marked read with one statement each, however many there are."""
+	user = frappe.session.user
+	projects = get_accessible_projects()
+	if not projects:
+		return
+
+	Discussion = frappe.qb.DocType("GP Discussion")
+	Visit = frappe.qb.DocType("GP Discussion Visit")
+	Notification = frappe.qb.DocType("GP Notification")
+	discussions = frappe.qb.from_(Discussion).select(Discussion.name).where(Discussion.project.isin(projects))
+	if project:
+		discussions = discussions.where(Discussion.project == project)
+	if team:
+		discussions = discussions.where(Discussion.team == team)
+
+	read = (
+		frappe.qb.from_(Visit)
+		.select(Visit.name)
+		.where(Visit.discussion == Discussion.name)
+		.where(Visit.user == user)
+		.where(Visit.last_visit >= Discussion.last_post_at)
+	)
+	unread_discussions = discussions.where(ExistsCriterion(read).negate())
+
+	# the subquery has its values inlined, escape them from parameter substitution
+	unread_discussions = unread_discussions.get_sql().replace("%", "%%")
+	frappe.db.sql(
+		f"""INSERT INTO `tabGP Discussion Visit`
+			(name, discussion, `user`, last_visit, creation, modified, owner, modified_by)
+		SELECT
+			NEXTVAL(`gp_discussion_visit_id_seq`), d.name, %(user)s,
+			%(now)s, %(now)s, %(now)s, %(user)s, %(user)s
+		FROM ({unread_discussions}) d
+		ON DUPLICATE KEY UPDATE
+			last_visit = GREATEST(last_visit, VALUES(last_visit)),
+			modified = VALUES(modified)""",
+		{"user": user, "now": frappe.utils.now()},
+	)
+	GPNotification.mark_as_read([Notification.discussion.isin(discussions)], user=user, refetch=False)
+
+	reset_read_counter(user)
+	gameplan.refetch_resources(["UnreadItems", "Unread Notifications Count"])
+
+
+@frappe.whitelist()
+def get_discussion_detail(name, comments_before=COMMENTS_BEFORE, comments_after=COMMENTS_AFTER):
+	"""Everything needed to show a discussion, with a fixed number of queries however long it is:
+	the `discussion` with the viewer's `last_visit`, `last_unread_comment`, `last_unread_poll` and
+	`is_bookmarked`, a window of `comments` around the first unread one (`comments_before` before
+	it and `comments_after` from it, or the latest ones if all are read), whether there are
+	`more_comments_before` and `more_comments_after` the window, the `polls` and the `activities`."""
+	comments_before, comments_after = cint(comments_before), cint(comments_after)
+	doc = frappe.get_doc("GP Discussion", name)
+	doc.check_permission("read")
+
+	discussion = doc.as_dict()
+	discussion.project_title = frappe.get_cached_value("GP Project", doc.project, "title")
+	discussion.team_title = frappe.get_cached_value("GP Team", doc.team, "title")
+	last_visit = discussion.last_visit = get_last_visits("GP Discussion", [doc.name]).get(cstr(doc.name))
+	discussion.is_bookmarked = doc.is_bookmarked()
+
+	Comment = frappe.qb.DocType("GP Comment")
+	Poll = frappe.qb.DocType("GP Poll")
+	Activity = frappe.qb.DocType("GP Activity")
+	of_discussion = (Comment.reference_doctype == "GP Discussion") & (Comment.reference_name == doc.name)
+
+	# every comment is unread before the first visit
+	is_unread = Comment.creation > last_visit if last_visit else Comment.creation.isnotnull()
+	first_unread_at = (
+		frappe.qb.from_(Comment)
+		.select(Min(Case().when(is_unread, Comment.creation)).as_("first_unread_at"))
+		.where(of_discussion)
+		.run(pluck=True)[0]
+	)
+
+	# one row more than the window on each side tells whether there are more comments
+	fields = [Comment.name, Comment.content, Comment.owner, Comment.creation, Comment.modified]
+	comments = frappe.qb.from_(Comment).select(*fields, Comment.deleted_at).where(of_discussion)
+	if first_unread_at:
+		before = (
+			comments.where(Comment.creation < first_unread_at)
+			.orderby(Comment.creation, order=frappe._dict(value="desc"))
+			.limit(comments_before + 1)
+		)
+		after = (
+			comments.where(Comment.creation >= first_unread_at)
+			.orderby(Comment.creation, order=frappe._dict(value="asc"))
+			.limit(comments_after + 1)
+		)
+		rows = before.union_all(after).run(as_dict=1)
+	else:
+		rows = (
+			comments.orderby(Comment.creation, order=frappe._dict(value="desc"))
+			.limit(comments_before + comments_after + 1)
+			.run(as_dict=1)
+		)
+		comments_before, comments_after = comments_before + comments_after, 0
+
+	for row in rows:
+		row.doctype = "GP Comment"
+	rows.sort(key=lambda row: row.creation)
+	earlier = [r for r in rows if not first_unread_at or r.creation < first_unread_at]
+	later = [r for r in rows if first_unread_at and r.creation >= first_unread_at]
+	out = frappe._dict(
+		discussion=discussion,
+		more_comments_before=len(earlier) > comments_before,
+		more_comments_after=len(later) > comments_after,
+	)
+	out.comments = earlier[-comments_before:] if comments_before else []
+	out.comments += later[:comments_after]
+	if not last_visit:
+		discussion.last_unread_comment = "first_post"
+	else:
+		discussion.last_unread_comment = later[0].name if later else None
+
+	out.polls = (
+		frappe.qb.from_(Poll)
+		.select(
+			Poll.name,
+			Poll.title,
+			Poll.anonymous,
+			Poll.multiple_answers,
+			Poll.creation,
+			Poll.owner,
+			Poll.stopped_at,
+			Poll.total_votes,
+		)
+		.where(Poll.discussion == doc.name)
+		.orderby(Poll.creation, order=frappe._dict(value="asc"))
+		.run(as_dict=1)
+	)
+	for poll in out.polls:
+		poll.doctype = "GP Poll"
+	unread_polls = [p.name for p in out.polls if not last_visit or p.creation > last_visit]
+	discussion.last_unread_poll = unread_polls[0] if unread_polls else None
+	set_child_rows(out.comments, out.polls)
+
+	out.activities = (
+		frappe.qb.from_(Activity)
+		.select(Activity.name, Activity.user, Activity.action, Activity.data, Activity.creation)
+		.where(Activity.reference_doctype == "GP Discussion")
+		.where(Activity.reference_name == doc.name)
+		.orderby(Activity.creation, order=frappe._dict(value="asc"))
+		.run(as_dict=1)
+	)
+	return out
+
+
+def set_child_rows(comments, polls):
+	"""Set the reactions of `comments` and `polls` and the options and votes of `polls`, with one
+	query per child table"""
+	children = {
+		"reactions": ("GP Reaction", ["name", "user", "emoji"], comments + polls),
+		"options": ("GP Poll Option", ["name", "title", "idx", "percentage", "votes"], polls),
+		"votes": ("GP Poll Vote", ["user", "option"], polls),
+	}
+	for fieldname, (doctype, fields, parents) in children.items():
+		for parent in parents:
+			parent[fieldname] = []
+		if not parents:
+			continue
+		by_parent = {(p.doctype, cstr(p.name)): p for p in parents}
+		rows = frappe.db.get_all(
+			doctype,
+			filters={
+				"parenttype": ["in", list({p.doctype for p in parents})],
+				"parentfield": fieldname,
+				"parent": ["in", [p.name for p in parents]],
+			},
+			fields=[*fields, "parent", "parenttype"],
+			order_by="idx asc",
+		)
+		for row in rows:
+			parent = by_parent.get((row.pop("parenttype"), cstr(row.pop("parent"))))
+			if parent:
+				parent[fieldname].append(row)
+
+
+def get_discussions_query(filters=None):
+	"""Query for the discussions matching `filters` that the user can read, without ordering or
+	limits"""
+	if not frappe.has_permission("GP Discussion", "read"):
+		frappe.throw(_("Insufficient Permission for GP Discussion"), frappe.PermissionError)
+
+	filters = dict(filters or {})
+	feed_type = filters.pop("feed_type", None)
+	participator = filters.pop("participator", None)
+	user_bookmarks = filters.pop("user_bookmarks", None)
+
 	Discussion = frappe.qb.DocType("GP Discussion")
 	Visit = frappe.qb.DocType("GP Discussion Visit")
 	Project = frappe.qb.DocType("GP Project")
 	Team = frappe.qb.DocType("GP Team")
-	Member = frappe.qb.DocType("GP Member")
-	member_exists = (
-		frappe.qb.from_(Member)
-		.select(Member.name)
-		.where(Member.parenttype == "GP Team")
-		.where(Member.parent == Project.team)
-		.where(Member.user == frappe.session.user)
-	)
 	query = (
 		frappe.qb.from_(Discussion)
 		.select(
@@ -47,32 +330,25 @@ def get_discussions(filters=None, order_by=None, limit_start=None, limit_page_le
 		.on(Discussion.project == Project.name)
 		.left_join(Team)
 		.on(Discussion.team == Team.name)
-		.where((Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists)))
-		.limit(limit_page_length)
-		.offset(limit_start or 0)
+		.where(Discussion.project.isin(get_accessible_projects() or [""]))
 	)
-	if filters:
-		for key in filters:
-			if isinstance(filters[key], list) and filters[key]:
-				query = query.where(Discussion[key].isin(filters[key]))
-			else:
-				query = query.where(Discussion[key] == filters[key])
-
-		# order by pinned_at desc if project is selected
-		if filters.get("project"):
-			query = query.orderby(Discussion.pinned_at, order=frappe._dict(value="desc"))
+	for key in filters:
+		if isinstance(filters[key], list) and filters[key]:
+			query = query.where(Discussion[key].isin(filters[key]))
+		else:
+			query = query.where(Discussion[key] == filters[key])
 
 	if participator:
-		replies = frappe.db.get_all(
-			"GP Comment",
-			fields=["reference_name"],
-			filters={"reference_doctype": "GP Discussion", "owner": participator},
-			pluck="reference_name",
+		# participating is commenting, polls count as replies in the participants table but not here
+		Comment = frappe.qb.DocType("GP Comment")
+		comments = (
+			frappe.qb.from_(Comment)
+			.select(Comment.name)
+			.where(Comment.reference_doctype == "GP Discussion")
+			.where(Comment.reference_name == Discussion.name)
+			.where(Comment.owner == participator)
 		)
-		if not replies:
-			return []
-		replies = list(set(replies))
-		query = query.where(Discussion.name.isin(replies))
+		query = query.where(ExistsCriterion(comments))
 
 	if user_bookmarks:
 		Bookmark = frappe.qb.DocType("GP Bookmark")
@@ -91,16 +367,24 @@ def get_discussions(filters=None, order_by=None, limit_start=None, limit_page_le
 		)
 		query = query.where(Discussion.project.isin(followed_projects))
 
-	# default order by last_post_at desc
-	query = query.orderby(Discussion[order_field], order=frappe._dict(value=order_direction))
+	return query
 
-	is_guest = gameplan.is_guest()
-	if is_guest:
-		GuestAccess = frappe.qb.DocType("GP Guest Access")
-		project_list = GuestAccess.select(GuestAccess.project).where(GuestAccess.user == frappe.session.user)
-		query = query.where(Discussion.project.isin(project_list))
 
-	discussions = query.run(as_dict=1)
+def set_buffered_visits(discussions, filters=None):
+	"""Merge the visits that are not written to the visit table yet into `last_visit`, and drop
+	the discussions they make read from unread feeds"""
+	if not discussions:
+		return discussions
+
+	buffered = get_buffered_visits("GP Discussion", [d.name for d in discussions], frappe.session.user)
+	for d in discussions:
+		d.last_visit = max_visit(d.last_visit, buffered.get(cstr(d.name)))
+	if (filters or {}).get("feed_type") == "unread":
+		discussions = [d for d in discussions if not d.last_visit or d.last_visit < d.last_post_at]
+	return discussions
+
+
+def set_ongoing_polls(discussions):
 	Poll = frappe.qb.DocType("GP Poll")
 	discussion_names = [d.name for d in discussions]
 	ongoing_polls = (
@@ -117,5 +401,29 @@ def get_discussions(filters=None, order_by=None, limit_start=None, limit_page_le
 	)
 	for discussion in discussions:
 		discussion["ongoing_polls"] = [p for p in ongoing_polls if str(p.discussion) == str(discussion.name)]
-	return discussions
 
+
+def get_cursor_condition(field, order_direction, value, name):
+	"""Rows after the position (`value`, `name`) of the cursor within its group, of the rows with
+	a value of `field` or of the rows without one, which are ordered by name alone"""
+	Discussion = frappe.qb.DocType("GP Discussion")
+	after = operator.lt if order_direction == "desc" else operator.gt
+	if value is None:
+		return after(Discussion.name, name)
+	return after(field, value) | ((field == value) & after(Discussion.name, name))
+
+
+def encode_cursor(order_field, row):
+	value = row[order_field]
+	position = [order_field, None if value is None else cstr(value), cint(row.name)]
+	return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor, order_field):
+	try:
+		field, value, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+		if field != order_field:
+			raise ValueError
+		return (None if value is None else get_datetime(value)), cint(name)
+	except Exception:
+		frappe.throw(_("Invalid cursor"))
@@ -4,17 +4,28 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
+from frappe.query_builder.functions import Coalesce
+from frappe.utils import cstr
 
+import gameplan
+from gameplan import counters, unread, visits
+from gameplan.gameplan.doctype.gp_discussion_participant.gp_discussion_participant import add_participant
 from gameplan.gameplan.doctype.gp_notification.gp_notification import GPNotification
 from gameplan.mixins.activity import HasActivity
 from gameplan.mixins.mentions import HasMentions
 from gameplan.mixins.reactions import HasReactions
-from gameplan.search import GameplanSearch
-from gameplan.utils import remove_empty_trailing_paragraphs, url_safe_slug
+from gameplan.search import queue_index_update
+from gameplan.utils import get_content, url_safe_slug
 
 
 class GPDiscussion(HasActivity, HasMentions, HasReactions, Document):
-	on_delete_cascade = ["GP Comment", "GP Discussion Visit", "GP Activity", "GP Poll"]
+	on_delete_cascade = [
+		"GP Comment",
+		"GP Discussion Visit",
+		"GP Activity",
+		"GP Poll",
+		"GP Discussion Participant",
+	]
 	on_delete_set_null = ["GP Notification"]
 	activities = [
 		_("Discussion Closed"),
@@ -25,60 +36,34 @@ class GPDiscussion(HasActivity, HasMentions, HasReactions, Document):
 	]
 	mentions_field = "content"
 
-	def as_dict(self, *args, **kwargs):
-		d = super(__class__, self).as_dict(*args, **kwargs)
-		last_visit = frappe.db.get_value(
-			"GP Discussion Visit", {"discussion": self.name, "user": frappe.session.user}, "last_visit"
-		)
-		if last_visit:
-			result = frappe.db.get_all(
-				"GP Comment",
-				filters={
-					"reference_doctype": self.doctype,
-					"reference_name": self.name,
-					"creation": (">", last_visit),
-				},
-				order_by="creation asc",
-				limit=1,
-				pluck="name",
-			)
-			d.last_unread_comment = result[0] if result else None
-		else:
-			d.last_unread_comment = "first_post"
-
-		polls = frappe.db.get_all(
-			"GP Poll",
-			filters={"discussion": self.name, "creation": (">", last_visit)},
-			order_by="creation asc",
-			limit=1,
-			pluck="name",
-		)
-		d.last_unread_poll = polls[0] if polls else None
-		d.is_bookmarked = self.is_bookmarked()
-		return d
-
 	def before_insert(self):
 		self.last_post_at = frappe.utils.now()
-		self.update_participants_count()
+		# the author
+		self.participants_count = 1
 
 	def after_insert(self):
+		add_participant(self.name, self.owner, replies=0, started=1)
 		self.update_discussions_count(1)
+		unread.on_discussion_insert(self)
 
 	def on_trash(self):
 		self.remove_bookmark()
 		self.update_discussions_count(-1)
+		unread.on_discussion_trash(self)
+		queue_index_update(self)
 
 	def validate(self):
-		self.content = remove_empty_trailing_paragraphs(self.content)
+		self.content = get_content(self, "content").html
 		self.title = self.title.strip()
 		self.de_duplicate_reactions()
 
 	def on_update(self):
+		self.move_discussions_count()
 		self.notify_mentions()
 		self.notify_reactions()
 		self.log_title_update()
-		self.update_participants_count()
 		self.update_search_index()
+		unread.on_discussion_update(self)
 
 	def before_save(self):
 		self.update_slug()
@@ -95,38 +80,13 @@ class GPDiscussion(HasActivity, HasMentions, HasReactions, Document):
 
 	def update_search_index(self):
 		if self.has_value_changed("title") or self.has_value_changed("content"):
-			search = GameplanSearch()
-			search.index_doc(self)
-
-	def update_participants_count(self):
-		participants = frappe.db.get_all(
-			"GP Comment",
-			filters={"reference_doctype": self.doctype, "reference_name": self.name},
-			pluck="owner",
-		)
-		participants += frappe.db.get_all("GP Poll", filters={"discussion": self.name}, pluck="owner")
-		participants.append(self.owner)
-		self.participants_count = len(list(set(participants)))
+			queue_index_update(self)
 
 	@frappe.whitelist()
 	def track_visit(self):
 		if frappe.flags.read_only:
 			return
-
-		values = {"user": frappe.session.user, "discussion": self.name}
-		existing = frappe.db.get_value("GP Discussion Visit", values)
-		if existing:
-			visit = frappe.get_doc("GP Discussion Visit", existing)
-			visit.last_visit = frappe.utils.now()
-			visit.save(ignore_permissions=True)
-		else:
-			visit = frappe.get_doc(doctype="GP Discussion Visit")
-			visit.update(values)
-			visit.last_visit = frappe.utils.now()
-			visit.insert(ignore_permissions=True)
-
-		# also mark notifications as read
-		GPNotification.clear_notifications(discussion=self.name)
+		track_discussion_visit(self.name)
 
 	@frappe.whitelist()
 	def move_to_project(self, project):
@@ -192,6 +152,51 @@ class GPDiscussion(HasActivity, HasMentions, HasReactions, Document):
 		return bool(frappe.db.exists("GP Bookmark", {"discussion": self.name, "user": frappe.session.user}))
 
 	def update_discussions_count(self, delta=1):
-		project = frappe.get_doc("GP Project", self.project)
-		project.discussions_count = project.discussions_count + delta
-		project.save(ignore_permissions=True)
+		counters.increment("GP Project", self.project, discussions_count=delta)
+
+	def move_discussions_count(self):
+		previous = self.get_doc_before_save()
+		if previous and self.has_value_changed("project"):
+			counters.increment("GP Project", previous.project, discussions_count=-1)
+			self.update_discussions_count(1)
+
+
+def track_discussion_visit(discussion):
+	previous_visit = visits.get_last_visits("GP Discussion", [discussion]).get(cstr(discussion))
+	last_visit = visits.track_visit("GP Discussion", discussion)
+	unread.on_visit(frappe.session.user, discussion, previous_visit, last_visit)
+	gameplan.refetch_resource("UnreadItems")
+
+	# also mark notifications as read
+	GPNotification.clear_notifications(discussion=discussion)
+
+
+def add_post(discussion, user):
+	"""Record a reply by `user` in `discussion` without loading and saving the discussion, which
+	would validate it and notify its mentions and reactions again. Its last post, comments count
+	and participants count are set with one atomic update, and the unread counts and the visit
+	of the poster are updated as saving it would."""
+	values = frappe.db.get_value("GP Discussion", discussion, ["project", "last_post_at"], for_update=True)
+	if not values:
+		frappe.throw(_("Discussion {0} not found").format(discussion), frappe.DoesNotExistError)
+	project, previous_post_at = values
+	last_post_at = frappe.utils.now()
+
+	Discussion = frappe.qb.DocType("GP Discussion")
+	query = (
+		frappe.qb.update(Discussion)
+		.set(Discussion.last_post_at, last_post_at)
+		.set(Discussion.last_post_by, user)
+		.set(Discussion.modified, last_post_at)
+		.set(Discussion.comments_count, Coalesce(Discussion.comments_count, 0) + 1)
+		.where(Discussion.name == discussion)
+	)
+	if add_participant(discussion, user):
+		query = query.set(Discussion.participants_count, Coalesce(Discussion.participants_count, 0) + 1)
+	query.run()
+	# suggestions and search results rank discussions by their last post
+	queue_index_update(frappe._dict(doctype="GP Discussion", name=discussion))
+
+	unread.on_new_post(discussion, project, previous_post_at, last_post_at)
+	if not frappe.flags.read_only:
+		track_discussion_visit(discussion)
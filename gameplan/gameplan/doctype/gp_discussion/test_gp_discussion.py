@@ -1,9 +1,332 @@
 # Copyright (c) 2023, Frappe Technologies Pvt Ltd and Contributors
 # See license.txt
 
-# import frappe
+from datetime import timedelta
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
+
+from gameplan import unread, visits
+from gameplan.gameplan.doctype.gp_discussion.api import (
+	get_discussion_detail,
+	get_discussion_feed,
+	mark_all_as_read,
+)
+from gameplan.gameplan.doctype.gp_discussion.gp_discussion import add_post, track_discussion_visit
+
+
+def make_project(is_private=0):
+	team = frappe.get_doc(
+		doctype="GP Team", title=f"Test Team {frappe.generate_hash(length=6)}", is_private=is_private
+	).insert()
+	return frappe.get_doc(doctype="GP Project", title="Test Project", team=team.name).insert()
+
+
+def make_discussion(project, title="Test Discussion", content="<p>Test content</p>"):
+	return frappe.get_doc(
+		doctype="GP Discussion", project=project.name, title=title, content=content
+	).insert()
+
+
+def make_user(email="test_member@example.com"):
+	if not frappe.db.exists("User", email):
+		frappe.get_doc(
+			doctype="User",
+			email=email,
+			first_name="Test",
+			send_welcome_email=0,
+			roles=[{"role": "Gameplan Member"}],
+		).insert(ignore_permissions=True)
+	return email
+
+
+def reset_unread_counters(*users):
+	"""Drop the unread counters, so that they are built from the database on their next read"""
+	cache = frappe.cache()
+	keys = [unread.DISCUSSIONS_KEY, *(unread.get_read_key(user) for user in users)]
+	cache.delete(*[cache.make_key(key) for key in keys])
+
+
+def apply_unread_deltas_now():
+	"""Changes to unread counters are applied on commit, which tests never do"""
+	return patch("gameplan.unread.apply_after_commit", side_effect=unread.apply_deltas)
 
 
 class TestGPDiscussion(FrappeTestCase):
-	pass
+	def get_feed(self, project, order_by, **filters):
+		"""Names of the feed a page at a time, asserting that every page is full but the last"""
+		pages, cursor = [], None
+		while True:
+			page = get_discussion_feed(
+				filters={"project": project.name, **filters}, order_by=order_by, cursor=cursor, page_length=1
+			)
+			pages.append([d.name for d in page.discussions])
+			cursor = page.next_cursor
+			if not cursor:
+				self.assertTrue(all(len(names) == 1 for names in pages[:-1]))
+				return [name for names in pages for name in names]
+
+	def test_feed_pages_past_discussions_without_last_post(self):
+		project = make_project()
+		discussions = [make_discussion(project, title=f"Discussion {i}") for i in range(4)]
+		frappe.db.set_value("GP Discussion", discussions[1].name, "last_post_at", None, update_modified=False)
+
+		names = [d.name for d in discussions]
+		for order_by in ["last_post_at desc", "last_post_at asc", "creation desc"]:
+			with self.subTest(order_by=order_by):
+				self.assertCountEqual(self.get_feed(project, order_by), names)
+
+	def test_unread_feed_pages_are_full(self):
+		user = make_user()
+		project = make_project()
+		discussions = [make_discussion(project, title=f"Discussion {i}") for i in range(5)]
+		self.addCleanup(frappe.set_user, "Administrator")
+		frappe.set_user(user)
+		# buffered visits are not in the visit table, so read rows are only dropped after the query
+		for discussion in discussions[1:4]:
+			visits.track_visit("GP Discussion", discussion.name)
+
+		unread_names = [discussions[4].name, discussions[0].name]
+		self.assertEqual(self.get_feed(project, "last_post_at desc", feed_type="unread"), unread_names)
+		self.assertEqual(self.get_feed(project, "last_post_at desc"), [d.name for d in reversed(discussions)])
+
+	def test_add_post_counts_from_null(self):
+		discussion = make_discussion(make_project())
+		frappe.db.set_value(
+			"GP Discussion",
+			discussion.name,
+			{"comments_count": None, "modified": "2020-01-01 00:00:00"},
+			update_modified=False,
+		)
+		add_post(discussion.name, "Administrator")
+
+		values = frappe.db.get_value(
+			"GP Discussion", discussion.name, ["comments_count", "last_post_at", "modified"], as_dict=True
+		)
+		self.assertEqual(values.comments_count, 1)
+		self.assertEqual(values.modified, values.last_post_at)
+
+	def test_add_post_to_missing_discussion(self):
+		self.assertRaises(frappe.DoesNotExistError, add_post, "0", "Administrator")
+
+
+class TestUnreadCounts(FrappeTestCase):
+	def setUp(self):
+		self.user = make_user()
+		self.project = make_project()
+		reset_unread_counters("Administrator", self.user)
+
+	def tearDown(self):
+		frappe.set_user("Administrator")
+		reset_unread_counters("Administrator", self.user)
+
+	def get_unread(self, user):
+		return unread.get_unread_counts(user).get(str(self.project.name), 0)
+
+	def assert_unread(self, user, count):
+		self.assertEqual(self.get_unread(user), count)
+		# built from the database and the visit buffer, the counters agree with their changes
+		reset_unread_counters(user)
+		self.assertEqual(self.get_unread(user), count)
+
+	def test_visits_and_posts(self):
+		self.assert_unread(self.user, 0)
+		with apply_unread_deltas_now():
+			discussion = make_discussion(self.project)
+			self.assertEqual(self.get_unread(self.user), 1)
+
+			frappe.set_user(self.user)
+			track_discussion_visit(discussion.name)
+			self.assertEqual(self.get_unread(self.user), 0)
+
+			frappe.set_user("Administrator")
+			add_post(discussion.name, "Administrator")
+			self.assertEqual(self.get_unread(self.user), 1)
+			self.assertEqual(self.get_unread("Administrator"), 0)
+
+		self.assert_unread(self.user, 1)
+		self.assert_unread("Administrator", 0)
+
+
+class TestMarkAllAsRead(FrappeTestCase):
+	def setUp(self):
+		self.user = make_user()
+		first = make_project()
+		self.projects = {
+			"first": first,
+			"same_team": frappe.get_doc(doctype="GP Project", title="Test Project", team=first.team).insert(),
+			"other_team": make_project(),
+		}
+		self.discussions = {key: make_discussion(project) for key, project in self.projects.items()}
+		self.notification = frappe.get_doc(
+			doctype="GP Notification",
+			type="Mention",
+			from_user="Administrator",
+			to_user=self.user,
+			discussion=self.discussions["other_team"].name,
+		).insert(ignore_permissions=True)
+		reset_unread_counters(self.user)
+		frappe.set_user(self.user)
+
+	def tearDown(self):
+		frappe.set_user("Administrator")
+		reset_unread_counters(self.user)
+
+	def get_unread(self):
+		counts = unread.get_unread_counts(self.user)
+		return {key: counts.get(str(project.name), 0) for key, project in self.projects.items()}
+
+	def is_notification_read(self):
+		return frappe.db.get_value("GP Notification", self.notification.name, "read")
+
+	def test_mark_all_as_read_by_scope(self):
+		self.assertEqual(self.get_unread(), {"first": 1, "same_team": 1, "other_team": 1})
+
+		mark_all_as_read(project=self.projects["first"].name)
+		self.assertEqual(self.get_unread(), {"first": 0, "same_team": 1, "other_team": 1})
+
+		mark_all_as_read(team=self.projects["first"].team)
+		self.assertEqual(self.get_unread(), {"first": 0, "same_team": 0, "other_team": 1})
+		self.assertFalse(self.is_notification_read())
+
+		mark_all_as_read()
+		self.assertEqual(self.get_unread(), {"first": 0, "same_team": 0, "other_team": 0})
+		self.assertTrue(self.is_notification_read())
+		# built from the visit table alone, the counters agree
+		reset_unread_counters(self.user)
+		self.assertEqual(self.get_unread(), {"first": 0, "same_team": 0, "other_team": 0})
+
+
+class TestVisitBuffer(FrappeTestCase):
+	def setUp(self):
+		self.project = make_project()
+		self.discussion = make_discussion(self.project)
+
+	def get_written_visit(self, doctype, name):
+		visit_doctype, reference_field = visits.VISIT_DOCTYPES[doctype]
+		return frappe.db.get_value(
+			visit_doctype, {reference_field: name, "user": "Administrator"}, "last_visit"
+		)
+
+	def flush(self):
+		# flushing commits the upserts, which would keep the records of the test
+		with patch.object(frappe.db, "commit"):
+			visits.flush_visits()
+
+	def test_visits_are_buffered_and_flushed(self):
+		for doctype, name in [("GP Discussion", self.discussion.name), ("GP Project", self.project.name)]:
+			with self.subTest(doctype=doctype):
+				visited_at = get_datetime(visits.track_visit(doctype, name))
+				self.assertIsNone(self.get_written_visit(doctype, name))
+				self.assertEqual(visits.get_last_visits(doctype, [name]), {str(name): visited_at})
+				self.assertEqual(visits.get_buffered_visitors(doctype, name), {"Administrator": visited_at})
+
+				self.flush()
+				self.assertEqual(self.get_written_visit(doctype, name), visited_at)
+				self.assertEqual(visits.get_buffered_visitors(doctype, name), {})
+				self.assertEqual(visits.get_last_visits(doctype, [name]), {str(name): visited_at})
+
+	def test_revisit_reads_the_buffered_visit(self):
+		user = make_user()
+		name = str(self.discussion.name)
+		reset_unread_counters(user)
+		self.addCleanup(reset_unread_counters, user)
+		self.addCleanup(frappe.set_user, "Administrator")
+		self.assertEqual(unread.get_unread_counts(user).get(str(self.project.name)), 1)
+
+		with apply_unread_deltas_now():
+			frappe.set_user(user)
+			track_discussion_visit(name)
+			self.assertIsNotNone(visits.get_last_visits("GP Discussion", [name]).get(name))
+			# reading it again changes nothing, the discussion was read already
+			track_discussion_visit(name)
+			frappe.set_user("Administrator")
+			add_post(name, "Administrator")
+
+		self.assertEqual(unread.get_unread_counts(user).get(str(self.project.name)), 1)
+
+	def test_upsert_keeps_the_later_visit(self):
+		name = str(self.discussion.name)
+		visited_at = get_datetime(visits.track_visit("GP Discussion", name))
+		self.flush()
+
+		visits.upsert_visits("GP Discussion", [(name, "Administrator", "2020-01-01 00:00:00")])
+		self.assertEqual(self.get_written_visit("GP Discussion", name), visited_at)
+		self.assertEqual(frappe.db.count("GP Discussion Visit", {"discussion": name}), 1)
+
+	def test_upsert_skips_deleted_records(self):
+		visits.upsert_visits("GP Discussion", [("0", "Administrator", frappe.utils.now())])
+		self.assertFalse(frappe.db.exists("GP Discussion Visit", {"discussion": "0"}))
+
+
+class TestDiscussionDetail(FrappeTestCase):
+	def setUp(self):
+		self.user = make_user()
+		self.discussion = make_discussion(make_project())
+		self.start = get_datetime("2020-01-01 00:00:00")
+		self.comments = [self.make_comment(i) for i in range(6)]
+
+	def tearDown(self):
+		frappe.set_user("Administrator")
+
+	def make_comment(self, i):
+		comment = frappe.get_doc(
+			doctype="GP Comment",
+			reference_doctype="GP Discussion",
+			reference_name=self.discussion.name,
+			content=f"<p>Comment {i}</p>",
+		).insert()
+		creation = self.start + timedelta(minutes=i)
+		frappe.db.set_value("GP Comment", comment.name, "creation", creation, update_modified=False)
+		return comment.name
+
+	def visit_after_comment(self, i):
+		visited_at = self.start + timedelta(minutes=i, seconds=30)
+		visits.upsert_visits("GP Discussion", [(str(self.discussion.name), self.user, visited_at)])
+
+	def get_detail(self):
+		frappe.set_user(self.user)
+		detail = get_discussion_detail(self.discussion.name, comments_before=2, comments_after=2)
+		frappe.set_user("Administrator")
+		return detail
+
+	def assert_window(self, detail, indexes, more_before, more_after):
+		self.assertEqual([c.name for c in detail.comments], [self.comments[i] for i in indexes])
+		self.assertEqual((detail.more_comments_before, detail.more_comments_after), (more_before, more_after))
+
+	def test_window_before_first_visit(self):
+		detail = self.get_detail()
+		self.assert_window(detail, [0, 1], more_before=False, more_after=True)
+		self.assertEqual(detail.discussion.last_unread_comment, "first_post")
+
+	def test_window_around_first_unread_comment(self):
+		self.visit_after_comment(2)
+		detail = self.get_detail()
+		self.assert_window(detail, [1, 2, 3, 4], more_before=True, more_after=True)
+		self.assertEqual(detail.discussion.last_unread_comment, self.comments[3])
+		self.assertIsNone(detail.discussion.last_unread_poll)
+
+	def test_window_of_latest_comments_when_all_are_read(self):
+		self.visit_after_comment(5)
+		detail = self.get_detail()
+		self.assert_window(detail, [2, 3, 4, 5], more_before=True, more_after=False)
+		self.assertIsNone(detail.discussion.last_unread_comment)
+		self.assertFalse(detail.discussion.is_bookmarked)
+
+	def test_polls_with_votes(self):
+		self.visit_after_comment(5)
+		poll = frappe.get_doc(
+			doctype="GP Poll",
+			discussion=self.discussion.name,
+			title="Test Poll",
+			options=[{"title": "Yes", "votes": 1, "percentage": 100}, {"title": "No"}],
+			votes=[{"user": self.user, "option": "Yes"}],
+		).insert()
+
+		detail = self.get_detail()
+		self.assertEqual(detail.discussion.last_unread_poll, poll.name)
+		self.assertEqual(detail.polls[0].total_votes, 1)
+		self.assertEqual([(o.title, o.votes) for o in detail.polls[0].options], [("Yes", 1), ("No", 0)])
+		self.assertEqual([v.user for v in detail.polls[0].votes], [self.user])
@@ -0,0 +1,7 @@
+// Copyright (c) 2026, Frappe Technologies Pvt Ltd and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("GP Discussion Participant", {
+  // refresh: function(frm) {
+  // }
+});
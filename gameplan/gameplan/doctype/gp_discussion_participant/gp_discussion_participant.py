@@ -0,0 +1,61 @@
+# Copyright (c) 2026, Frappe Technologies Pvt Ltd and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+from gameplan import counters
+from gameplan.utils import get_affected_rows
+
+
+class GPDiscussionParticipant(Document):
+	pass
+
+
+def add_participant(discussion, user, replies=1, started=0):
+	"""Count `replies` by `user` in `discussion`, or `user` starting it, with one upsert. Returns
+	whether `user` was not a participant yet. Callers hold the lock on the discussion row, like
+	`add_post`, so that concurrent replies see each other's participants."""
+	is_new = not frappe.db.exists("GP Discussion Participant", {"discussion": discussion, "user": user})
+	now = frappe.utils.now()
+	frappe.db.sql(
+		"""INSERT INTO `tabGP Discussion Participant`
+			(name, discussion, `user`, replies, started, creation, modified, owner, modified_by)
+		VALUES (
+			NEXTVAL(`gp_discussion_participant_id_seq`), %(discussion)s, %(user)s, %(replies)s,
+			%(started)s, %(now)s, %(now)s, %(user)s, %(user)s
+		)
+		ON DUPLICATE KEY UPDATE
+			replies = replies + VALUES(replies),
+			started = GREATEST(started, VALUES(started)),
+			modified = VALUES(modified)""",
+		{"discussion": discussion, "user": user, "replies": replies, "started": started, "now": now},
+	)
+	return is_new
+
+
+def remove_reply(discussion, user):
+	"""Uncount a deleted reply by `user` in `discussion`, and the participant with it if it was
+	their last one and they did not start the discussion"""
+	Participant = frappe.qb.DocType("GP Discussion Participant")
+	(
+		frappe.qb.update(Participant)
+		.set(Participant.replies, Participant.replies - 1)
+		.where(Participant.discussion == discussion)
+		.where(Participant.user == user)
+		.where(Participant.replies > 0)
+	).run()
+	(
+		frappe.qb.from_(Participant)
+		.delete()
+		.where(Participant.discussion == discussion)
+		.where(Participant.user == user)
+		.where(Participant.replies == 0)
+		.where(Participant.started == 0)
+	).run()
+	if get_affected_rows():
+		counters.increment("GP Discussion", discussion, participants_count=-1)
+
+
+def after_doctype_insert():
+	frappe.db.add_unique("GP Discussion Participant", ["discussion", "user"])
@@ -0,0 +1,45 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+
+import frappe
+
+
+def execute():
+	"""Fill the participants of existing discussions from their authors, comments and polls, and
+	set their participants count from them"""
+	now = frappe.utils.now()
+	frappe.db.delete("GP Discussion Participant")
+	frappe.db.sql(
+		"""INSERT INTO `tabGP Discussion Participant`
+			(name, discussion, `user`, replies, started, creation, modified, owner, modified_by)
+		SELECT
+			NEXTVAL(`gp_discussion_participant_id_seq`), p.discussion, p.user, p.replies,
+			p.started, %(now)s, %(now)s, p.user, p.user
+		FROM (
+			SELECT posts.discussion, posts.user, SUM(posts.reply) AS replies, MAX(posts.started) AS started
+			FROM (
+				SELECT name AS discussion, owner AS user, 0 AS reply, 1 AS started
+				FROM `tabGP Discussion`
+				UNION ALL
+				SELECT reference_name, owner, 1, 0
+				FROM `tabGP Comment`
+				WHERE reference_doctype = 'GP Discussion'
+				UNION ALL
+				SELECT discussion, owner, 1, 0
+				FROM `tabGP Poll`
+			) posts
+			JOIN `tabGP Discussion` d ON d.name = posts.discussion
+			GROUP BY posts.discussion, posts.user
+		) p""",
+		{"now": now},
+	)
+	frappe.db.sql(
+		"""UPDATE `tabGP Discussion` d
+		JOIN (
+			SELECT discussion, COUNT(*) AS participants
+			FROM `tabGP Discussion Participant`
+			GROUP BY discussion
+		) p ON p.discussion = d.name
+		SET d.participants_count = p.participants"""
+	)
@@ -0,0 +1,102 @@
+# Copyright (c) 2026, Frappe Technologies Pvt Ltd and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from gameplan.gameplan.doctype.gp_discussion.api import get_discussions
+from gameplan.gameplan.doctype.gp_discussion.test_gp_discussion import (
+	make_discussion,
+	make_project,
+	make_user,
+)
+
+
+class TestGPDiscussionParticipant(FrappeTestCase):
+	def setUp(self):
+		self.user = make_user()
+		self.project = make_project()
+		self.discussion = make_discussion(self.project)
+
+	def tearDown(self):
+		frappe.set_user("Administrator")
+
+	def reply(self, user):
+		frappe.set_user(user)
+		comment = frappe.get_doc(
+			doctype="GP Comment",
+			reference_doctype="GP Discussion",
+			reference_name=self.discussion.name,
+			content="<p>Reply</p>",
+		).insert(ignore_permissions=True)
+		frappe.set_user("Administrator")
+		return comment
+
+	def get_participants(self):
+		return {
+			p.user: p
+			for p in frappe.db.get_all(
+				"GP Discussion Participant",
+				filters={"discussion": self.discussion.name},
+				fields=["user", "replies", "started"],
+			)
+		}
+
+	def get_participants_count(self):
+		return frappe.db.get_value("GP Discussion", self.discussion.name, "participants_count")
+
+	def test_starter_is_a_participant(self):
+		participants = self.get_participants()
+		self.assertEqual(list(participants), ["Administrator"])
+		self.assertEqual(
+			(participants["Administrator"].replies, participants["Administrator"].started), (0, 1)
+		)
+		self.assertEqual(self.get_participants_count(), 1)
+
+	def test_replying_twice_counts_one_participant(self):
+		self.reply(self.user)
+		self.reply(self.user)
+		self.assertEqual(self.get_participants()[self.user].replies, 2)
+		self.assertEqual(self.get_participants_count(), 2)
+
+	def test_deleting_last_reply_removes_participant(self):
+		comments = [self.reply(self.user), self.reply(self.user)]
+		frappe.delete_doc("GP Comment", comments[0].name)
+		self.assertEqual(self.get_participants()[self.user].replies, 1)
+		self.assertEqual(self.get_participants_count(), 2)
+
+		frappe.delete_doc("GP Comment", comments[1].name)
+		self.assertNotIn(self.user, self.get_participants())
+		self.assertEqual(self.get_participants_count(), 1)
+
+	def test_starter_is_kept_without_replies(self):
+		comment = self.reply("Administrator")
+		self.assertEqual(self.get_participants()["Administrator"].replies, 1)
+
+		frappe.delete_doc("GP Comment", comment.name)
+		self.assertEqual(self.get_participants()["Administrator"].replies, 0)
+		self.assertEqual(self.get_participants_count(), 1)
+
+	def test_participator_filter(self):
+		def get_names(participator):
+			filters = {"project": self.project.name, "participator": participator}
+			return [d.name for d in get_discussions(filters=filters)]
+
+		# starting a discussion is not participating in it
+		self.assertEqual(get_names("Administrator"), [])
+		self.assertEqual(get_names(self.user), [])
+
+		self.reply(self.user)
+		self.reply(self.user)
+		self.assertEqual(get_names(self.user), [self.discussion.name])
+		self.assertEqual(get_names("Administrator"), [])
+
+		# polls count as replies, but only comments as participating
+		frappe.get_doc(
+			doctype="GP Poll",
+			discussion=self.discussion.name,
+			title="Test Poll",
+			options=[{"title": "Yes"}, {"title": "No"}],
+		).insert()
+		self.assertEqual(self.get_participants()["Administrator"].replies, 1)
+		self.assertEqual(get_names("Administrator"), [])
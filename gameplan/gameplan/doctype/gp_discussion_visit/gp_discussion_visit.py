@@ -5,6 +5,7 @@ import frappe
 from frappe.model.document import Document
 
 import gameplan
+from gameplan.unread import on_visit_change
 
 
 class GPDiscussionVisit(Document):
@@ -13,6 +14,7 @@ class GPDiscussionVisit(Document):
 
 	def on_change(self):
 		if self.has_value_changed("last_visit"):
+			on_visit_change(self)
 			gameplan.refetch_resource("UnreadItems", user=self.user)
 
 
@@ -4,11 +4,16 @@
 # import frappe
 from frappe.model.document import Document
 
+from gameplan.access import clear_access_cache
 from gameplan.mixins.on_delete import delete_linked_records
 
 
 class GPGuestAccess(Document):
-	pass
+	def on_update(self):
+		clear_access_cache(self.user)
+
+	def on_trash(self):
+		clear_access_cache(self.user)
 
 
 def on_user_delete(doc, method):
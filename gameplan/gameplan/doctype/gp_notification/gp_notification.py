@@ -5,6 +5,7 @@ import frappe
 from frappe.model.document import Document
 
 import gameplan
+from gameplan.utils import get_affected_rows
 
 
 class GPNotification(Document):
@@ -13,19 +14,45 @@ class GPNotification(Document):
 
 	@staticmethod
 	def clear_notifications(discussion=None, comment=None, task=None, user=None):
-		if not user:
-			user = frappe.session.user
-		filters = {"to_user": user}
+		"""Mark the unread notifications of `user` about `discussion`, `comment` or `task` as read.
+		Returns the number of notifications marked."""
+		Notification = frappe.qb.DocType("GP Notification")
+		criteria = []
 		if discussion:
-			filters["discussion"] = discussion
+			criteria.append(Notification.discussion == discussion)
 		if comment:
-			filters["comment"] = comment
+			criteria.append(Notification.comment == comment)
 		if task:
-			filters["task"] = task
+			criteria.append(Notification.task == task)
+		return GPNotification.mark_as_read(criteria, user=user)
 
-		for notification in frappe.get_all("GP Notification", filters=filters):
-			doc = frappe.get_doc("GP Notification", notification.name)
-			doc.read = 1
-			doc.save()
+	@staticmethod
+	def mark_as_read(criteria=None, user=None, refetch=True):
+		"""Mark the unread notifications of `user` matching `criteria`, a list of query builder
+		conditions on GP Notification, as read with one update. Returns the number of notifications
+		marked and refetches the unread count if any was. Nothing is written when none is unread,
+		as on most page views."""
+		user = user or frappe.session.user
+		Notification = frappe.qb.DocType("GP Notification")
+		criteria = [Notification.to_user == user, Notification.read == 0, *(criteria or [])]
+
+		unread = frappe.qb.from_(Notification).select(Notification.name)
+		for criterion in criteria:
+			unread = unread.where(criterion)
+		if not unread.limit(1).run():
+			return 0
+
+		query = (
+			frappe.qb.update(Notification)
+			.set(Notification.read, 1)
+			.set(Notification.modified, frappe.utils.now())
+			.set(Notification.modified_by, frappe.session.user)
+		)
+		for criterion in criteria:
+			query = query.where(criterion)
+		query.run()
 
-		gameplan.refetch_resource("Unread Notifications Count", user=user)
+		count = get_affected_rows()
+		if count and refetch:
+			gameplan.refetch_resource("Unread Notifications Count", user=user)
+		return count
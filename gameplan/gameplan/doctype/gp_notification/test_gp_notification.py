@@ -1,9 +1,41 @@
 # Copyright (c) 2022, Frappe Technologies Pvt Ltd and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from gameplan.gameplan.doctype.gp_discussion.test_gp_discussion import make_discussion, make_project
+from gameplan.gameplan.doctype.gp_notification.gp_notification import GPNotification
+
 
 class TestGPNotification(FrappeTestCase):
-	pass
+	def setUp(self):
+		self.discussion = make_discussion(make_project())
+
+	def make_notification(self, to_user="Administrator"):
+		return frappe.get_doc(
+			doctype="GP Notification",
+			to_user=to_user,
+			type="Mention",
+			discussion=self.discussion.name,
+		).insert()
+
+	def test_clear_notifications(self):
+		notifications = [self.make_notification(), self.make_notification()]
+		other = self.make_notification(to_user="Guest")
+
+		self.assertEqual(GPNotification.clear_notifications(discussion=self.discussion.name), 2)
+		for notification in notifications:
+			self.assertEqual(frappe.db.get_value("GP Notification", notification.name, "read"), 1)
+		self.assertEqual(frappe.db.get_value("GP Notification", other.name, "read"), 0)
+
+	def test_clear_without_unread_notifications_writes_nothing(self):
+		self.make_notification()
+		GPNotification.clear_notifications(discussion=self.discussion.name)
+
+		with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+			self.assertEqual(GPNotification.clear_notifications(discussion=self.discussion.name), 0)
+		statements = [str(call.args[0]).lstrip().upper() for call in sql.call_args_list]
+		self.assertFalse([statement for statement in statements if statement.startswith("UPDATE")])
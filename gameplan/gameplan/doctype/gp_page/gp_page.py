@@ -4,7 +4,7 @@
 # import frappe
 from frappe.model.document import Document
 
-from gameplan.search import GameplanSearch
+from gameplan.search import queue_index_update
 from gameplan.utils import url_safe_slug
 
 
@@ -17,12 +17,10 @@ class GPPage(Document):
 
 	def update_search_index(self):
 		if self.has_value_changed("title") or self.has_value_changed("content"):
-			search = GameplanSearch()
-			search.index_doc(self)
+			queue_index_update(self)
 
 	def on_trash(self):
-		search = GameplanSearch()
-		search.remove_doc(self)
+		queue_index_update(self)
 
 
 def has_permission(doc, user, ptype):
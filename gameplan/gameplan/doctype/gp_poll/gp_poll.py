@@ -5,6 +5,10 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils import flt
 
+from gameplan import counters
+from gameplan.gameplan.doctype.gp_discussion.gp_discussion import add_post
+from gameplan.gameplan.doctype.gp_discussion_participant.gp_discussion_participant import remove_reply
+
 from .gp_poll_attributes import GPPollAttributes
 
 
@@ -22,13 +26,11 @@ class GPPoll(Document, GPPollAttributes):
 		self.total_votes = len(self.votes)
 
 	def after_insert(self):
-		discussion = frappe.get_doc("GP Discussion", self.discussion)
-		discussion.last_post_at = frappe.utils.now()
-		discussion.last_post_by = frappe.session.user
-		discussion.comments_count = discussion.comments_count + 1
-		discussion.update_participants_count()
-		discussion.track_visit()
-		discussion.save(ignore_permissions=True)
+		add_post(self.discussion, self.owner)
+
+	def on_trash(self):
+		remove_reply(self.discussion, self.owner)
+		counters.increment("GP Discussion", self.discussion, comments_count=-1)
 
 	@frappe.whitelist()
 	def submit_vote(self, option):
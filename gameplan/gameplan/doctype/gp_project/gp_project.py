@@ -8,13 +8,14 @@ from frappe import _
 import requests
 from bs4 import BeautifulSoup
 from frappe.model.document import Document
-from pypika.terms import ExistsCriterion
 
-import gameplan
+from gameplan import visits
+from gameplan.access import clear_access_cache, get_accessible_projects
 from gameplan.api import invite_by_email
 from gameplan.gemoji import get_random_gemoji
 from gameplan.mixins.archivable import Archivable
 from gameplan.mixins.manage_members import ManageMembersMixin
+from gameplan.search import queue_index_update, queue_project_reindex
 
 
 class GPProject(ManageMembersMixin, Archivable, Document):
@@ -31,24 +32,7 @@ class GPProject(ManageMembersMixin, Archivable, Document):
 	@staticmethod
 	def get_list_query(query):
 		Project = frappe.qb.DocType("GP Project")
-		Member = frappe.qb.DocType("GP Member")
-		member_exists = (
-			frappe.qb.from_(Member)
-			.select(Member.name)
-			.where(Member.parenttype == "GP Team")
-			.where(Member.parent == Project.team)
-			.where(Member.user == frappe.session.user)
-		)
-		query = query.where(
-			(Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists))
-		)
-		if gameplan.is_guest():
-			GuestAccess = frappe.qb.DocType("GP Guest Access")
-			project_list = GuestAccess.select(GuestAccess.project).where(
-				GuestAccess.user == frappe.session.user
-			)
-			query = query.where(Project.name.isin(project_list))
-		return query
+		return query.where(Project.name.isin(get_accessible_projects() or [""]))
 
 	def as_dict(self, *args, **kwargs) -> dict:
 		d = super().as_dict(*args, **kwargs)
@@ -96,6 +80,17 @@ class GPProject(ManageMembersMixin, Archivable, Document):
 		if frappe.db.get_value("GP Team", self.team, "is_private"):
 			self.is_private = True
 
+	def on_update(self):
+		if self.has_value_changed("is_private") or self.has_value_changed("team"):
+			clear_access_cache()
+			queue_project_reindex(self.name)
+		if any(self.has_value_changed(field) for field in ["title", "team", "archived_at"]):
+			queue_index_update(self)
+
+	def on_trash(self):
+		clear_access_cache()
+		queue_index_update(self)
+
 	def update_progress(self):
 		result = frappe.db.get_all(
 			"GP Task",
@@ -221,15 +216,7 @@ class GPProject(ManageMembersMixin, Archivable, Document):
 		if frappe.flags.read_only:
 			return
 
-		values = {"user": frappe.session.user, "project": self.name}
-		existing = frappe.db.get_value("GP Project Visit", values)
-		if existing:
-			frappe.db.set_value("GP Project Visit", existing, "last_visit", frappe.utils.now())
-		else:
-			visit = frappe.get_doc(doctype="GP Project Visit")
-			visit.update(values)
-			visit.last_visit = frappe.utils.now()
-			visit.insert(ignore_permissions=True)
+		visits.track_visit(self.doctype, self.name)
 
 	@property
 	def is_followed(self):
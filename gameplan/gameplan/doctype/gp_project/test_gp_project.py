@@ -1,9 +1,76 @@
 # Copyright (c) 2022, Frappe Technologies Pvt Ltd and Contributors
 # See license.txt
 
-# import frappe
-import unittest
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
 
+from gameplan.access import get_accessible_projects
+from gameplan.counters import reconcile_counters
+from gameplan.gameplan.doctype.gp_discussion.test_gp_discussion import (
+	make_discussion,
+	make_project,
+	make_user,
+)
 
-class TestGPProject(unittest.TestCase):
-	pass
+
+class TestGPProject(FrappeTestCase):
+	def setUp(self):
+		self.project = make_project()
+
+	def get_counts(self, project):
+		return frappe.db.get_value(
+			"GP Project", project.name, ["discussions_count", "tasks_count"], as_dict=True
+		)
+
+	def make_task(self, project):
+		return frappe.get_doc(doctype="GP Task", title="Test Task", project=project.name).insert()
+
+	def test_counts_follow_discussions_and_tasks(self):
+		discussions = [make_discussion(self.project), make_discussion(self.project)]
+		task = self.make_task(self.project)
+		self.assertEqual(self.get_counts(self.project), {"discussions_count": 2, "tasks_count": 1})
+
+		discussions[0].delete()
+		self.assertEqual(self.get_counts(self.project), {"discussions_count": 1, "tasks_count": 1})
+
+		other = make_project()
+		discussions[1].project = other.name
+		discussions[1].save()
+		task.project = other.name
+		task.save()
+		self.assertEqual(self.get_counts(self.project), {"discussions_count": 0, "tasks_count": 0})
+		self.assertEqual(self.get_counts(other), {"discussions_count": 1, "tasks_count": 1})
+
+	def test_increment_counts_from_null_and_marks_modified(self):
+		frappe.db.set_value(
+			"GP Project",
+			self.project.name,
+			{"discussions_count": None, "modified": "2020-01-01 00:00:00"},
+			update_modified=False,
+		)
+		make_discussion(self.project)
+		values = frappe.db.get_value("GP Project", self.project.name, ["discussions_count", "modified"])
+		self.assertEqual(values[0], 1)
+		self.assertGreater(values[1], get_datetime("2020-01-01 00:00:00"))
+
+	def test_reconcile_counters(self):
+		discussion = make_discussion(self.project)
+		self.make_task(self.project)
+		frappe.db.set_value("GP Project", self.project.name, {"discussions_count": 5, "tasks_count": None})
+		frappe.db.set_value("GP Discussion", discussion.name, "comments_count", 3)
+
+		self.assertGreaterEqual(reconcile_counters(), 2)
+		self.assertEqual(self.get_counts(self.project), {"discussions_count": 1, "tasks_count": 1})
+		self.assertEqual(frappe.db.get_value("GP Discussion", discussion.name, "comments_count"), 0)
+		# counters that are right are not updated again
+		self.assertEqual(reconcile_counters(), 0)
+
+	def test_cached_access_follows_project_privacy(self):
+		user = make_user()
+		self.assertIn(str(self.project.name), get_accessible_projects(user))
+
+		self.project.is_private = 1
+		self.project.save()
+		self.assertNotIn(str(self.project.name), get_accessible_projects(user))
+		self.assertIn(str(self.project.name), get_accessible_projects("Administrator"))
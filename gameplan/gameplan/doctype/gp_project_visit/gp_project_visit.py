@@ -11,3 +11,7 @@ class GPProjectVisit(Document):
 		ProjectVisit = frappe.qb.DocType("GP Project Visit")
 		query = query.where(ProjectVisit.user == frappe.session.user)
 		return query
+
+
+def after_doctype_insert():
+	frappe.db.add_unique("GP Project Visit", ["project", "user"])
@@ -0,0 +1,34 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+
+import frappe
+
+from gameplan.gameplan.doctype.gp_project_visit.gp_project_visit import after_doctype_insert
+
+
+def execute():
+	delete_duplicates()
+	after_doctype_insert()
+
+
+def delete_duplicates():
+	"""Keep only the latest visit of each project by each user"""
+	from frappe.query_builder.functions import Count
+
+	ProjectVisit = frappe.qb.DocType("GP Project Visit")
+	duplicates = (
+		frappe.qb.from_(ProjectVisit)
+		.select(ProjectVisit.project, ProjectVisit.user)
+		.groupby(ProjectVisit.project, ProjectVisit.user)
+		.having(Count(ProjectVisit.name) > 1)
+	).run(as_dict=1)
+
+	for d in duplicates:
+		names = frappe.db.get_all(
+			"GP Project Visit",
+			filters={"project": d.project, "user": d.user},
+			order_by="last_visit desc",
+			pluck="name",
+		)
+		frappe.db.delete("GP Project Visit", {"name": ("in", names[1:])})
@@ -4,11 +4,12 @@
 import frappe
 from frappe.model.document import Document
 
+from gameplan import counters
 from gameplan.extends.client import check_permissions
 from gameplan.gameplan.doctype.gp_notification.gp_notification import GPNotification
 from gameplan.mixins.activity import HasActivity
 from gameplan.mixins.mentions import HasMentions
-from gameplan.search import GameplanSearch
+from gameplan.search import queue_index_update
 
 
 class GPTask(HasMentions, HasActivity, Document):
@@ -25,6 +26,7 @@ class GPTask(HasMentions, HasActivity, Document):
 		self.update_tasks_count(1)
 
 	def on_update(self):
+		self.move_tasks_count()
 		self.update_project_progress()
 		self.notify_mentions()
 		self.log_value_updates()
@@ -47,19 +49,20 @@ class GPTask(HasMentions, HasActivity, Document):
 
 	def update_search_index(self):
 		if self.has_value_changed("title") or self.has_value_changed("description"):
-			search = GameplanSearch()
-			search.index_doc(self)
+			queue_index_update(self)
 
 	def on_trash(self):
 		self.update_tasks_count(-1)
-		search = GameplanSearch()
-		search.remove_doc(self)
+		queue_index_update(self)
 
 	def update_tasks_count(self, delta=1):
-		if not self.project:
-			return
-		current_tasks_count = frappe.db.get_value("GP Project", self.project, "tasks_count") or 0
-		frappe.db.set_value("GP Project", self.project, "tasks_count", current_tasks_count + delta)
+		counters.increment("GP Project", self.project, tasks_count=delta)
+
+	def move_tasks_count(self):
+		previous = self.get_doc_before_save()
+		if previous and self.has_value_changed("project"):
+			counters.increment("GP Project", previous.project, tasks_count=-1)
+			self.update_tasks_count(1)
 
 	def update_project_progress(self):
 		if self.project and self.has_value_changed("is_completed"):
@@ -5,9 +5,8 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 from frappe.model.naming import append_number_if_name_exists
-from pypika.terms import ExistsCriterion
 
-import gameplan
+from gameplan.access import clear_access_cache, get_accessible_teams
 from gameplan.gemoji import get_random_gemoji
 from gameplan.mixins.archivable import Archivable
 
@@ -27,24 +26,7 @@ class GPTeam(Archivable, Document):
 	@staticmethod
 	def get_list_query(query):
 		Team = frappe.qb.DocType("GP Team")
-		Member = frappe.qb.DocType("GP Member")
-		member_exists = (
-			frappe.qb.from_(Member)
-			.select(Member.name)
-			.where(Member.parenttype == "GP Team")
-			.where(Member.parent == Team.name)
-			.where(Member.user == frappe.session.user)
-		)
-		query = query.where(
-			(Team.is_private == 0) | ((Team.is_private == 1) & ExistsCriterion(member_exists))
-		)
-		is_guest = gameplan.is_guest()
-		if is_guest:
-			Team = frappe.qb.DocType("GP Team")
-			GuestAccess = frappe.qb.DocType("GP Guest Access")
-			team_list = GuestAccess.select(GuestAccess.team).where(GuestAccess.user == frappe.session.user)
-			query = query.where(Team.name.isin(team_list))
-		return query
+		return query.where(Team.name.isin(get_accessible_teams() or [""]))
 
 	def before_insert(self):
 		if not self.name:
@@ -63,6 +45,19 @@ class GPTeam(Archivable, Document):
 
 		self.add_member(frappe.session.user)
 
+	def on_update(self):
+		if self.has_value_changed("is_private") or self.have_members_changed():
+			clear_access_cache()
+
+	def on_trash(self):
+		clear_access_cache()
+
+	def have_members_changed(self):
+		previous = self.get_doc_before_save()
+		if not previous:
+			return True
+		return {m.user for m in previous.members} != {m.user for m in self.members}
+
 	def add_member(self, email):
 		if email not in [member.user for member in self.members]:
 			self.append("members", {"email": email, "user": email, "status": "Accepted"})
@@ -1,9 +1,66 @@
 # Copyright (c) 2022, Frappe Technologies Pvt Ltd and Contributors
 # See license.txt
 
-# import frappe
-import unittest
+import frappe
+from frappe.tests.utils import FrappeTestCase
 
+from gameplan.access import (
+	get_accessible_projects,
+	get_accessible_teams,
+	get_visibility_tag,
+	get_visibility_tags,
+)
+from gameplan.gameplan.doctype.gp_discussion.test_gp_discussion import make_project, make_user
 
-class TestGPTeam(unittest.TestCase):
-	pass
+
+class TestGPTeam(FrappeTestCase):
+	def setUp(self):
+		self.user = make_user()
+
+	def assert_access(self, project, has_access):
+		# read twice, so that the second read comes from the cache
+		for _i in range(2):
+			self.assertEqual(project.team in get_accessible_teams(self.user), has_access)
+			self.assertEqual(str(project.name) in get_accessible_projects(self.user), has_access)
+			tag = get_visibility_tag(True, project.team)
+			self.assertEqual(tag in get_visibility_tags(self.user), has_access)
+
+	def test_cached_access_follows_members(self):
+		project = make_project(is_private=1)
+		self.assert_access(project, False)
+
+		team = frappe.get_doc("GP Team", project.team)
+		team.add_members([self.user])
+		self.assert_access(project, True)
+
+		team.remove_member(self.user)
+		self.assert_access(project, False)
+
+	def test_cached_access_follows_team_privacy(self):
+		project = make_project()
+		self.assertIn(project.team, get_accessible_teams(self.user))
+
+		team = frappe.get_doc("GP Team", project.team)
+		team.is_private = 1
+		team.save()
+		self.assertNotIn(project.team, get_accessible_teams(self.user))
+		self.assertIn(project.team, get_accessible_teams("Administrator"))
+
+	def test_guests_access_only_what_they_were_given(self):
+		guest = "test_guest@example.com"
+		if not frappe.db.exists("User", guest):
+			frappe.get_doc(
+				doctype="User",
+				email=guest,
+				first_name="Guest",
+				send_welcome_email=0,
+				roles=[{"role": "Gameplan Guest"}],
+			).insert(ignore_permissions=True)
+		private, public = make_project(is_private=1), make_project()
+		self.assertEqual(get_accessible_projects(guest), [])
+
+		frappe.get_doc(doctype="GP Guest Access", user=guest, project=private.name).insert()
+		self.assertEqual(get_accessible_projects(guest), [str(private.name)])
+		self.assertEqual(get_accessible_teams(guest), [private.team])
+		self.assertNotIn(str(public.name), get_accessible_projects(guest))
+		self.assertEqual(get_visibility_tags(guest), [])
@@ -93,7 +93,7 @@ website_redirects = [
 before_install = "gameplan.install.before_install"
 after_install = "gameplan.install.after_install"
 
-after_migrate = ["gameplan.search.build_index_in_background"]
+after_migrate = ["gameplan.search.catch_up_index_in_background"]
 
 # Uninstallation
 # ------------
@@ -139,7 +139,10 @@ doc_events = {
 			"gameplan.gameplan.doctype.gp_user_profile.gp_user_profile.delete_user_profile",
 			"gameplan.gameplan.doctype.gp_guest_access.gp_guest_access.on_user_delete",
 		],
-		"on_update": "gameplan.gameplan.doctype.gp_user_profile.gp_user_profile.on_user_update",
+		"on_update": [
+			"gameplan.gameplan.doctype.gp_user_profile.gp_user_profile.on_user_update",
+			"gameplan.access.on_user_update",
+		],
 	},
 }
 
@@ -149,8 +152,13 @@ on_login = "gameplan.www.g.on_login"
 # ---------------
 
 scheduler_events = {
-	"all": ["gameplan.search.build_index_if_not_exists"],
+	"all": [
+		"gameplan.search.catch_up_index",
+		"gameplan.search.flush_index_queue",
+		"gameplan.visits.flush_visits",
+	],
 	"hourly": ["gameplan.gameplan.doctype.gp_invitation.gp_invitation.expire_invitations"],
+	"daily": ["gameplan.unread.reconcile_unread_counts", "gameplan.counters.reconcile_counters"],
 }
 
 # scheduler_events = {
@@ -6,7 +6,7 @@ import frappe
 from frappe import _
 from frappe.utils import get_fullname
 
-from gameplan.utils import extract_mentions
+from gameplan.utils import get_content
 
 
 class HasMentions:
@@ -15,7 +15,7 @@ class HasMentions:
 		if not mentions_field:
 			return
 
-		mentions = extract_mentions(self.get(mentions_field))
+		mentions = get_content(self, mentions_field).mentions
 		for mention in mentions:
 			values = frappe._dict(
 				from_user=self.owner,
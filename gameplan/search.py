@@ -2,37 +2,169 @@
 # MIT License. See license.txt
 
 
+import hashlib
 import re
+import time
+from datetime import timedelta
 
 import frappe
-from frappe.core.utils import html2text
 from frappe.utils import cstr, update_progress_bar
 
-import gameplan
+from gameplan.access import get_accessible_projects, get_visibility_tag, get_visibility_tags
+from gameplan.suggestions import SUGGESTION_DOCTYPES, TitleSuggestions
+from gameplan.utils.content import get_content, html_to_text
 from gameplan.utils.search import Search
 
 UNSAFE_CHARS = re.compile(r"[\[\]{}<>+]")
 
-INDEX_BUILD_FLAG = "discussions_index_in_progress"
+# terms that the prefix and fuzzy tiers loosen, operators and field or tag filters are kept as they are
+PLAIN_TERM = re.compile(r"\w+")
+
+# number of records read from the database and written to the index per round trip
+CHUNK_SIZE = 500
+
+# documents synced per pipelined write when flushing the indexing queue
+QUEUE_BATCH_SIZE = 200
+
+INDEX_QUEUE_KEY = "gameplan_idx:queue"
+FLUSH_SCHEDULED_KEY = "gameplan_idx:queue:flush_scheduled"
+
+# seconds after which a flush job that was scheduled but never ran no longer holds back a new one
+FLUSH_SCHEDULED_TIMEOUT = 60
+
+# shards per worker process in a parallel build, so that a slow shard does not leave other workers idle
+SHARDS_PER_WORKER = 4
+
+# a search falls back to the next, looser tier of queries while it has fewer hits than this
+MIN_TIER_RESULTS = 10
+
+# shorter terms are matched as prefixes in the fuzzy tier, fuzzy matches of them are mostly noise
+FUZZY_MIN_LENGTH = 4
+
+# characters of text around the first match in snippets made for compact indexes
+SNIPPET_LENGTH = 200
+
+# fields that snippets are made from, for compact indexes
+SNIPPET_FIELDS = {
+	"GP Discussion": "content",
+	"GP Task": "description",
+	"GP Page": "content",
+	"GP Comment": "content",
+}
+
+# catch-up re-reads this many seconds before the watermark, so that rows from transactions that
+# were still open when the previous run started are not missed
+WATERMARK_OVERLAP = 300
+
+INDEXED_DOCTYPES = {
+	"GP Discussion": {
+		"fields": ["name", "title", "content", "last_post_at", "modified", "project", "team"],
+		"watermark_fields": ["modified", "last_post_at"],
+	},
+	"GP Task": {
+		"fields": ["name", "title", "description", "modified", "project", "team"],
+	},
+	"GP Page": {
+		"fields": ["name", "title", "content", "modified", "project", "team"],
+	},
+	"GP Comment": {
+		"fields": ["name", "content", "modified", "reference_doctype", "reference_name"],
+		"deleted_field": "deleted_at",
+	},
+}
 
 
 class GameplanSearch(Search):
-	def __init__(self) -> None:
+	def __init__(self, backend=None, index_name="gameplan_idx", prefix="search_doc", compact=None) -> None:
 		schema = [
 			{"name": "title", "weight": 5},
-			{"name": "content", "weight": 2},
+			{"name": "content", "weight": 2, "compact": True},
 			{"name": "team", "type": "tag"},
 			{"name": "project", "type": "tag"},
+			{"name": "visibility", "type": "tag"},
 			{"name": "modified", "sortable": True},
 		]
-		super().__init__("gameplan_idx", "search_doc", schema)
+		super().__init__(index_name, prefix, schema, backend=backend, compact=compact)
 
 	def search(self, query, **kwargs):
-		if query:
-			accessible_projects = "|".join(self.get_accessible_projects())
-			projects_query = f"@project:{{{accessible_projects}}}"
-			query = f"{query} {projects_query}"
-		return super().search(query, **kwargs)
+		if not query:
+			return super().search(query, **kwargs)
+
+		access_query, scope = self.get_access_filter()
+		search = super().search
+		key_parts = {
+			"query": " ".join(query.lower().split()),
+			"access": hashlib.sha1("|".join(sorted(scope)).encode()).hexdigest(),
+			**kwargs,
+		}
+		return self.get_cached_results(key_parts, lambda: search(f"{query} {access_query}", **kwargs))
+
+	def get_access_filter(self):
+		"""Query filter for the documents the user can read, and the tags it lists. Filters on the
+		few visibility tags of the user, public and one per team, rather than listing every
+		accessible project. Guests, and indexes built before visibility was indexed, filter by
+		project."""
+		tags = get_visibility_tags() if self.has_current_schema() else None
+		if tags:
+			return f"@visibility:{{{'|'.join(tags)}}}", tags
+		projects = self.get_accessible_projects()
+		return f"@project:{{{'|'.join(projects)}}}", projects
+
+	def tiered_search(
+		self, query, fields="title|content", start=0, page_length=50, min_results=MIN_TIER_RESULTS, **kwargs
+	):
+		"""Search all terms of `query` exactly (with stemming) first, then as prefixes and then
+		fuzzily, moving on to the next tier only while fewer than `min_results` documents matched.
+		Hits of a looser tier are placed after the ones of the tiers before it, without repeats, and
+		a tier that would run the same query as the one before it is skipped.
+		Returns the page from `start`, the total of the widest tier run and the time taken by each
+		tier in milliseconds."""
+		terms = query.split()
+		queries = {
+			"exact": terms,
+			"prefix": [self.get_prefix_term(term) for term in terms],
+			"fuzzy": [self.get_fuzzy_term(term) for term in terms],
+		}
+
+		out = frappe._dict(docs=[], total=0, duration=0, tiers=[], tier=None)
+		if not terms:
+			return out
+
+		seen = set()
+		last_query = None
+		for tier, tier_terms in queries.items():
+			tier_query = " ".join(tier_terms)
+			if tier_query == last_query:
+				continue
+			last_query = tier_query
+
+			start_time = time.monotonic()
+			result = self.search(
+				f"@{fields}:({tier_query})", start=0, page_length=start + page_length, **kwargs
+			)
+			duration = (time.monotonic() - start_time) * 1000
+			for doc in result.docs:
+				if doc.id not in seen:
+					seen.add(doc.id)
+					out.docs.append(doc)
+
+			out.total = max(out.total, result.total)
+			out.duration += duration
+			out.tiers.append({"tier": tier, "query": tier_query, "total": result.total, "duration": duration})
+			if result.total >= min_results:
+				break
+
+		out.tier = out.tiers[-1]["tier"]
+		out.docs = out.docs[start : start + page_length]
+		return out
+
+	def get_prefix_term(self, term):
+		return f"{term}*" if PLAIN_TERM.fullmatch(term) else term
+
+	def get_fuzzy_term(self, term):
+		if not self.backend.supports_fuzzy or not PLAIN_TERM.fullmatch(term) or len(term) < FUZZY_MIN_LENGTH:
+			return self.get_prefix_term(term)
+		return f"%%{term}%%"
 
 	def clean_query(self, query):
 		query = query.strip().replace("-*", "*")
@@ -40,25 +172,152 @@ class GameplanSearch(Search):
 		query = query.strip()
 		return query
 
-	def build_index(self):
-		self.drop_index()
-		self.create_index()
-		records = self.get_records()
-		total = len(records)
-		for i, doc in enumerate(records):
-			self.index_doc(doc)
-			if not hasattr(frappe.local, "request"):
-				update_progress_bar("Indexing", i, total)
-		if not hasattr(frappe.local, "request"):
+	def build_index(self, chunk_size=CHUNK_SIZE, workers=1):
+		"""Build a fresh copy of the index next to the active one and switch searches over
+		to it once it is complete, so that search keeps serving full results meanwhile.
+		With `workers` > 1 the records are indexed in parallel by a pool of processes."""
+		show_progress = not hasattr(frappe.local, "request")
+		total = self.get_records_count()
+		indexed = 0
+		start = time.monotonic()
+		build_started_at = frappe.utils.now_datetime()
+		version = self.start_build()
+		try:
+			if workers > 1:
+				batches = self.index_shards_in_parallel(version, chunk_size, workers)
+			else:
+				batches = (
+					self.index_docs(records, version=version)
+					for records in self.get_record_chunks(chunk_size)
+				)
+			for count in batches:
+				indexed += count
+				self.refresh_build_lock(version)
+				if show_progress:
+					update_progress_bar("Indexing", indexed, total, absolute=True)
+		except Exception:
+			self.abort_build(version)
+			raise
+		self.finish_build(version, doc_count=indexed)
+		self.set_watermarks(build_started_at)
+		if self.backend.supports_suggestions:
+			TitleSuggestions().rebuild()
+
+		duration = time.monotonic() - start
+		stats = frappe._dict(
+			total=indexed,
+			duration=duration,
+			docs_per_sec=indexed / duration if duration else indexed,
+		)
+		if show_progress:
 			print()
+			print(
+				f"Indexed {stats.total} documents in {stats.duration:.1f}s "
+				f"({stats.docs_per_sec:.0f} docs/sec)"
+			)
+		return stats
+
+	def index_shards_in_parallel(self, version, chunk_size, workers):
+		"""Split the name range of every indexed doctype into shards and index them into
+		`version` in a pool of `workers` processes. Yields the number of documents indexed
+		as each shard completes."""
+		import multiprocessing
+		from concurrent.futures import ProcessPoolExecutor, as_completed
+
+		shards = [
+			(doctype, start, end)
+			for doctype in INDEXED_DOCTYPES
+			for start, end in self.get_shards(doctype, workers * SHARDS_PER_WORKER)
+		]
+		with ProcessPoolExecutor(
+			max_workers=workers,
+			# forked workers would share the parent's database and redis connections
+			mp_context=multiprocessing.get_context("spawn"),
+			initializer=connect_shard_worker,
+			initargs=(frappe.local.site, frappe.local.sites_path),
+		) as executor:
+			futures = [
+				executor.submit(index_shard, version, doctype, start, end, chunk_size)
+				for doctype, start, end in shards
+			]
+			try:
+				for future in as_completed(futures):
+					yield future.result()
+			except BaseException:
+				for future in futures:
+					future.cancel()
+				raise
+
+	def get_shards(self, doctype, count):
+		"""Split the name range of `doctype` into at most `count` inclusive `(start, end)` ranges"""
+		from frappe.query_builder.functions import Max, Min
+
+		Table = frappe.qb.DocType(doctype)
+		low, high = frappe.qb.from_(Table).select(Min(Table.name), Max(Table.name)).run()[0]
+		if low is None:
+			return []
+
+		size = -(-(high - low + 1) // count)
+		return [(start, min(start + size - 1, high)) for start in range(low, high + 1, size)]
 
 	def index_doc(self, doc):
+		document = self.get_document(doc)
+		if document:
+			self.add_document(*document)
+
+	def index_docs(self, docs, version=None):
+		"""Index a chunk of records with one pipelined write"""
+		references = self.get_comment_references(docs)
+		projects = {doc.project for doc in docs if doc.get("project")}
+		projects.update(project for _team, project in references.values() if project)
+		visibility = self.get_visibility(projects)
+		documents = (self.get_document(doc, references, visibility) for doc in docs)
+		return self.add_documents(filter(None, documents), version=version)
+
+	def get_visibility(self, projects):
+		"""Map `projects` to their visibility tag with one query"""
+		if not projects:
+			return {}
+		rows = frappe.db.get_all(
+			"GP Project", filters={"name": ("in", list(projects))}, fields=["name", "is_private", "team"]
+		)
+		return {cstr(row.name): get_visibility_tag(row.is_private, row.team) for row in rows}
+
+	def get_comment_references(self, docs):
+		"""Map comment names in `docs` to `(team, project)` of the discussion or task they belong to,
+		resolved with a single query"""
+		from frappe.query_builder.functions import Coalesce
+
+		names = [doc.name for doc in docs if doc.doctype == "GP Comment"]
+		if not names:
+			return {}
+
+		Comment = frappe.qb.DocType("GP Comment")
+		Discussion = frappe.qb.DocType("GP Discussion")
+		Task = frappe.qb.DocType("GP Task")
+		rows = (
+			frappe.qb.from_(Comment)
+			.left_join(Discussion)
+			.on((Comment.reference_doctype == "GP Discussion") & (Discussion.name == Comment.reference_name))
+			.left_join(Task)
+			.on((Comment.reference_doctype == "GP Task") & (Task.name == Comment.reference_name))
+			.select(
+				Comment.name,
+				Coalesce(Discussion.team, Task.team).as_("team"),
+				Coalesce(Discussion.project, Task.project).as_("project"),
+			)
+			.where(Comment.name.isin(names))
+			.run(as_dict=True)
+		)
+		return {cstr(row.name): (row.team, row.project) for row in rows}
+
+	def get_document(self, doc, comment_references=None, visibility=None):
 		id, fields, payload = None, None, None
 		if doc.doctype == "GP Discussion":
 			id = f"GP Discussion:{doc.name}"
 			fields = {
 				"title": doc.title,
-				"content": html2text(doc.content),
+				"content": get_content(doc, "content").text,
 				"modified": doc.modified,
 				"team": doc.team,
 				"project": doc.project,
@@ -71,7 +330,7 @@ class GameplanSearch(Search):
 			id = f"GP Task:{doc.name}"
 			fields = {
 				"title": doc.title,
-				"content": html2text(doc.description),
+				"content": get_content(doc, "description").text,
 				"modified": doc.modified,
 				"team": doc.team,
 				"project": doc.project,
@@ -84,7 +343,7 @@ class GameplanSearch(Search):
 			id = f"GP Page:{doc.name}"
 			fields = {
 				"title": doc.title,
-				"content": html2text(doc.content),
+				"content": get_content(doc, "content").text,
 				"modified": doc.modified,
 				"team": doc.team,
 				"project": doc.project,
@@ -95,11 +354,12 @@ class GameplanSearch(Search):
 			}
 		elif doc.doctype == "GP Comment":
 			id = f"GP Comment:{doc.name}"
-			team = frappe.db.get_value(doc.reference_doctype, doc.reference_name, "team", cache=True)
-			project = frappe.db.get_value(doc.reference_doctype, doc.reference_name, "project", cache=True)
+			if comment_references is None:
+				comment_references = self.get_comment_references([doc])
+			team, project = comment_references.get(cstr(doc.name), (None, None))
 
 			fields = {
-				"content": html2text(doc.content),
+				"content": get_content(doc, "content").text,
 				"modified": doc.modified,
 				"team": team,
 				"project": project,
@@ -108,8 +368,15 @@ class GameplanSearch(Search):
 				"reference_doctype": doc.reference_doctype,
 				"reference_name": doc.reference_name,
 			}
-		if id and fields and payload:
-			self.add_document(id, fields, payload=payload)
+		if fields and fields.get("project"):
+			if visibility is None:
+				visibility = self.get_visibility([fields["project"]])
+			fields["visibility"] = visibility.get(cstr(fields["project"]))
+		if self.compact and payload and doc.doctype != "GP Comment":
+			# team and project are stored as fields already
+			payload = None
+		if id and fields:
+			return id, fields, payload
 
 	def remove_doc(self, doc):
 		id = None
@@ -124,83 +391,424 @@ class GameplanSearch(Search):
 		if id:
 			self.remove_document(id)
 
-	def get_records(self):
-		records = []
-		for d in frappe.db.get_all(
-			"GP Discussion",
-			fields=["name", "title", "content", "last_post_at", "modified", "project", "team"],
-		):
-			d.doctype = "GP Discussion"
-			d.modified = d.last_post_at or d.modified
-			records.append(d)
+	def catch_up(self, chunk_size=CHUNK_SIZE):
+		"""Reindex records changed since the last build or catch-up and remove records that
+		were deleted since then. Returns the number of documents indexed and removed."""
+		watermarks = self.get_watermarks()
+		started_at = frappe.utils.now_datetime()
+		stats = frappe._dict(indexed=0, removed=0)
+		for doctype, options in INDEXED_DOCTYPES.items():
+			since = watermarks[doctype] - timedelta(seconds=WATERMARK_OVERLAP)
+			or_filters = [[field, ">", since] for field in options.get("watermark_fields", ["modified"])]
+			for records in self.get_doctype_record_chunks(
+				doctype, chunk_size, or_filters=or_filters, include_deleted=True
+			):
+				indexed, removed = self.sync_records(doctype, records)
+				stats.indexed += indexed
+				stats.removed += removed
 
-		for d in frappe.db.get_all(
-			"GP Task", fields=["name", "title", "description", "modified", "project", "team"]
-		):
-			d.doctype = "GP Task"
-			records.append(d)
+			deleted_names = frappe.db.get_all(
+				"Deleted Document",
+				filters={"deleted_doctype": doctype, "creation": (">", since)},
+				pluck="deleted_name",
+			)
+			if deleted_names:
+				stats.removed += self.remove_documents([f"{doctype}:{name}" for name in deleted_names])
 
-		for d in frappe.db.get_all(
-			"GP Page", fields=["name", "title", "content", "modified", "project", "team"]
-		):
-			d.doctype = "GP Page"
-			records.append(d)
+			self.set_watermark(doctype, started_at)
+		return stats
 
-		for d in frappe.db.get_all(
-			"GP Comment",
-			fields=["name", "content", "modified", "reference_doctype", "reference_name"],
-			filters={"deleted_at": ("is", "not set")},
+	def sync_docs(self, doctype, names):
+		"""Index the current state of `names` of `doctype` and remove the ones that were deleted.
+		Returns the number of documents indexed and removed."""
+		names = list({cstr(name) for name in names})
+		stats = frappe._dict(indexed=0, removed=0)
+		found = set()
+		for records in self.get_doctype_record_chunks(
+			doctype, len(names), filters=[["name", "in", names]], include_deleted=True
 		):
-			d.doctype = "GP Comment"
-			records.append(d)
+			found.update(cstr(d.name) for d in records)
+			indexed, removed = self.sync_records(doctype, records)
+			stats.indexed += indexed
+			stats.removed += removed
 
-		return records
+		missing = [name for name in names if name not in found]
+		if missing:
+			stats.removed += self.remove_documents([f"{doctype}:{name}" for name in missing])
+		return stats
 
-	def get_accessible_projects(self):
-		from pypika.terms import ExistsCriterion
-
-		if gameplan.is_guest():
-			GuestAccess = frappe.qb.DocType("GP Guest Access")
-			return (
-				frappe.qb.from_(GuestAccess)
-				.select(GuestAccess.project)
-				.distinct()
-				.where(GuestAccess.user == frappe.session.user)
-				.run(pluck=True)
+	def sync_records(self, doctype, records):
+		"""Index `records` and remove the soft-deleted ones from the index"""
+		deleted_field = INDEXED_DOCTYPES[doctype].get("deleted_field")
+		deleted = {d.name for d in records if deleted_field and d.get(deleted_field)}
+		removed = self.remove_documents([f"{doctype}:{name}" for name in deleted]) if deleted else 0
+		indexed = self.index_docs([d for d in records if d.name not in deleted])
+		return indexed, removed
+
+	@property
+	def watermarks_key(self):
+		return f"{self.index_name}:watermarks"
+
+	def get_watermarks(self):
+		"""Time up to which each doctype is known to be indexed, empty if any doctype has none"""
+		watermarks = {}
+		for doctype in INDEXED_DOCTYPES:
+			watermark = self.redis.hget(self.watermarks_key, doctype)
+			if not watermark:
+				return {}
+			watermarks[doctype] = watermark
+		return watermarks
+
+	def set_watermark(self, doctype, value):
+		self.redis.hset(self.watermarks_key, doctype, value)
+
+	def set_watermarks(self, value):
+		for doctype in INDEXED_DOCTYPES:
+			self.set_watermark(doctype, value)
+
+	def get_records_count(self):
+		return sum(
+			frappe.db.count(doctype, filters=self.get_deleted_filters(doctype))
+			for doctype in INDEXED_DOCTYPES
+		)
+
+	def get_record_chunks(self, chunk_size=CHUNK_SIZE):
+		"""Yield records of all indexed doctypes in chunks of `chunk_size`, paginated by name
+		so that only one chunk is held in memory at a time."""
+		for doctype in INDEXED_DOCTYPES:
+			yield from self.get_doctype_record_chunks(doctype, chunk_size)
+
+	def get_doctype_record_chunks(
+		self, doctype, chunk_size=CHUNK_SIZE, filters=None, or_filters=None, include_deleted=False
+	):
+		options = INDEXED_DOCTYPES[doctype]
+		fields = list(options["fields"])
+		filters = list(filters or [])
+		if include_deleted:
+			if options.get("deleted_field"):
+				fields.append(options["deleted_field"])
+		else:
+			filters += self.get_deleted_filters(doctype)
+
+		last_name = None
+		while True:
+			page_filters = list(filters)
+			if last_name is not None:
+				page_filters.append(["name", ">", last_name])
+			records = frappe.db.get_all(
+				doctype,
+				fields=fields,
+				filters=page_filters,
+				or_filters=or_filters,
+				order_by="name asc",
+				limit=chunk_size,
 			)
+			if not records:
+				break
+
+			for d in records:
+				d.doctype = doctype
+				if doctype == "GP Discussion":
+					d.modified = d.last_post_at or d.modified
+			yield records
+
+			if len(records) < chunk_size:
+				break
+			last_name = records[-1].name
+
+	def get_deleted_filters(self, doctype):
+		deleted_field = INDEXED_DOCTYPES[doctype].get("deleted_field")
+		return [[deleted_field, "is", "not set"]] if deleted_field else []
+
+	def get_accessible_projects(self):
+		return get_accessible_projects()
+
+
+def hydrate_results(docs, snippet_terms=None):
+	"""Group search hits by doctype. Comment hits are collapsed into one result per discussion or
+	task, carrying the snippet of its best scoring comment. The parents are fetched with a
+	single query, and parents that are hits themselves are not repeated.
+
+	With `snippet_terms`, for hits from a compact index, snippets are made from the records
+	in the database with those terms highlighted."""
+	grouped_results = {}
+	direct_hits = set()
+	best_comments = {}
+	for d in docs:
+		doctype, name = d.id.split(":", 1)
+		d.doctype = doctype
+		d.name = name
+		del d.id
+		if doctype == "GP Comment":
+			parent = (d.payload["reference_doctype"], cstr(d.payload["reference_name"]))
+			best = best_comments.get(parent)
+			if best is None or (d.get("score") or 0) > (best.get("score") or 0):
+				best_comments[parent] = d
+		else:
+			payload = d.payload or {}
+			d.project = payload.get("project", d.get("project"))
+			d.team = payload.get("team", d.get("team"))
+			del d.payload
+			grouped_results.setdefault(doctype, []).append(d)
+			direct_hits.add((doctype, name))
+
+	parents = [parent for parent in best_comments if parent not in direct_hits]
+	records = {(d.doctype, cstr(d.name)): d for d in get_parent_records(parents)}
+	for parent in parents:
+		d = records.get(parent)
+		if not d:
+			continue
+		d.name = cstr(d.name)
+		d.content = best_comments[parent].content
+		d.via_comment = True
+		grouped_results.setdefault(d.doctype, []).append(d)
+
+	if snippet_terms:
+		set_snippets(grouped_results, best_comments, snippet_terms)
+	return grouped_results
+
+
+def set_snippets(grouped_results, best_comments, terms):
+	"""Replace the content of results with snippets of their records, one query per doctype"""
+	names_by_doctype = {}
+	for doctype, results in grouped_results.items():
+		for d in results:
+			if d.get("via_comment"):
+				comment = best_comments[(doctype, d.name)]
+				names_by_doctype.setdefault("GP Comment", []).append(comment.name)
+			else:
+				names_by_doctype.setdefault(doctype, []).append(d.name)
+
+	texts = {}
+	for doctype, names in names_by_doctype.items():
+		fieldname = SNIPPET_FIELDS[doctype]
+		for row in frappe.db.get_all(doctype, filters={"name": ("in", names)}, fields=["name", fieldname]):
+			texts[(doctype, cstr(row.name))] = html_to_text(row.get(fieldname))
 
-		Project = frappe.qb.DocType("GP Project")
-		Member = frappe.qb.DocType("GP Member")
-		member_exists = (
-			frappe.qb.from_(Member)
-			.select(Member.name)
-			.where(Member.parenttype == "GP Team")
-			.where(Member.parent == Project.team)
-			.where(Member.user == frappe.session.user)
+	for doctype, results in grouped_results.items():
+		for d in results:
+			if d.get("via_comment"):
+				key = ("GP Comment", cstr(best_comments[(doctype, d.name)].name))
+			else:
+				key = (doctype, cstr(d.name))
+			d.content = make_snippet(texts.get(key, ""), terms)
+
+
+def make_snippet(text, terms, length=SNIPPET_LENGTH):
+	"""Part of `text` around the first match of any of `terms`, with matches marked"""
+	from frappe.utils import escape_html
+
+	text = " ".join(text.split())
+	words = [re.escape(term.strip("*%")) for term in terms if term.strip("*%")]
+	pattern = re.compile(rf"\b({'|'.join(words)})\w*", re.IGNORECASE) if words else None
+	match = pattern.search(text) if pattern else None
+	start = max(0, match.start() - length // 4) if match else 0
+	excerpt = text[start : start + length]
+	# matches are found in the raw text, so that terms never match inside escaped characters
+	parts, end = [], 0
+	for word in pattern.finditer(excerpt) if pattern else []:
+		parts.append(escape_html(excerpt[end : word.start()]))
+		parts.append(f"<mark>{escape_html(word.group(0))}</mark>")
+		end = word.end()
+	parts.append(escape_html(excerpt[end:]))
+	snippet = "".join(parts)
+	if start > 0:
+		snippet = f"...{snippet}"
+	if start + length < len(text):
+		snippet = f"{snippet}..."
+	return snippet
+
+
+def get_parent_records(parents):
+	"""Fetch discussions and tasks for a list of `(doctype, name)` with one UNION query"""
+	from pypika.terms import ValueWrapper
+
+	names_by_doctype = {}
+	for doctype, name in parents:
+		names_by_doctype.setdefault(doctype, []).append(name)
+
+	queries = []
+	if names_by_doctype.get("GP Discussion"):
+		Discussion = frappe.qb.DocType("GP Discussion")
+		queries.append(
+			frappe.qb.from_(Discussion)
+			.select(
+				ValueWrapper("GP Discussion").as_("doctype"),
+				Discussion.name,
+				Discussion.title,
+				Discussion.last_post_at.as_("modified"),
+				Discussion.project,
+				Discussion.team,
+			)
+			.where(Discussion.name.isin(names_by_doctype["GP Discussion"]))
 		)
-		projects = (
-			frappe.qb.from_(Project)
-			.select(Project.name)
-			.distinct()
-			.where((Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists)))
-			.run(pluck=True)
+	if names_by_doctype.get("GP Task"):
+		Task = frappe.qb.DocType("GP Task")
+		queries.append(
+			frappe.qb.from_(Task)
+			.select(
+				ValueWrapper("GP Task").as_("doctype"),
+				Task.name,
+				Task.title,
+				Task.modified,
+				Task.project,
+				Task.team,
+			)
+			.where(Task.name.isin(names_by_doctype["GP Task"]))
 		)
-		return [cstr(p) for p in projects]
+	if not queries:
+		return []
+
+	query = queries[0]
+	for other in queries[1:]:
+		query = query.union_all(other)
+	return frappe.db.sql(query.get_sql(), as_dict=True)
+
+
+def queue_index_update(doc):
+	"""Sync `doc` with the search index and title suggestions in the background once the current
+	transaction commits. Repeated saves of the same document before the queue is flushed are
+	indexed once."""
+	member = f"{doc.doctype}:{doc.name}"
+	frappe.db.after_commit.add(lambda: push_to_index_queue(member))
+
 
+def push_to_index_queue(*members):
+	if not members:
+		return
+	cache = frappe.cache()
+	queued_at = time.time()
+	pipeline = cache.pipeline(transaction=False)
+	# nx keeps the time of the first pending update so that lag is measured from it
+	pipeline.zadd(cache.make_key(INDEX_QUEUE_KEY), {member: queued_at for member in members}, nx=True)
+	pipeline.set(cache.make_key(FLUSH_SCHEDULED_KEY), 1, nx=True, ex=FLUSH_SCHEDULED_TIMEOUT)
+	_, schedule_flush = pipeline.execute()
+	if schedule_flush:
+		frappe.enqueue(flush_index_queue, queue="short")
 
-def build_index():
-	frappe.cache().set_value(INDEX_BUILD_FLAG, True)
+
+def queue_project_reindex(project):
+	"""Reindex the documents of `project` in the background once the current transaction commits,
+	for changes to the project that are indexed with its documents, like its visibility"""
+	frappe.enqueue(reindex_project, queue="long", project=project, enqueue_after_commit=True)
+
+
+def reindex_project(project):
+	"""Queue every discussion, task and page of `project` and their comments for indexing"""
+	members = []
+	for doctype in ["GP Discussion", "GP Task", "GP Page"]:
+		names = frappe.db.get_all(doctype, filters={"project": project}, pluck="name")
+		members += [f"{doctype}:{name}" for name in names]
+		if names and doctype != "GP Page":
+			comments = frappe.db.get_all(
+				"GP Comment",
+				filters={"reference_doctype": doctype, "reference_name": ("in", names)},
+				pluck="name",
+			)
+			members += [f"GP Comment:{name}" for name in comments]
+	push_to_index_queue(*members)
+
+
+def flush_index_queue(batch_size=QUEUE_BATCH_SIZE):
+	"""Sync queued documents with the search index, `batch_size` documents per pipelined write.
+	Documents queued once this has started schedule another flush, instead of waiting for the
+	scheduler when they arrive after the last batch was read."""
+	cache = frappe.cache()
+	queue_key = cache.make_key(INDEX_QUEUE_KEY)
+	cache.delete(cache.make_key(FLUSH_SCHEDULED_KEY))
+	search = GameplanSearch()
+	suggestions = TitleSuggestions() if search.backend.supports_suggestions else None
+	while items := cache.zpopmin(queue_key, batch_size):
+		names_by_doctype = {}
+		for member, _queued_at in items:
+			doctype, name = frappe.safe_decode(member).split(":", 1)
+			names_by_doctype.setdefault(doctype, []).append(name)
+
+		try:
+			for doctype, names in names_by_doctype.items():
+				if doctype in INDEXED_DOCTYPES:
+					search.sync_docs(doctype, names)
+				if suggestions and doctype in SUGGESTION_DOCTYPES:
+					suggestions.sync(doctype, names)
+		except Exception:
+			# put the batch back so that the next flush retries it
+			cache.zadd(queue_key, dict(items), nx=True)
+			raise
+
+		cache.incrby(cache.make_key(f"{INDEX_QUEUE_KEY}:flushed"), len(items))
+		cache.set(cache.make_key(f"{INDEX_QUEUE_KEY}:last_flush_at"), time.time())
+
+
+@frappe.whitelist()
+def get_index_queue_stats():
+	"""Depth of the indexing queue, age in seconds of its oldest entry and totals flushed"""
+	frappe.only_for("System Manager")
+	cache = frappe.cache()
+	queue_key = cache.make_key(INDEX_QUEUE_KEY)
+	oldest = cache.zrange(queue_key, 0, 0, withscores=True)
+	last_flush_at = cache.get(cache.make_key(f"{INDEX_QUEUE_KEY}:last_flush_at"))
+	return {
+		"depth": cache.zcard(queue_key),
+		"lag": time.time() - oldest[0][1] if oldest else 0,
+		"flushed": int(cache.get(cache.make_key(f"{INDEX_QUEUE_KEY}:flushed")) or 0),
+		"last_flush_at": float(last_flush_at) if last_flush_at else None,
+	}
+
+
+@frappe.whitelist()
+def get_search_cache_stats():
+	"""Hits and misses of the search result cache"""
+	frappe.only_for("System Manager")
+	return GameplanSearch().get_cache_stats()
+
+
+def connect_shard_worker(site, sites_path):
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+
+
+def index_shard(version, doctype, start, end, chunk_size=CHUNK_SIZE):
+	search = GameplanSearch()
+	filters = [["name", ">=", start], ["name", "<=", end]]
+	indexed = 0
+	for records in search.get_doctype_record_chunks(doctype, chunk_size, filters=filters):
+		indexed += search.index_docs(records, version=version)
+		search.refresh_build_lock(version)
+	return indexed
+
+
+def build_index(chunk_size=CHUNK_SIZE, workers=1):
 	search = GameplanSearch()
-	search.build_index()
-	frappe.cache().set_value(INDEX_BUILD_FLAG, False)
+	return search.build_index(chunk_size=chunk_size, workers=workers)
 
 
 def build_index_in_background():
-	if not frappe.cache().get_value("discussions_index_in_progress"):
-		frappe.enqueue(build_index, queue="long")
+	if not GameplanSearch().is_building():
+		frappe.enqueue(build_index, queue="long", job_id="gameplan_search_build", deduplicate=True)
+
+
+def catch_up_index():
+	"""Index records changed since the last run, or build the index if it is missing, was built
+	with another schema or there is nothing to catch up from. Checking the index costs a read
+	of its cached state, it is never queried for its status."""
+	search = GameplanSearch()
+	if search.is_building():
+		return
+
+	if search.needs_build() or not search.get_watermarks():
+		build_index_in_background()
+		return
+	search.catch_up()
+
+
+def catch_up_index_in_background():
+	if not GameplanSearch().is_building():
+		frappe.enqueue(catch_up_index, queue="long", job_id="gameplan_search_catch_up", deduplicate=True)
 
 
-def build_index_if_not_exists():
+@frappe.whitelist()
+def get_search_index_state():
+	"""State of the search index, whether it is being built and whether it needs a build"""
+	frappe.only_for("System Manager")
 	search = GameplanSearch()
-	if not search.index_exists() or not frappe.cache.exists(INDEX_BUILD_FLAG):
-		build_index()
+	return {**search.get_state(), "is_building": search.is_building(), "needs_build": search.needs_build()}
@@ -0,0 +1,196 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+
+import json
+from datetime import datetime
+
+import frappe
+from frappe.utils import cstr, get_datetime
+
+SUGGESTIONS_KEY = "gameplan_sug"
+
+# the weight of a title halves for every this many seconds of inactivity, so that recently
+# active documents are suggested first. Weights are stored as 32 bit floats, which holds
+# 128 half lives from EPOCH.
+HALF_LIFE = 90 * 24 * 60 * 60
+EPOCH = datetime(2020, 1, 1).timestamp()
+
+# suggestions are fetched this many times over the limit, to have enough left after
+# dropping the ones the user cannot access
+OVERFETCH = 5
+
+CHUNK_SIZE = 1000
+
+# ends the title in suggestion strings, followed by the name of the record
+NAME_SEPARATOR = "\x1f"
+
+SUGGESTION_DOCTYPES = {
+	"GP Discussion": {"fields": ["project", "last_post_at"], "recency_field": "last_post_at"},
+	"GP Task": {"fields": ["project"]},
+	"GP Page": {"fields": ["project"]},
+	"GP Project": {"fields": ["archived_at"]},
+}
+
+
+class TitleSuggestions:
+	"""Typeahead over the titles of discussions, tasks, pages and projects, kept in a RediSearch
+	suggestion dictionary per doctype. Every suggestion carries the project it belongs to in its
+	payload, so that matches can be filtered by access without reading the database.
+
+	A dictionary holds a string once with one payload, so suggestions are the title followed by
+	the name of the record, and records sharing a title in different projects are suggested
+	separately. The suggestion of each name is tracked in a hash to remove it when its record is
+	renamed or deleted."""
+
+	def __init__(self, key=SUGGESTIONS_KEY) -> None:
+		self.redis = frappe.cache()
+		self.key = key
+
+	def get_key(self, doctype, key=None):
+		return self.redis.make_key(f"{key or self.key}:{doctype}")
+
+	def get_suggestions_key(self, doctype, key=None):
+		return self.redis.make_key(f"{key or self.key}:{doctype}:suggestions")
+
+	def get_suggestions(self, prefix, projects, limit=10, fuzzy=False):
+		"""Titles starting with `prefix` in any of `projects`, grouped by doctype, with one round trip"""
+		projects = set(projects)
+		pipeline = self.redis.pipeline(transaction=False)
+		for doctype in SUGGESTION_DOCTYPES:
+			args = ["FT.SUGGET", self.get_key(doctype), prefix, "MAX", limit * OVERFETCH, "WITHPAYLOADS"]
+			if fuzzy:
+				args.append("FUZZY")
+			pipeline.execute_command(*args)
+
+		out = {}
+		for doctype, response in zip(SUGGESTION_DOCTYPES, pipeline.execute(), strict=True):
+			items = []
+			response = response or []
+			for suggestion, payload in zip(response[0::2], response[1::2], strict=True):
+				payload = json.loads(frappe.safe_decode(payload)) if payload else {}
+				if payload.get("project") not in projects:
+					continue
+				items.append(
+					frappe._dict(
+						doctype=doctype,
+						name=payload.get("name"),
+						title=frappe.safe_decode(suggestion).split(NAME_SEPARATOR, 1)[0],
+						modified=payload.get("modified"),
+						payload={"project": payload.get("project"), "team": payload.get("team")},
+					)
+				)
+				if len(items) == limit:
+					break
+			if items:
+				out[doctype] = items
+		return out
+
+	def sync(self, doctype, names):
+		"""Add, update or remove the suggestions of `names` of `doctype` to match the database"""
+		names = list({cstr(name) for name in names})
+		if not names:
+			return
+
+		records = {cstr(d.name): d for d in self.get_records(doctype, filters=[["name", "in", names]])}
+		suggestions_key = self.get_suggestions_key(doctype)
+		old_suggestions = self.redis.hmget(suggestions_key, names)
+
+		pipeline = self.redis.pipeline(transaction=False)
+		for name, old_suggestion in zip(names, old_suggestions, strict=True):
+			old_suggestion = frappe.safe_decode(old_suggestion) if old_suggestion else None
+			record = records.get(name)
+			suggestion = self.get_suggestion(doctype, record) if record else None
+			if old_suggestion and old_suggestion != suggestion:
+				pipeline.execute_command("FT.SUGDEL", self.get_key(doctype), old_suggestion)
+			if suggestion:
+				self.add(pipeline, doctype, record)
+			else:
+				pipeline.hdel(suggestions_key, name)
+		pipeline.execute()
+
+	def rebuild(self, chunk_size=CHUNK_SIZE):
+		"""Fill the dictionaries from scratch next to the current ones and swap them in at the end"""
+		build_key = f"{self.key}:build"
+		for doctype in SUGGESTION_DOCTYPES:
+			keys = [
+				(self.get_key(doctype, build_key), self.get_key(doctype)),
+				(self.get_suggestions_key(doctype, build_key), self.get_suggestions_key(doctype)),
+			]
+			self.redis.delete(*[source for source, _target in keys])
+			for records in self.get_record_chunks(doctype, chunk_size):
+				self.add_records(doctype, records, key=build_key)
+
+			pipeline = self.redis.pipeline(transaction=False)
+			for source, _target in keys:
+				pipeline.exists(source)
+			built = pipeline.execute()
+
+			pipeline = self.redis.pipeline()
+			for (source, target), exists in zip(keys, built, strict=True):
+				if exists:
+					pipeline.rename(source, target)
+				else:
+					pipeline.delete(target)
+			pipeline.execute()
+
+	def add_records(self, doctype, records, key=None):
+		pipeline = self.redis.pipeline(transaction=False)
+		for record in records:
+			self.add(pipeline, doctype, record, key=key)
+		pipeline.execute()
+
+	def add(self, pipeline, doctype, record, key=None):
+		suggestion = self.get_suggestion(doctype, record)
+		if not suggestion:
+			return
+
+		options = SUGGESTION_DOCTYPES[doctype]
+		modified = record.get(options.get("recency_field")) or record.modified
+		payload = {
+			"name": cstr(record.name),
+			"project": cstr(record.name) if doctype == "GP Project" else cstr(record.project),
+			"team": record.team,
+			"modified": cstr(modified),
+		}
+		pipeline.execute_command(
+			"FT.SUGADD",
+			self.get_key(doctype, key),
+			suggestion,
+			self.get_score(modified),
+			"PAYLOAD",
+			json.dumps(payload),
+		)
+		pipeline.hset(self.get_suggestions_key(doctype, key), cstr(record.name), suggestion)
+
+	def get_suggestion(self, doctype, record):
+		title = self.get_title(doctype, record)
+		return f"{title}{NAME_SEPARATOR}{record.name}" if title else None
+
+	def get_title(self, doctype, record):
+		# archived projects and tasks outside projects are not suggested, like in search
+		if doctype == "GP Project" and record.archived_at:
+			return None
+		if doctype != "GP Project" and not record.project:
+			return None
+		return (record.title or "").strip() or None
+
+	def get_score(self, modified):
+		age = get_datetime(modified).timestamp() - EPOCH
+		return 2 ** (age / HALF_LIFE)
+
+	def get_records(self, doctype, filters=None, limit=None, order_by=None):
+		fields = ["name", "title", "team", "modified", *SUGGESTION_DOCTYPES[doctype]["fields"]]
+		return frappe.db.get_all(doctype, fields=fields, filters=filters, limit=limit, order_by=order_by)
+
+	def get_record_chunks(self, doctype, chunk_size=CHUNK_SIZE):
+		last_name = None
+		while True:
+			filters = [["name", ">", last_name]] if last_name is not None else []
+			records = self.get_records(doctype, filters=filters, limit=chunk_size, order_by="name asc")
+			if not records:
+				break
+			yield records
+			if len(records) < chunk_size:
+				break
+			last_name = records[-1].name
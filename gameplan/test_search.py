@@ -0,0 +1,459 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+from datetime import timedelta
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import cstr
+from redis.exceptions import ResponseError
+
+from gameplan.access import get_visibility_tag
+from gameplan.gameplan.doctype.gp_discussion.test_gp_discussion import (
+	make_discussion,
+	make_project,
+	make_user,
+)
+from gameplan.search import (
+	FLUSH_SCHEDULED_KEY,
+	INDEX_QUEUE_KEY,
+	GameplanSearch,
+	flush_index_queue,
+	hydrate_results,
+	index_shard,
+	make_snippet,
+	queue_index_update,
+)
+from gameplan.suggestions import SUGGESTION_DOCTYPES, TitleSuggestions
+from gameplan.utils.search import INDEX_STATES
+
+DOCUMENTS = {
+	"GP Discussion:1": {"title": "Apple pie", "content": "A sweet recipe", "project": "1"},
+	"GP Discussion:2": {"title": "Banana bread", "content": "Sweet as well", "project": "1"},
+	"GP Discussion:3": {"title": "Cherries", "content": "Sour apples", "project": "2"},
+}
+
+# query and the names of the documents it matches, the same with every backend
+QUERIES = {
+	"apple": {"1", "3"},
+	"apple|banana": {"1", "2", "3"},
+	"apple | banana": {"1", "2", "3"},
+	"sweet -banana": {"1"},
+	"-apple": {"2"},
+	"@title|content:(sweet -apple)": {"2"},
+	"@title:(apple|cherries)": {"1", "3"},
+	"swe*": {"1", "2"},
+	"sweet @project:{1}": {"1", "2"},
+	"apple @project:{2}": {"3"},
+}
+
+
+class TestSQLiteSearchBackend(FrappeTestCase):
+	backend = "sqlite"
+
+	def setUp(self):
+		self.search = GameplanSearch(
+			backend=self.backend,
+			index_name=f"test_gameplan_idx_{self.backend}",
+			prefix=f"test_search_doc_{self.backend}",
+		)
+		try:
+			self.search.backend.create_index(1)
+		except ResponseError:
+			self.skipTest("Redis server has no RediSearch module")
+		documents = [(id, self.search.get_mapping(doc), None) for id, doc in DOCUMENTS.items()]
+		self.search.backend.add_documents(1, documents)
+
+	def tearDown(self):
+		self.search.backend.drop_index(1)
+
+	def query(self, query):
+		result = self.search.backend.search(1, query, 0, 50, None, False, False, False)
+		return {doc.id.split(":", 1)[1] for doc in result.docs}
+
+	def test_queries(self):
+		for query, expected in QUERIES.items():
+			with self.subTest(query=query):
+				self.assertEqual(self.query(query), expected)
+
+	def test_remove_documents(self):
+		self.search.backend.remove_documents(1, ["GP Discussion:1"])
+		self.assertEqual(self.query("sweet"), {"2"})
+
+	def tiered_search(self, query, **kwargs):
+		def search(query, start, page_length, **kwargs):
+			return self.search.backend.search(1, query, start, page_length, None, False, False, False)
+
+		with patch.object(self.search, "search", side_effect=search):
+			return self.search.tiered_search(query, **kwargs)
+
+	def test_tiered_search_falls_back_to_looser_tiers(self):
+		result = self.tiered_search("sweet | cherr")
+		tiers = {tier["tier"]: tier["query"] for tier in result.tiers}
+		# operators are left as they are, and a tier that runs the query of the one before is skipped
+		expected = {"exact": "sweet | cherr", "prefix": "sweet* | cherr*"}
+		if self.search.backend.supports_fuzzy:
+			expected["fuzzy"] = "%%sweet%% | %%cherr%%"
+		self.assertEqual(tiers, expected)
+		self.assertEqual(result.tier, list(expected)[-1])
+		# hits of the exact tier come before the ones only the prefix tier found
+		self.assertEqual([doc.id for doc in result.docs][2:], ["GP Discussion:3"])
+		self.assertEqual({doc.id for doc in result.docs[:2]}, {"GP Discussion:1", "GP Discussion:2"})
+
+	def test_tiered_search_stops_at_enough_results(self):
+		result = self.tiered_search("swe -banana", min_results=1)
+		self.assertEqual([tier["tier"] for tier in result.tiers], ["exact", "prefix"])
+		self.assertEqual(result.tiers[-1]["query"], "swe* -banana")
+		self.assertEqual([doc.id for doc in result.docs], ["GP Discussion:1"])
+
+
+class TestRediSearchBackend(TestSQLiteSearchBackend):
+	backend = "redisearch"
+
+
+class TestMakeSnippet(FrappeTestCase):
+	def test_marks_matches(self):
+		self.assertEqual(make_snippet("Fish & chips", ["chip*"]), "Fish &amp; <mark>chips</mark>")
+
+	def test_terms_do_not_match_escaped_characters(self):
+		snippet = make_snippet("Tom & Jerry <3 lt", ["amp", "lt"])
+		self.assertEqual(snippet, "Tom &amp; Jerry &lt;3 <mark>lt</mark>")
+
+	def test_cuts_around_first_match(self):
+		snippet = make_snippet("word " * 100 + "needle", ["needle"], length=40)
+		self.assertTrue(snippet.startswith("..."))
+		self.assertTrue(snippet.endswith("<mark>needle</mark>"))
+
+
+class SearchIndexTestCase(FrappeTestCase):
+	"""Tests on an index of their own, with the SQLite backend so that any Redis server will do"""
+
+	def setUp(self):
+		self.search = GameplanSearch(backend="sqlite", index_name="test_gameplan_build_idx")
+
+	def tearDown(self):
+		for version in [1, 2, 3]:
+			self.search.drop_index_version(version)
+		self.search.redis.delete(
+			self.search.state_key,
+			self.search.state_version_key,
+			self.search.build_lock_key,
+			self.search.generation_key,
+		)
+		self.search.redis.delete_value(self.search.watermarks_key)
+		INDEX_STATES.pop((frappe.local.site, self.search.state_key), None)
+
+	def search_ids(self, query, version=None):
+		version = version or self.search.get_active_version()
+		result = self.search.backend.search(version, query, 0, 1000, None, False, False, False)
+		return {doc.id for doc in result.docs}
+
+
+class TestSearchIndexBuild(SearchIndexTestCase):
+	def test_build_indexes_every_record_a_chunk_at_a_time(self):
+		discussions = [make_discussion(make_project(), title=f"Chunked {i}") for i in range(3)]
+		chunks = list(self.search.get_record_chunks(chunk_size=2))
+		self.assertTrue(all(len(chunk) <= 2 for chunk in chunks))
+		records = [(d.doctype, d.name) for chunk in chunks for d in chunk]
+		self.assertEqual(len(records), len(set(records)))
+		self.assertEqual(len(records), self.search.get_records_count())
+
+		stats = self.search.build_index(chunk_size=2)
+		self.assertEqual(stats.total, len(records))
+		self.assertEqual(self.search.get_state().doc_count, stats.total)
+		self.assertEqual(self.search_ids("chunked"), {f"GP Discussion:{d.name}" for d in discussions})
+
+	def test_long_build_is_not_dropped(self):
+		version = self.search.start_build()
+		# started hours ago, and still making progress
+		started_at = frappe.utils.now_datetime() - timedelta(hours=3)
+		self.search.update_state(build_started_at=str(started_at))
+		self.search.refresh_build_lock(version)
+
+		self.assertTrue(self.search.is_building())
+		self.assertRaises(frappe.ValidationError, self.search.start_build)
+		self.assertTrue(self.search.backend.index_exists(version))
+
+	def test_abandoned_build_is_dropped(self):
+		version = self.search.start_build()
+		# the lock expires once the build stops refreshing it
+		self.search.redis.delete(self.search.build_lock_key)
+		self.assertFalse(self.search.is_building())
+
+		new_version = self.search.start_build()
+		self.assertEqual(new_version, version + 1)
+		self.assertFalse(self.search.backend.index_exists(version))
+		self.search.finish_build(new_version)
+		self.assertFalse(self.search.is_building())
+		self.assertEqual(self.search.get_active_version(), new_version)
+
+	def test_searches_use_the_active_index_until_the_build_finishes(self):
+		version = self.search.start_build()
+		self.search.add_documents([("GP Discussion:1", {"title": "Old apple"}, None)], version=version)
+		self.search.finish_build(version)
+
+		new_version = self.search.start_build()
+		# written while the build runs, the document reaches both indexes
+		self.search.add_document("GP Discussion:2", {"title": "New apple"})
+		self.assertEqual(self.search.get_active_version(), version)
+		self.assertEqual(self.search_ids("apple"), {"GP Discussion:1", "GP Discussion:2"})
+		self.assertEqual(self.search_ids("apple", new_version), {"GP Discussion:2"})
+
+		self.search.finish_build(new_version)
+		self.assertEqual(self.search.get_active_version(), new_version)
+		self.assertEqual(self.search_ids("apple"), {"GP Discussion:2"})
+		self.assertFalse(self.search.backend.index_exists(version))
+
+
+class TestShardedBuild(SearchIndexTestCase):
+	def test_shards_split_the_names_and_merge_into_one_index(self):
+		project = make_project()
+		sharded = [make_discussion(project, title=f"Sharded {i}") for i in range(5)]
+		names = {str(name) for name in frappe.get_all("GP Discussion", pluck="name")}
+
+		shards = self.search.get_shards("GP Discussion", 3)
+		self.assertLessEqual(len(shards), 3)
+		# contiguous and without overlaps, from the first name to the last
+		self.assertEqual(shards[0][0], min(int(name) for name in names))
+		self.assertEqual(shards[-1][1], max(int(name) for name in names))
+		for (_start, end), (next_start, _end) in zip(shards, shards[1:], strict=False):
+			self.assertEqual(next_start, end + 1)
+
+		version = self.search.start_build()
+		with patch("gameplan.search.GameplanSearch", return_value=self.search):
+			indexed = [
+				index_shard(version, "GP Discussion", start, end, chunk_size=2) for start, end in shards
+			]
+		self.assertEqual(sum(indexed), len(names))
+		self.assertEqual(self.search_ids("sharded", version), {f"GP Discussion:{d.name}" for d in sharded})
+
+
+class TestSearchIndexCatchUp(SearchIndexTestCase):
+	def setUp(self):
+		super().setUp()
+		version = self.search.start_build()
+		self.search.finish_build(version)
+		self.project = make_project()
+
+	def test_catch_up_syncs_changes_since_the_watermark(self):
+		self.assertEqual(self.search.get_watermarks(), {})
+		old = make_discussion(self.project, title="Watermark old")
+		frappe.db.set_value(
+			"GP Discussion",
+			old.name,
+			{"modified": "2020-01-01 00:00:00", "last_post_at": "2020-01-01 00:00:00"},
+			update_modified=False,
+		)
+		watermark = frappe.utils.now_datetime() - timedelta(hours=1)
+		self.search.set_watermarks(watermark)
+
+		new = make_discussion(self.project, title="Watermark new")
+		self.assertGreaterEqual(self.search.catch_up().indexed, 1)
+		self.assertEqual(self.search_ids("watermark"), {f"GP Discussion:{new.name}"})
+		self.assertGreater(self.search.get_watermarks()["GP Discussion"], watermark)
+
+		new.delete()
+		self.assertGreaterEqual(self.search.catch_up().removed, 1)
+		self.assertEqual(self.search_ids("watermark"), set())
+
+
+class TestSearchResultCache(SearchIndexTestCase):
+	def setUp(self):
+		super().setUp()
+		version = self.search.start_build()
+		self.search.finish_build(version)
+		# the team of the project makes Administrator see more than the member
+		make_project()
+		self.user = make_user()
+		self.addCleanup(frappe.set_user, "Administrator")
+
+	def test_results_are_cached_per_query_and_scope(self):
+		# a query of its own, so that results cached by an earlier run are not hit
+		query = f"Apple {frappe.generate_hash(length=8)}"
+		result = frappe._dict(docs=[], total=0, duration=0)
+		with patch("gameplan.utils.search.Search.search", return_value=result) as search:
+			self.search.search(query)
+			self.search.search(f"  {query.upper()}  ")
+			self.assertEqual(search.call_count, 1)
+
+			self.search.search(query, page_length=10)
+			self.assertEqual(search.call_count, 2)
+
+			frappe.set_user(self.user)
+			self.search.search(query)
+			self.assertEqual(search.call_count, 3)
+
+			# any write to the index invalidates the cache
+			self.search.bump_generation()
+			self.search.search(query)
+			self.assertEqual(search.call_count, 4)
+
+
+class TestSearchVisibility(SearchIndexTestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = make_user()
+		self.addCleanup(frappe.set_user, "Administrator")
+
+	def test_results_are_limited_to_public_projects_and_teams_of_the_user(self):
+		# a word of its own, so that results cached by an earlier run are not hit
+		word = frappe.generate_hash(length=8)
+		private = make_project()
+		private.is_private = 1
+		private.save()
+		public = make_discussion(make_project(), title=f"Public {word}")
+		hidden = make_discussion(private, title=f"Private {word}")
+
+		version = self.search.start_build()
+		names = [public.name, hidden.name]
+		for records in self.search.get_doctype_record_chunks(
+			"GP Discussion", filters=[["name", "in", names]]
+		):
+			self.search.index_docs(records, version=version)
+		self.search.finish_build(version)
+
+		def search_ids():
+			return {doc.id for doc in self.search.search(word).docs}
+
+		both = {f"GP Discussion:{public.name}", f"GP Discussion:{hidden.name}"}
+		self.assertEqual(search_ids(), both)
+		frappe.set_user(self.user)
+		self.assertEqual(search_ids(), {f"GP Discussion:{public.name}"})
+
+		frappe.set_user("Administrator")
+		team = frappe.get_doc("GP Team", private.team)
+		team.add_member(self.user)
+		team.save()
+		frappe.set_user(self.user)
+		self.assertEqual(search_ids(), both)
+
+
+class TestIndexQueue(SearchIndexTestCase):
+	def setUp(self):
+		super().setUp()
+		version = self.search.start_build()
+		self.search.finish_build(version)
+		self.cache = frappe.cache()
+		self.queue_key = self.cache.make_key(INDEX_QUEUE_KEY)
+		self.cache.delete(self.queue_key, self.cache.make_key(FLUSH_SCHEDULED_KEY))
+
+	def tearDown(self):
+		self.cache.delete(self.queue_key, self.cache.make_key(FLUSH_SCHEDULED_KEY))
+		super().tearDown()
+
+	def test_saves_are_queued_once_on_commit_and_flushed(self):
+		discussion = make_discussion(make_project(), title="Queued")
+		member = f"GP Discussion:{discussion.name}"
+		frappe.db.after_commit.reset()
+		queue_index_update(discussion)
+		queue_index_update(discussion)
+		self.assertEqual(self.cache.zcard(self.queue_key), 0)
+
+		with patch("frappe.enqueue") as enqueue:
+			frappe.db.after_commit.run()
+		self.assertEqual(self.cache.zrange(self.queue_key, 0, -1), [member.encode()])
+		enqueue.assert_called_once()
+
+		with patch("gameplan.search.GameplanSearch", return_value=self.search):
+			flush_index_queue()
+		self.assertEqual(self.cache.zcard(self.queue_key), 0)
+		self.assertEqual(self.search_ids("queued"), {member})
+
+
+class TestCommentDocuments(FrappeTestCase):
+	def setUp(self):
+		self.search = GameplanSearch(backend="sqlite", index_name="test_gameplan_build_idx")
+		self.discussion = make_discussion(make_project())
+		project = make_project()
+		project.is_private = 1
+		project.save()
+		self.task = frappe.get_doc(doctype="GP Task", title="Test Task", project=project.name).insert()
+
+	def make_comment(self, parent):
+		return frappe.get_doc(
+			doctype="GP Comment",
+			reference_doctype=parent.doctype,
+			reference_name=parent.name,
+			content="<p>Test comment</p>",
+		).insert()
+
+	def test_comment_references_are_resolved_per_chunk(self):
+		parents = [self.discussion, self.task, self.discussion]
+		names = [self.make_comment(parent).name for parent in parents]
+		records = next(self.search.get_doctype_record_chunks("GP Comment", filters=[["name", "in", names]]))
+
+		with self.assertQueryCount(1):
+			references = self.search.get_comment_references(records)
+		self.assertEqual(len(references), 3)
+
+		visibility = self.search.get_visibility({project for _team, project in references.values()})
+		documents = {
+			id: fields
+			for id, fields, _payload in (self.search.get_document(d, references, visibility) for d in records)
+		}
+		for name, parent in zip(names, parents, strict=True):
+			fields = documents[f"GP Comment:{name}"]
+			self.assertEqual((fields["team"], cstr(fields["project"])), (parent.team, cstr(parent.project)))
+		task_comment = documents[f"GP Comment:{names[1]}"]
+		self.assertEqual(task_comment["visibility"], get_visibility_tag(True, self.task.team))
+
+
+class TestTitleSuggestions(FrappeTestCase):
+	def setUp(self):
+		self.suggestions = TitleSuggestions(key="test_gameplan_sug")
+		try:
+			self.suggestions.redis.execute_command("FT.SUGLEN", self.suggestions.get_key("GP Discussion"))
+		except ResponseError:
+			self.skipTest("Redis server has no RediSearch module")
+
+	def tearDown(self):
+		for doctype in SUGGESTION_DOCTYPES:
+			self.suggestions.redis.delete(
+				self.suggestions.get_key(doctype), self.suggestions.get_suggestions_key(doctype)
+			)
+
+	def add(self, name, title, project):
+		now = frappe.utils.now()
+		record = frappe._dict(
+			name=name, title=title, project=project, team="t", modified=now, last_post_at=now
+		)
+		self.suggestions.add_records("GP Discussion", [record])
+
+	def test_same_title_in_other_projects(self):
+		self.add(1, "Roadmap", "1")
+		self.add(2, "Roadmap", "2")
+		for project in ["1", "2"]:
+			items = self.suggestions.get_suggestions("road", [project])["GP Discussion"]
+			self.assertEqual([(item.name, item.title) for item in items], [(project, "Roadmap")])
+
+
+class TestHydrateResults(FrappeTestCase):
+	def setUp(self):
+		project = make_project()
+		self.discussions = [make_discussion(project, title=f"Discussion {i}") for i in range(2)]
+
+	def comment_hit(self, discussion, name, score):
+		return frappe._dict(
+			id=f"GP Comment:{name}",
+			score=score,
+			content=f"Comment {name}",
+			payload={"reference_doctype": "GP Discussion", "reference_name": discussion.name},
+		)
+
+	def test_comment_hits_are_collapsed_into_their_discussion(self):
+		first, second = self.discussions
+		docs = [
+			self.comment_hit(first, "1", score=1),
+			self.comment_hit(first, "2", score=3),
+			self.comment_hit(first, "3", score=2),
+			frappe._dict(id=f"GP Discussion:{second.name}", score=1, content="", payload={}),
+			self.comment_hit(second, "4", score=5),
+		]
+		results = hydrate_results(docs)["GP Discussion"]
+
+		self.assertEqual([d.name for d in results], [str(second.name), str(first.name)])
+		self.assertFalse(results[0].get("via_comment"))
+		self.assertTrue(results[1].via_comment)
+		self.assertEqual(results[1].title, "Discussion 0")
+		self.assertEqual(results[1].content, "Comment 2")
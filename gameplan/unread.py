@@ -0,0 +1,241 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Unread discussion counts per user and project, maintained in Redis as the difference of two
+counters: the discussions in each project, shared by everyone, and the discussions each user has
+read since their last post. A new discussion only bumps the shared counter, a visit only touches
+the visitor's counter, and a new post only the counters of the users who had read the discussion
+up to it. Counters missing from Redis are built from the database on first read, and
+`reconcile_unread_counts` rebuilds them all periodically to correct any drift. Visits that are
+still buffered in Redis (see `gameplan.visits`) count as if they were written.
+"""
+
+from collections import Counter, defaultdict
+
+import frappe
+from frappe.utils import cstr, get_datetime
+
+from gameplan.access import get_accessible_projects, get_project_teams
+from gameplan.visits import get_buffered_visitors, get_buffered_visits_of_user
+
+DISCUSSIONS_KEY = "gameplan:unread:discussions"
+READ_KEY = "gameplan:unread:read"
+USERS_KEY = "gameplan:unread:users"
+
+# marks a counter hash as built, since Redis drops empty hashes
+BUILT = "__built__"
+
+
+def get_unread_counts(user=None):
+	"""Number of unread discussions of `user` per accessible project, leaving out zeros"""
+	user = user or frappe.session.user
+	discussions = get_counter(DISCUSSIONS_KEY, count_discussions)
+	read = get_counter(get_read_key(user), lambda: count_read_discussions(user))
+	out = {}
+	for project in get_accessible_projects(user):
+		unread = discussions.get(project, 0) - read.get(project, 0)
+		if unread > 0:
+			out[project] = unread
+	return out
+
+
+def get_unread_counts_by_team(user=None):
+	teams = get_project_teams()
+	out = {}
+	for project, count in get_unread_counts(user).items():
+		team = teams.get(project)
+		if team:
+			out[team] = out.get(team, 0) + count
+	return out
+
+
+def on_discussion_insert(doc):
+	apply_after_commit({doc.project: 1}, {})
+
+
+def on_discussion_trash(doc):
+	readers = get_visitors(doc.name, since=doc.last_post_at)
+	apply_after_commit({doc.project: -1}, {user: {doc.project: -1} for user in readers})
+
+
+def on_discussion_update(doc):
+	"""Users who had read the discussion up to its previous post have an unread discussion again,
+	and moving the discussion moves its counts to the new project"""
+	previous = doc.get_doc_before_save()
+	if not previous:
+		return
+
+	discussions = Counter()
+	read = defaultdict(Counter)
+	if doc.has_value_changed("last_post_at") and previous.last_post_at:
+		for user in get_visitors(doc.name, since=previous.last_post_at, until=doc.last_post_at):
+			read[user][previous.project] -= 1
+
+	if doc.has_value_changed("project"):
+		discussions[previous.project] -= 1
+		discussions[doc.project] += 1
+		for user in get_visitors(doc.name, since=doc.last_post_at):
+			read[user][previous.project] -= 1
+			read[user][doc.project] += 1
+
+	if discussions or read:
+		apply_after_commit(discussions, read)
+
+
+def on_new_post(discussion, project, previous_post_at, last_post_at):
+	"""For posts saved without saving the discussion: users who had read it up to its previous post
+	have an unread discussion again"""
+	if not previous_post_at:
+		return
+	readers = get_visitors(discussion, since=previous_post_at, until=last_post_at)
+	if readers:
+		apply_after_commit({}, {user: {project: -1} for user in readers})
+
+
+def on_visit_change(visit):
+	previous = visit.get_doc_before_save()
+	on_visit(visit.user, visit.discussion, previous and previous.last_visit, visit.last_visit)
+
+
+def on_visit(user, discussion, previous_visit, last_visit):
+	"""The visitor has read the discussion if the visit is at or after its last post"""
+	values = frappe.db.get_value("GP Discussion", discussion, ["project", "last_post_at"])
+	if not values or not all(values):
+		return
+	project, last_post_at = values
+
+	last_post_at = get_datetime(last_post_at)
+	was_read = bool(previous_visit and get_datetime(previous_visit) >= last_post_at)
+	is_read = bool(last_visit and get_datetime(last_visit) >= last_post_at)
+	if was_read != is_read:
+		apply_after_commit({}, {user: {project: 1 if is_read else -1}})
+
+
+def reset_read_counter(user):
+	"""Drop the read counter of `user` once the transaction commits, for changes to many visits at
+	once. It is built again on its next read."""
+	cache = frappe.cache()
+	frappe.db.after_commit.add(lambda: cache.delete(cache.make_key(get_read_key(user))))
+
+
+def get_visitors(discussion, since, until=None):
+	"""Users whose last visit of `discussion` is at or after `since`, and before `until` if passed"""
+	since, until = get_datetime(since), until and get_datetime(until)
+	filters = [["discussion", "=", discussion], ["last_visit", ">=", since]]
+	if until:
+		filters.append(["last_visit", "<", until])
+	# a buffered visit is later than the written one of the same user
+	buffered = get_buffered_visitors("GP Discussion", discussion)
+	visitors = {user for user in frappe.db.get_all("GP Discussion Visit", filters=filters, pluck="user")}
+	visitors -= set(buffered)
+	visitors.update(
+		user for user, visit in buffered.items() if visit >= since and (not until or visit < until)
+	)
+	return list(visitors)
+
+
+def apply_after_commit(discussions, read):
+	"""Apply counter deltas once the transaction commits, so that rolled back changes leave no trace"""
+	frappe.db.after_commit.add(lambda: apply_deltas(discussions, read))
+
+
+def apply_deltas(discussions, read):
+	cache = frappe.cache()
+	counters = [(DISCUSSIONS_KEY, discussions)]
+	counters += [(get_read_key(user), deltas) for user, deltas in read.items()]
+	keys = [cache.make_key(key) for key, _deltas in counters]
+	# counters that are not built are built from the database when read, with these changes in
+	pipeline = cache.pipeline(transaction=False)
+	for key in keys:
+		pipeline.hexists(key, BUILT)
+	built = pipeline.execute()
+
+	pipeline = cache.pipeline(transaction=False)
+	for key, is_built, (_key, deltas) in zip(keys, built, counters, strict=True):
+		if not is_built:
+			continue
+		for project, delta in deltas.items():
+			if project and delta:
+				pipeline.hincrby(key, cstr(project), delta)
+	pipeline.execute()
+
+
+def get_counter(key, builder):
+	cache = frappe.cache()
+	# read raw, the cache wrapper's hgetall unpickles values
+	pipeline = cache.pipeline(transaction=False)
+	pipeline.hgetall(cache.make_key(key))
+	values = pipeline.execute()[0]
+	if BUILT.encode() not in values:
+		return build_counter(key, builder)
+
+	return {frappe.safe_decode(k): int(v) for k, v in values.items() if k != BUILT.encode()}
+
+
+def build_counter(key, builder):
+	cache = frappe.cache()
+	redis_key = cache.make_key(key)
+	counts = builder()
+	pipeline = cache.pipeline()
+	pipeline.delete(redis_key)
+	pipeline.hset(redis_key, mapping={**counts, BUILT: 1})
+	if key.startswith(f"{READ_KEY}:"):
+		pipeline.sadd(cache.make_key(USERS_KEY), key[len(READ_KEY) + 1 :])
+	pipeline.execute()
+	return counts
+
+
+def get_read_key(user):
+	return f"{READ_KEY}:{user}"
+
+
+def count_discussions():
+	rows = frappe.db.get_all("GP Discussion", fields=["project", "count(name) as count"], group_by="project")
+	return {cstr(row.project): row.count for row in rows if row.project}
+
+
+def count_read_discussions(user):
+	from frappe.query_builder.functions import Count
+
+	Discussion = frappe.qb.DocType("GP Discussion")
+	Visit = frappe.qb.DocType("GP Discussion Visit")
+	rows = (
+		frappe.qb.from_(Visit)
+		.join(Discussion)
+		.on(Discussion.name == Visit.discussion)
+		.select(Discussion.project, Count(Discussion.name).as_("count"))
+		.where(Visit.user == user)
+		.where(Visit.last_visit >= Discussion.last_post_at)
+		.groupby(Discussion.project)
+		.run(as_dict=True)
+	)
+	counts = Counter({cstr(row.project): row.count for row in rows if row.project})
+
+	buffered = get_buffered_visits_of_user("GP Discussion", user)
+	if buffered:
+		rows = (
+			frappe.qb.from_(Discussion)
+			.left_join(Visit)
+			.on((Visit.discussion == Discussion.name) & (Visit.user == user))
+			.select(Discussion.name, Discussion.project, Discussion.last_post_at, Visit.last_visit)
+			.where(Discussion.name.isin(list(buffered)))
+			.run(as_dict=True)
+		)
+		for row in rows:
+			if not row.project or not row.last_post_at:
+				continue
+			last_post_at = get_datetime(row.last_post_at)
+			was_read = bool(row.last_visit and get_datetime(row.last_visit) >= last_post_at)
+			is_read = buffered[cstr(row.name)] >= last_post_at
+			counts[cstr(row.project)] += is_read - was_read
+	return dict(counts)
+
+
+def reconcile_unread_counts():
+	"""Rebuild the counters from the database, for the users who have them"""
+	cache = frappe.cache()
+	build_counter(DISCUSSIONS_KEY, count_discussions)
+	for user in cache.smembers(USERS_KEY):
+		user = frappe.safe_decode(user)
+		build_counter(get_read_key(user), lambda user=user: count_read_discussions(user))
@@ -1 +1,2 @@
+from .content import get_content, html_to_text, process_content  # noqa: F401
 from .utils import *
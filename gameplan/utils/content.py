@@ -0,0 +1,62 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+
+import frappe
+from bs4 import BeautifulSoup
+
+# tags dropped from the end of the content when they are empty
+TRAILING_EMPTY_TAGS = ("br", "p")
+
+
+def get_content(doc, fieldname):
+	"""Processed content of `fieldname` of `doc` (see `process_content`). Documents keep it in their
+	flags, so that the steps of a save share one parse, until the field changes."""
+	html = doc.get(fieldname) or ""
+	flags = doc.get("flags")
+	cache = flags.setdefault("processed_content", {}) if flags is not None else {}
+	content = cache.get(fieldname)
+	if not content or html not in (content.source, content.html):
+		content = cache[fieldname] = process_content(html)
+	return content
+
+
+def process_content(html):
+	"""Parse `html` once and return the `source` HTML, the `html` without empty trailing
+	paragraphs, the `mentions` in it and its plain `text`"""
+	soup = BeautifulSoup(html or "", "html.parser")
+	remove_empty_trailing_tags(soup)
+	return frappe._dict(
+		source=html or "",
+		html=str(soup),
+		mentions=get_mentions(soup),
+		text=get_text(soup),
+	)
+
+
+def remove_empty_trailing_tags(soup):
+	tags = soup.find_all(True)
+	tags.reverse()
+	for tag in tags:
+		if tag.name in TRAILING_EMPTY_TAGS and not tag.contents:
+			tag.extract()
+		else:
+			# break on first non-empty tag
+			break
+	return soup
+
+
+def get_mentions(soup):
+	return [
+		frappe._dict(full_name=d.get("data-label"), email=d.get("data-id"))
+		for d in soup.find_all("span", attrs={"data-type": "mention"})
+	]
+
+
+def get_text(soup):
+	return " ".join(soup.get_text(" ").split())
+
+
+def html_to_text(html):
+	"""Plain text of `html`, with whitespace collapsed"""
+	return get_text(BeautifulSoup(html or "", "html.parser"))
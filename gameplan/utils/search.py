@@ -2,10 +2,12 @@
 # MIT License. See license.txt
 
 
+import hashlib
 import json
+import re
 
 import frappe
-from frappe.utils import cstr
+from frappe.utils import cint, cstr
 from redis.commands.search.field import TagField, TextField
 
 try:
@@ -16,49 +18,445 @@ except ImportError:
 from redis.commands.search.query import Query
 from redis.exceptions import ResponseError
 
+DEFAULT_BACKEND = "redisearch"
+
+# seconds a cached search result is served for
+RESULT_CACHE_TTL = 60
+
+# a build that has not made progress for this many seconds is considered abandoned
+BUILD_LOCK_TIMEOUT = 5 * 60
+
+WORD = re.compile(r"\w+")
+
+# index states read by this process, keyed by site and state key, with the state version they were read at
+INDEX_STATES = {}
+
+
+def get_backend_class(backend=None):
+	"""Search backend set as `gameplan_search_backend` in site config, RediSearch by default"""
+	from gameplan.utils.search_sqlite import SQLiteSearchBackend
+
+	backends = {
+		"redisearch": RediSearchBackend,
+		"sqlite": SQLiteSearchBackend,
+	}
+	backend = backend or frappe.conf.get("gameplan_search_backend") or DEFAULT_BACKEND
+	if backend not in backends:
+		frappe.throw(f"Invalid search backend {backend}, must be one of {', '.join(backends)}")
+	return backends[backend]
+
 
 class Search:
-	def __init__(self, index_name, prefix, schema) -> None:
+	"""A full text index with a fixed schema. Documents are stored and queried by a backend
+	(see `get_backend_class`), while index versions are tracked in Redis for every backend.
+
+	In compact mode, opted into with `gameplan_search_compact` in site config, fields marked
+	`compact` in the schema are stored as their distinct words instead of the full text and the
+	index keeps no term offsets or frequencies. Such an index takes much less memory but cannot
+	highlight matches, so snippets have to be made from the source records."""
+
+	def __init__(self, index_name, prefix, schema, backend=None, compact=None) -> None:
 		self.redis = frappe.cache()
 		self.index_name = index_name
 		self.prefix = prefix
 		self.schema = []
 		for field in schema:
 			self.schema.append(frappe._dict(field))
+		self.compact = cint(frappe.conf.get("gameplan_search_compact") if compact is None else compact)
+		self.backend = get_backend_class(backend)(self)
+
+	@property
+	def state_key(self):
+		return self.redis.make_key(f"{self.index_name}:{self.backend.name}:state")
+
+	@property
+	def state_version_key(self):
+		return self.redis.make_key(f"{self.index_name}:{self.backend.name}:state_version")
+
+	@property
+	def build_lock_key(self):
+		return self.redis.make_key(f"{self.index_name}:{self.backend.name}:build_lock")
+
+	def get_state(self):
+		"""Descriptor of the index: `status` of the active index ("missing" or "ready"), its `version`,
+		`doc_count`, `schema_hash` and `built_at` as of its build, and the `building_version` and
+		`build_started_at` of a rebuild in progress. Kept in the process and read again only when
+		the state version in Redis changes, so checking it costs a single GET."""
+		state_version = int(self.redis.get(self.state_version_key) or 0)
+		cache_key = (frappe.local.site, self.state_key)
+		cached = INDEX_STATES.get(cache_key)
+		if cached and cached[0] == state_version:
+			return cached[1]
+
+		value = self.redis.get(self.state_key)
+		if not value:
+			if self.redis.set(self.state_key, json.dumps(self.get_initial_state()), nx=True):
+				self.redis.incr(self.state_version_key)
+			return self.get_state()
+
+		state = frappe._dict(json.loads(value))
+		INDEX_STATES[cache_key] = (state_version, state)
+		return state
+
+	def get_initial_state(self):
+		"""State of an index built before states were tracked, from its version pointer"""
+		version = self.redis.get_value(f"{self.index_name}:{self.backend.name}:active_version")
+		return frappe._dict(
+			status="ready" if self.backend.index_exists(version) else "missing",
+			version=version,
+			doc_count=None,
+			schema_hash=None,
+			built_at=None,
+			building_version=None,
+			build_started_at=None,
+		)
+
+	def update_state(self, **changes):
+		state = frappe._dict({**self.get_state(), **changes})
+		pipeline = self.redis.pipeline()
+		pipeline.set(self.state_key, json.dumps(state, default=str))
+		pipeline.incr(self.state_version_key)
+		pipeline.execute()
+		INDEX_STATES.pop((frappe.local.site, self.state_key), None)
+		return state
+
+	def get_schema_hash(self):
+		# switching compact mode on or off needs a rebuild just like a schema change
+		schema = {"schema": self.schema, "compact": True} if self.compact else self.schema
+		return hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+	def has_current_schema(self):
+		"""Whether the active index was built with the schema in code, so that its new fields can be
+		queried"""
+		state = self.get_state()
+		return state.status == "ready" and state.schema_hash == self.get_schema_hash()
+
+	def get_active_version(self):
+		"""Version of the index that serves searches. `None` is the legacy unversioned index."""
+		return self.get_state().version
+
+	def get_building_version(self):
+		"""Version of the shadow index that is being built, if any"""
+		return self.get_state().building_version
+
+	def is_building(self):
+		"""Whether a rebuild is in progress and has not been abandoned. A build holds a lock that
+		expires unless the build refreshes it as it makes progress, however long it runs."""
+		building_version = self.get_state().building_version
+		if not building_version:
+			return False
+		return cint(self.redis.get(self.build_lock_key)) == building_version
+
+	def refresh_build_lock(self, version):
+		"""Keep the build of `version` from being taken for abandoned, called as it makes progress"""
+		self.redis.set(self.build_lock_key, version, ex=BUILD_LOCK_TIMEOUT)
+
+	def needs_build(self):
+		"""Whether the index is missing or was built with another schema, and no build is running.
+		An index built before schemas were tracked is assumed to be current."""
+		if self.is_building():
+			return False
+		state = self.get_state()
+		if state.status != "ready":
+			return True
+		return bool(state.schema_hash) and state.schema_hash != self.get_schema_hash()
+
+	@property
+	def generation_key(self):
+		return self.redis.make_key(f"{self.index_name}:generation")
+
+	def get_generation(self):
+		return int(self.redis.get(self.generation_key) or 0)
+
+	def bump_generation(self):
+		"""Invalidate all cached search results, called on every write to the active index"""
+		self.redis.incr(self.generation_key)
+
+	def get_cached_results(self, key_parts, generator, ttl=RESULT_CACHE_TTL):
+		"""Results of `generator` cached for `ttl` seconds under `key_parts` and the current
+		index generation, so that any write to the index invalidates them."""
+		fingerprint = hashlib.sha1(json.dumps(key_parts, sort_keys=True, default=str).encode()).hexdigest()
+		key = f"{self.index_name}:results:{self.get_generation()}:{fingerprint}"
+		result = self.redis.get_value(key)
+		if result is not None:
+			self.redis.incr(self.redis.make_key(f"{self.index_name}:results:hits"))
+			return result
+
+		self.redis.incr(self.redis.make_key(f"{self.index_name}:results:misses"))
+		result = generator()
+		self.redis.set_value(key, result, expires_in_sec=ttl)
+		return result
+
+	def get_cache_stats(self):
+		hits = int(self.redis.get(self.redis.make_key(f"{self.index_name}:results:hits")) or 0)
+		misses = int(self.redis.get(self.redis.make_key(f"{self.index_name}:results:misses")) or 0)
+		return {
+			"hits": hits,
+			"misses": misses,
+			"hit_ratio": hits / (hits + misses) if hits + misses else 0,
+			"generation": self.get_generation(),
+		}
+
+	def get_index_name(self, version=None):
+		return f"{self.index_name}_v{version}" if version else self.index_name
+
+	def get_prefix(self, version=None):
+		return f"{self.prefix}_v{version}" if version else self.prefix
+
+	def get_write_versions(self):
+		"""Index versions that must receive writes: the active index and, while a rebuild is
+		running, the shadow index so that it does not miss updates made during the build."""
+		versions = []
+		if self.index_exists():
+			versions.append(self.get_active_version())
+		building_version = self.get_building_version()
+		if building_version and building_version not in versions:
+			versions.append(building_version)
+		return versions
+
+	def create_index(self, version=None):
+		self.backend.create_index(version)
+
+	def start_build(self):
+		"""Create a new shadow index and register it as the one being built.
+		Returns the version of the shadow index."""
+		state = self.get_state()
+		stale_version = state.building_version
+		if stale_version:
+			if self.is_building():
+				frappe.throw(f"Search index {self.index_name} is already being built")
+			# a previous build did not finish, start over
+			self.drop_index_version(stale_version)
+
+		version = max(state.version or 0, stale_version or 0) + 1
+		if not self.redis.set(self.build_lock_key, version, nx=True, ex=BUILD_LOCK_TIMEOUT):
+			frappe.throw(f"Search index {self.index_name} is already being built")
+		self.create_index(version)
+		self.update_state(building_version=version, build_started_at=str(frappe.utils.now_datetime()))
+		return version
+
+	def finish_build(self, version, doc_count=None):
+		"""Point searches to the shadow index `version` and drop the index it replaces"""
+		state = self.get_state()
+		if state.building_version != version:
+			frappe.throw(f"Version {version} of search index {self.index_name} is not being built")
+
+		self.update_state(
+			status="ready",
+			version=version,
+			doc_count=doc_count,
+			schema_hash=self.get_schema_hash(),
+			built_at=str(frappe.utils.now_datetime()),
+			building_version=None,
+			build_started_at=None,
+		)
+		self.redis.delete(self.build_lock_key)
+		self.bump_generation()
+		if state.status == "ready" and state.version != version:
+			self.drop_index_version(state.version)
+
+	def abort_build(self, version):
+		if self.get_building_version() == version:
+			self.update_state(building_version=None, build_started_at=None)
+			self.redis.delete(self.build_lock_key)
+		self.drop_index_version(version)
+
+	def add_document(self, id, doc, payload=None):
+		mapping = self.get_mapping(doc)
+		for version in self.get_write_versions():
+			self.backend.add_documents(version, [(id, mapping, payload)])
+		self.bump_generation()
+
+	def add_documents(self, documents, version=None):
+		"""Add a batch of `(id, doc, payload)` tuples in a single round trip per index.
+		Writes only to the index `version` if it is passed, otherwise to all live indexes.
+		Returns the number of documents sent to the index."""
+		versions = [version] if version else self.get_write_versions()
+		if not versions:
+			return 0
+
+		documents = [(id, self.get_mapping(doc), payload) for id, doc, payload in documents]
+		if not documents:
+			return 0
+
+		for write_version in versions:
+			self.backend.add_documents(write_version, documents)
+		if not version or version == self.get_active_version():
+			self.bump_generation()
+		return len(documents)
+
+	def get_mapping(self, doc):
+		doc = frappe._dict(doc)
+		mapping = {}
+		for field in self.schema:
+			if field.name in doc:
+				value = cstr(doc[field.name])
+				mapping[field.name] = get_distinct_words(value) if self.compact and field.compact else value
+		return mapping
 
-	def create_index(self):
+	def remove_document(self, id):
+		self.remove_documents([id])
+
+	def remove_documents(self, ids):
+		"""Remove a batch of documents in a single round trip per index"""
+		versions = self.get_write_versions()
+		if not ids or not versions:
+			return 0
+
+		for version in versions:
+			self.backend.remove_documents(version, ids)
+		self.bump_generation()
+		return len(ids)
+
+	def search(
+		self,
+		query,
+		start=0,
+		page_length=50,
+		sort_by=None,
+		highlight=False,
+		with_payloads=False,
+		with_scores=False,
+	):
+		return self.backend.search(
+			self.get_active_version(),
+			query,
+			start=start,
+			page_length=page_length,
+			sort_by=sort_by,
+			# compact indexes keep no offsets to highlight with
+			highlight=highlight and not self.compact,
+			with_payloads=with_payloads,
+			with_scores=with_scores,
+		)
+
+	def spellcheck(self, query, **kwargs):
+		return self.backend.spellcheck(self.get_active_version(), query, **kwargs)
+
+	def drop_index(self):
+		if self.index_exists():
+			self.drop_index_version(self.get_active_version())
+			self.update_state(status="missing", version=None, doc_count=None, schema_hash=None, built_at=None)
+
+	def drop_index_version(self, version):
+		"""Drop the index `version` along with its documents"""
+		self.backend.drop_index(version)
+
+	def index_exists(self):
+		return self.get_state().status == "ready"
+
+
+def get_distinct_words(text):
+	"""Words of `text` in order of first appearance, each once. Matches the same queries as the
+	text itself, except for phrases."""
+	return " ".join(dict.fromkeys(WORD.findall(text.lower())))
+
+
+class SearchBackend:
+	"""Storage and query engine behind `Search`. Every method works on one version of the index,
+	`None` being the legacy unversioned index. Queries use the RediSearch query syntax."""
+
+	name = None
+
+	# whether the Redis server has the RediSearch module, for features that use it directly
+	supports_suggestions = False
+
+	# whether `%%term%%` fuzzy terms match more than the prefix `term*` does
+	supports_fuzzy = False
+
+	def __init__(self, search) -> None:
+		self.index = search
+
+	def create_index(self, version):
+		raise NotImplementedError
+
+	def index_exists(self, version):
+		raise NotImplementedError
+
+	def drop_index(self, version):
+		raise NotImplementedError
+
+	def add_documents(self, version, documents):
+		"""Add or replace `(id, mapping, payload)` tuples"""
+		raise NotImplementedError
+
+	def remove_documents(self, version, ids):
+		raise NotImplementedError
+
+	def search(self, version, query, start, page_length, sort_by, highlight, with_payloads, with_scores):
+		"""Returns `total`, `duration` in milliseconds and `docs`, each with its `id`, stored fields,
+		and `payload` and `score` if asked for"""
+		raise NotImplementedError
+
+	def spellcheck(self, version, query, **kwargs):
+		return {}
+
+
+class RediSearchBackend(SearchBackend):
+	name = "redisearch"
+	supports_suggestions = True
+	supports_fuzzy = True
+
+	def __init__(self, search) -> None:
+		super().__init__(search)
+		self.redis = search.redis
+
+	def ft(self, version):
+		return self.redis.ft(self.index.get_index_name(version))
+
+	def get_doc_id(self, id, version):
+		return self.redis.make_key(f"{self.index.get_prefix(version)}:{id}").decode()
+
+	def create_index(self, version):
 		index_def = IndexDefinition(
-			prefix=[f"{self.redis.make_key(self.prefix).decode()}:"],
+			prefix=[f"{self.redis.make_key(self.index.get_prefix(version)).decode()}:"],
 		)
 		schema = []
-		for field in self.schema:
+		for field in self.index.schema:
 			kwargs = {k: v for k, v in field.items() if k in ["weight", "sortable", "no_index", "no_stem"]}
 			if field.type == "tag":
 				schema.append(TagField(field.name, **kwargs))
 			else:
 				schema.append(TextField(field.name, **kwargs))
 
-		self.redis.ft(self.index_name).create_index(schema, definition=index_def)
-		self._index_exists = True
+		options = {}
+		if self.index.compact:
+			options = {"no_term_offsets": True, "no_highlight": True, "no_term_frequencies": True}
+		self.ft(version).create_index(schema, definition=index_def, **options)
 
-	def add_document(self, id, doc, payload=None):
-		doc = frappe._dict(doc)
-		doc_id = self.redis.make_key(f"{self.prefix}:{id}").decode()
-		mapping = {}
-		for field in self.schema:
-			if field.name in doc:
-				mapping[field.name] = cstr(doc[field.name])
-		if self.index_exists():
-			self.redis.ft(self.index_name).add_document(
-				doc_id, payload=json.dumps(payload), replace=True, **mapping
+	def index_exists(self, version):
+		try:
+			self.ft(version).info()
+			return True
+		except ResponseError:
+			return False
+
+	def drop_index(self, version):
+		try:
+			self.ft(version).dropindex(delete_documents=True)
+		except ResponseError:
+			# already dropped
+			pass
+
+	def add_documents(self, version, documents):
+		indexer = self.ft(version).batch_indexer(chunk_size=len(documents))
+		for id, mapping, payload in documents:
+			indexer.add_document(
+				self.get_doc_id(id, version),
+				payload=json.dumps(payload) if payload else None,
+				replace=True,
+				**mapping,
 			)
+		indexer.commit()
 
-	def remove_document(self, id):
-		key = self.redis.make_key(f"{self.prefix}:{id}").decode()
-		if self.index_exists():
-			self.redis.ft(self.index_name).delete_document(key)
+	def remove_documents(self, version, ids):
+		ft = self.ft(version)
+		pipeline = self.redis.pipeline(transaction=False)
+		for id in ids:
+			ft.delete_document(self.get_doc_id(id, version), conn=pipeline)
+		pipeline.execute()
 
-	def search(self, query, start=0, page_length=50, sort_by=None, highlight=False, with_payloads=False):
+	def search(self, version, query, start, page_length, sort_by, highlight, with_payloads, with_scores):
 		query = Query(query).paging(start, page_length)
 		if highlight:
 			query = query.highlight(tags=["<mark>", "</mark>"])
@@ -69,9 +467,11 @@ class Search:
 			query = query.sort_by(sort_field, asc=direction == "asc")
 		if with_payloads:
 			query = query.with_payloads()
+		if with_scores:
+			query = query.with_scores()
 
 		try:
-			result = self.redis.ft(self.index_name).search(query)
+			result = self.ft(version).search(query)
 		except ResponseError as e:
 			print(e)
 			return frappe._dict({"total": 0, "docs": [], "duration": 0})
@@ -85,19 +485,5 @@ class Search:
 			out.docs.append(_doc)
 		return out
 
-	def spellcheck(self, query, **kwargs):
-		return self.redis.ft(self.index_name).spellcheck(query, **kwargs)
-
-	def drop_index(self):
-		if self.index_exists():
-			self.redis.ft(self.index_name).dropindex(delete_documents=True)
-
-	def index_exists(self):
-		self._index_exists = getattr(self, "_index_exists", None)
-		if self._index_exists is None:
-			try:
-				self.redis.ft(self.index_name).info()
-				self._index_exists = True
-			except ResponseError:
-				self._index_exists = False
-		return self._index_exists
+	def spellcheck(self, version, query, **kwargs):
+		return self.ft(version).spellcheck(query, **kwargs)
@@ -0,0 +1,269 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+
+import json
+import os
+import re
+import sqlite3
+import time
+
+import frappe
+
+from gameplan.utils.search import SearchBackend
+
+TAG_FILTER = re.compile(r"@(\w+):\{([^}]*)\}")
+FIELD_GROUP = re.compile(r"@([\w|]+):\(([^)]*)\)")
+OR_OPERATOR = re.compile(r"\|")
+
+# max bound parameters per statement in older sqlite builds is 999
+MAX_PARAMS = 900
+
+
+class SQLiteSearchBackend(SearchBackend):
+	"""Search backend on a local SQLite database with FTS5, for Redis servers without the
+	RediSearch module. Documents are rows of a regular table and the text fields are indexed
+	by an external content FTS5 table that triggers keep in sync.
+
+	Supports the subset of the RediSearch query syntax that Gameplan generates: field groups
+	`@title|content:(terms)`, tag filters `@project:{a|b}`, prefix terms `term*`, `|` for OR and
+	`-term` to exclude a term. Fuzzy terms `%%term%%` are matched as prefixes since FTS5 has no
+	fuzzy matching."""
+
+	name = "sqlite"
+
+	def __init__(self, search) -> None:
+		super().__init__(search)
+		self.path = frappe.conf.get("gameplan_search_sqlite_path") or frappe.get_site_path(
+			"private", "gameplan_search.sqlite3"
+		)
+		self.fields = [field.name for field in search.schema]
+		self.text_fields = [field for field in search.schema if field.type != "tag"]
+		self._conn = None
+
+	@property
+	def conn(self):
+		if not self._conn:
+			os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+			self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+			self._conn.row_factory = sqlite3.Row
+			self._conn.execute("PRAGMA journal_mode=WAL")
+			self._conn.execute("PRAGMA synchronous=NORMAL")
+		return self._conn
+
+	def get_tables(self, version):
+		name = self.index.get_index_name(version)
+		return f'"{name}"', f'"{name}_fts"'
+
+	def create_index(self, version):
+		table, fts = self.get_tables(version)
+		name = self.index.get_index_name(version)
+		columns = ", ".join(f'"{field}" TEXT' for field in self.fields)
+		text_columns = ", ".join(f'"{field.name}"' for field in self.text_fields)
+		new_values = ", ".join(f'new."{field.name}"' for field in self.text_fields)
+		old_values = ", ".join(f'old."{field.name}"' for field in self.text_fields)
+		# without positions, like NOOFFSETS in RediSearch
+		detail = ", detail=column" if self.index.compact else ""
+
+		statements = [
+			f"""CREATE TABLE {table} (
+				rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, payload TEXT, {columns}
+			)""",
+			f"""CREATE VIRTUAL TABLE {fts} USING fts5(
+				{text_columns}, content={table}, content_rowid='rowid', tokenize='porter unicode61'{detail}
+			)""",
+			f"""CREATE TRIGGER "{name}_ai" AFTER INSERT ON {table} BEGIN
+				INSERT INTO {fts}(rowid, {text_columns}) VALUES (new.rowid, {new_values});
+			END""",
+			f"""CREATE TRIGGER "{name}_ad" AFTER DELETE ON {table} BEGIN
+				INSERT INTO {fts}({fts}, rowid, {text_columns}) VALUES ('delete', old.rowid, {old_values});
+			END""",
+			f"""CREATE TRIGGER "{name}_au" AFTER UPDATE ON {table} BEGIN
+				INSERT INTO {fts}({fts}, rowid, {text_columns}) VALUES ('delete', old.rowid, {old_values});
+				INSERT INTO {fts}(rowid, {text_columns}) VALUES (new.rowid, {new_values});
+			END""",
+		]
+		for field in self.index.schema:
+			if field.type == "tag" or field.sortable:
+				statements.append(f'CREATE INDEX "{name}_{field.name}" ON {table} ("{field.name}")')
+
+		with self.transaction():
+			for statement in statements:
+				self.conn.execute(statement)
+
+	def index_exists(self, version):
+		row = self.conn.execute(
+			"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+			(self.index.get_index_name(version),),
+		).fetchone()
+		return bool(row)
+
+	def drop_index(self, version):
+		table, fts = self.get_tables(version)
+		with self.transaction():
+			self.conn.execute(f"DROP TABLE IF EXISTS {fts}")
+			self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+	def add_documents(self, version, documents):
+		table, _fts = self.get_tables(version)
+		columns = ", ".join(f'"{field}"' for field in self.fields)
+		placeholders = ", ".join("?" for _ in self.fields)
+		updates = ", ".join(f'"{field}" = excluded."{field}"' for field in ["payload", *self.fields])
+		sql = f"""INSERT INTO {table} (id, payload, {columns}) VALUES (?, ?, {placeholders})
+			ON CONFLICT(id) DO UPDATE SET {updates}"""
+		rows = [
+			(id, json.dumps(payload) if payload else None, *(mapping.get(field) for field in self.fields))
+			for id, mapping, payload in documents
+		]
+		with self.transaction():
+			self.conn.executemany(sql, rows)
+
+	def remove_documents(self, version, ids):
+		table, _fts = self.get_tables(version)
+		ids = list(ids)
+		with self.transaction():
+			for i in range(0, len(ids), MAX_PARAMS):
+				batch = ids[i : i + MAX_PARAMS]
+				placeholders = ", ".join("?" for _ in batch)
+				self.conn.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", batch)
+
+	def search(self, version, query, start, page_length, sort_by, highlight, with_payloads, with_scores):
+		start_time = time.monotonic()
+		table, fts = self.get_tables(version)
+		match, excluded, tag_filters = self.parse_query(query)
+
+		conditions, values = [], []
+		if match:
+			conditions.append(f"{fts} MATCH ?")
+			values.append(match)
+		if excluded:
+			conditions.append(f"d.rowid NOT IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)")
+			values.append(excluded)
+		for field, tags in tag_filters.items():
+			if field not in self.fields:
+				continue
+			conditions.append(f'd."{field}" IN ({", ".join("?" for _ in tags)})')
+			values.extend(tags)
+		where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+		from_ = f"FROM {table} d JOIN {fts} ON {fts}.rowid = d.rowid" if match else f"FROM {table} d"
+
+		columns = ["d.id", "d.payload"]
+		for field in self.fields:
+			text_index = self.get_text_field_index(field)
+			if highlight and match and text_index is not None:
+				columns.append(f"highlight({fts}, {text_index}, '<mark>', '</mark>') AS \"{field}\"")
+			else:
+				columns.append(f'd."{field}"')
+		if match:
+			weights = ", ".join(str(field.weight or 1) for field in self.text_fields)
+			columns.append(f"-bm25({fts}, {weights}) AS score")
+		else:
+			columns.append("0 AS score")
+
+		if sort_by and sort_by.split(" ")[0] in self.fields:
+			parts = sort_by.split(" ")
+			direction = "DESC" if len(parts) > 1 and parts[1].lower() == "desc" else "ASC"
+			order_by = f'd."{parts[0]}" {direction}'
+		else:
+			order_by = "score DESC" if match else "d.rowid"
+
+		try:
+			total = self.conn.execute(f"SELECT COUNT(*) {from_} {where}", values).fetchone()[0]
+			rows = self.conn.execute(
+				f"SELECT {', '.join(columns)} {from_} {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+				[*values, page_length, start],
+			).fetchall()
+		except sqlite3.OperationalError:
+			frappe.log_error(title="Search query failed", message=f"{query}\n\n{frappe.get_traceback()}")
+			return frappe._dict({"total": 0, "docs": [], "duration": 0})
+
+		out = frappe._dict(docs=[], total=total)
+		for row in rows:
+			doc = frappe._dict({field: row[field] for field in self.fields if row[field] is not None})
+			doc.id = row["id"]
+			doc.payload = json.loads(row["payload"]) if with_payloads and row["payload"] else None
+			if with_scores:
+				doc.score = row["score"]
+			out.docs.append(doc)
+		out.duration = (time.monotonic() - start_time) * 1000
+		return out
+
+	def get_text_field_index(self, fieldname):
+		for i, field in enumerate(self.text_fields):
+			if field.name == fieldname:
+				return i
+
+	def parse_query(self, query):
+		"""Translate a RediSearch query into an FTS5 match expression, an expression of the documents
+		to leave out when the query has no terms to match, and tag filters"""
+		tag_filters = {}
+		for field, tags in TAG_FILTER.findall(query):
+			tag_filters[field] = [tag.strip().replace("\\", "") for tag in tags.split("|") if tag.strip()]
+		query = TAG_FILTER.sub(" ", query)
+
+		included, excluded = [], []
+		text_fieldnames = [field.name for field in self.text_fields]
+		for fields, terms in FIELD_GROUP.findall(query):
+			columns = [field for field in fields.split("|") if field in text_fieldnames]
+			if not columns:
+				continue
+			include, exclude = self.to_fts_terms(terms)
+			if include:
+				included.append(f"{{{' '.join(columns)}}} : ({include})")
+			if exclude:
+				excluded.append(f"{{{' '.join(columns)}}} : ({exclude})")
+		query = FIELD_GROUP.sub(" ", query)
+
+		include, exclude = self.to_fts_terms(query)
+		if include:
+			included.append(include)
+		if exclude:
+			excluded.append(exclude)
+
+		match, excluded = " AND ".join(included), " OR ".join(excluded)
+		if match and excluded:
+			# NOT needs a left operand in FTS5, so the query can only exclude from terms it matches
+			return f"({match}) NOT ({excluded})", "", tag_filters
+		return match, excluded, tag_filters
+
+	def to_fts_terms(self, text):
+		"""FTS5 expressions of the terms of `text` to match and of the terms excluded with `-`"""
+		terms, excluded = [], []
+		for token in OR_OPERATOR.sub(" | ", text).split():
+			if token == "|":
+				if terms and terms[-1] != "OR":
+					terms.append("OR")
+				continue
+			is_excluded = token.startswith("-")
+			is_fuzzy = token.startswith("%") and token.endswith("%")
+			token = token.lstrip("-").strip("%")
+			is_prefix = is_fuzzy or token.endswith("*")
+			token = token.rstrip("*").replace('"', "")
+			if not token:
+				continue
+			term = f'"{token}"' + (" *" if is_prefix else "")
+			if is_excluded:
+				# an excluded term is no alternative to the term before it
+				if terms and terms[-1] == "OR":
+					terms.pop()
+				excluded.append(term)
+			else:
+				terms.append(term)
+		if terms and terms[-1] == "OR":
+			terms.pop()
+		return " ".join(terms), " OR ".join(excluded)
+
+	def transaction(self):
+		return Transaction(self.conn)
+
+
+class Transaction:
+	def __init__(self, conn) -> None:
+		self.conn = conn
+
+	def __enter__(self):
+		self.conn.execute("BEGIN IMMEDIATE")
+		return self.conn
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -10,6 +10,8 @@ from urllib.parse import urlparse
 import frappe
 from bs4 import BeautifulSoup
 
+from gameplan.utils.content import get_mentions, remove_empty_trailing_tags
+
 
 def validate_url(url):
 	result = urlparse(url)
@@ -19,30 +21,20 @@ def validate_url(url):
 	return url if (result.scheme and result.netloc) else False
 
 
+def get_affected_rows():
+	"""Number of rows changed by the last statement run on the database connection"""
+	return frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+
+
 def extract_mentions(html):
 	if not html:
 		return []
-	soup = BeautifulSoup(html, "html.parser")
-	mentions = []
-	for d in soup.find_all("span", attrs={"data-type": "mention"}):
-		mentions.append(frappe._dict(full_name=d.get("data-label"), email=d.get("data-id")))
-	return mentions
+	return get_mentions(BeautifulSoup(html, "html.parser"))
 
 
 def remove_empty_trailing_paragraphs(html):
-	from bs4 import BeautifulSoup
-
-	soup = BeautifulSoup(html, "html.parser")
 	# remove p, br tags that are at the end with no content
-	all_tags = soup.find_all(True)
-	all_tags.reverse()
-	for tag in all_tags:
-		if tag.name in ["br", "p"] and not tag.contents:
-			tag.extract()
-		else:
-			# break on first non-empty tag
-			break
-	return str(soup)
+	return str(remove_empty_trailing_tags(BeautifulSoup(html, "html.parser")))
 
 
 def validate_type(func):
@@ -0,0 +1,215 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Visits of discussions and projects, buffered in Redis and written to the database in batches.
+
+A visit only sets the time of the visit in a Redis hash per doctype, keyed by the visited record
+and the visitor, so that opening a page no longer writes a row. `flush_visits` upserts the buffered
+visits in batches a few seconds later, from a job enqueued by the first visit after each flush and
+from the scheduler. Until then, readers merge the buffer over the visit tables with
+`get_last_visits`, `get_buffered_visitors` and `get_buffered_visits_of_user`.
+"""
+
+import re
+
+import frappe
+from frappe.utils import cstr, get_datetime
+
+from gameplan.access import get_project_teams
+
+VISITS_KEY = "gameplan:visits"
+FLUSH_SCHEDULED_KEY = "gameplan:visits:flush_scheduled"
+FLUSH_LOCK_KEY = "gameplan:visits:flush_lock"
+
+# visits are flushed at most this often, in seconds, besides the scheduler's runs
+FLUSH_INTERVAL = 5
+FLUSH_LOCK_TIMEOUT = 5 * 60
+BATCH_SIZE = 500
+
+# visit doctype and the field linking it to the visited record, by visited doctype
+VISIT_DOCTYPES = {
+	"GP Discussion": ("GP Discussion Visit", "discussion"),
+	"GP Project": ("GP Project Visit", "project"),
+}
+
+GLOB_CHARACTERS = re.compile(r"([*?\[\]\\])")
+
+
+def track_visit(doctype, name, user=None):
+	"""Buffer a visit of `name` of `doctype` by `user` and return its time"""
+	user = user or frappe.session.user
+	visited_at = frappe.utils.now()
+	cache = frappe.cache()
+	pipeline = cache.pipeline(transaction=False)
+	pipeline.hset(get_key(doctype), get_field(name, user), visited_at)
+	pipeline.set(cache.make_key(FLUSH_SCHEDULED_KEY), 1, nx=True, ex=FLUSH_INTERVAL)
+	_, schedule_flush = pipeline.execute()
+	if schedule_flush:
+		frappe.enqueue(
+			"gameplan.visits.flush_visits",
+			queue="short",
+			job_id="gameplan_flush_visits",
+			deduplicate=True,
+			enqueue_after_commit=True,
+		)
+	return visited_at
+
+
+def get_last_visits(doctype, names, user=None):
+	"""Last visit of each of `names` of `doctype` by `user`, from the buffer or the visit table"""
+	user = user or frappe.session.user
+	names = [cstr(name) for name in names]
+	if not names:
+		return {}
+
+	visits = get_buffered_visits(doctype, names, user)
+	visit_doctype, reference_field = VISIT_DOCTYPES[doctype]
+	rows = frappe.db.get_all(
+		visit_doctype,
+		filters={reference_field: ["in", names], "user": user},
+		fields=[reference_field, "last_visit"],
+	)
+	for row in rows:
+		name = cstr(row[reference_field])
+		visits[name] = max_visit(visits.get(name), row.last_visit)
+	return visits
+
+
+def get_buffered_visits(doctype, names, user):
+	"""Buffered visits of `names` of `doctype` by `user`, including the ones being flushed"""
+	fields = [get_field(name, user) for name in names]
+	pipeline = frappe.cache().pipeline(transaction=False)
+	for key in get_keys(doctype):
+		pipeline.hmget(key, fields)
+	visits = {}
+	for values in pipeline.execute():
+		for name, value in zip(names, values, strict=True):
+			if value:
+				visits[cstr(name)] = max_visit(visits.get(cstr(name)), frappe.safe_decode(value))
+	return visits
+
+
+def get_buffered_visitors(doctype, name):
+	"""Buffered visits of `name` of `doctype` by user"""
+	return scan_buffer(doctype, f"{escape(name)}:*", lambda field: field.split(":", 1)[1])
+
+
+def get_buffered_visits_of_user(doctype, user):
+	"""Buffered visits of records of `doctype` by `user`, by record"""
+	return scan_buffer(doctype, f"*:{escape(user)}", lambda field: field.split(":", 1)[0])
+
+
+def scan_buffer(doctype, match, get_key_of):
+	cache = frappe.cache()
+	visits = {}
+	for key in get_keys(doctype):
+		for field, value in cache.hscan_iter(key, match=match):
+			field = get_key_of(frappe.safe_decode(field))
+			visits[field] = max_visit(visits.get(field), frappe.safe_decode(value))
+	return visits
+
+
+def flush_visits():
+	"""Write the buffered visits to the visit tables. The buffer of each doctype is renamed aside
+	before it is read, so that visits made meanwhile go to a new buffer, and is deleted only after
+	the upserts commit. A buffer left aside by a failed flush is retried by the next one."""
+	cache = frappe.cache()
+	lock_key = cache.make_key(FLUSH_LOCK_KEY)
+	if not cache.set(lock_key, 1, nx=True, ex=FLUSH_LOCK_TIMEOUT):
+		return
+
+	try:
+		for doctype in VISIT_DOCTYPES:
+			flush_buffer(doctype)
+	finally:
+		cache.delete(lock_key)
+
+
+def flush_buffer(doctype):
+	cache = frappe.cache()
+	key, flushing_key = get_keys(doctype)
+	pipeline = cache.pipeline(transaction=False)
+	pipeline.exists(flushing_key)
+	pipeline.exists(key)
+	is_flushing, has_visits = pipeline.execute()
+	if not is_flushing:
+		if not has_visits:
+			return
+		cache.rename(key, flushing_key)
+
+	batch = []
+	for field, value in cache.hscan_iter(flushing_key, count=BATCH_SIZE):
+		name, user = frappe.safe_decode(field).split(":", 1)
+		batch.append((name, user, frappe.safe_decode(value)))
+		if len(batch) == BATCH_SIZE:
+			upsert_visits(doctype, batch)
+			batch = []
+	if batch:
+		upsert_visits(doctype, batch)
+
+	frappe.db.commit()
+	cache.delete(flushing_key)
+
+
+def upsert_visits(doctype, visits):
+	"""Insert or update the visit rows of `visits`, a list of (name, user, last_visit), with one
+	statement. Existing rows keep the later of both visits."""
+	now = frappe.utils.now()
+	if doctype == "GP Discussion":
+		existing = frappe.db.get_all(
+			"GP Discussion", filters={"name": ["in", [name for name, _user, _visit in visits]]}, pluck="name"
+		)
+		existing = {cstr(name) for name in existing}
+		values = [
+			(discussion, user, last_visit, now, now, user, user)
+			for discussion, user, last_visit in visits
+			if discussion in existing
+		]
+		columns = "name, discussion, `user`, last_visit, creation, modified, owner, modified_by"
+		row = "(NEXTVAL(`gp_discussion_visit_id_seq`), %s, %s, %s, %s, %s, %s, %s)"
+		table = "tabGP Discussion Visit"
+	else:
+		teams = get_project_teams()
+		values = [
+			(frappe.generate_hash(length=10), project, user, teams[project], last_visit, now, now, user, user)
+			for project, user, last_visit in visits
+			if project in teams
+		]
+		columns = "name, project, `user`, team, last_visit, creation, modified, owner, modified_by"
+		row = f"({', '.join(['%s'] * 9)})"
+		table = "tabGP Project Visit"
+
+	if not values:
+		return
+
+	frappe.db.sql(
+		f"""INSERT INTO `{table}` ({columns}) VALUES {", ".join([row] * len(values))}
+		ON DUPLICATE KEY UPDATE
+			last_visit = GREATEST(last_visit, VALUES(last_visit)),
+			modified = VALUES(modified)""",
+		[value for row_values in values for value in row_values],
+	)
+
+
+def get_key(doctype, suffix=""):
+	return frappe.cache().make_key(f"{VISITS_KEY}:{frappe.scrub(doctype)}{suffix}")
+
+
+def get_keys(doctype):
+	"""Keys of the buffer of `doctype` and of the buffer being flushed"""
+	return get_key(doctype), get_key(doctype, ":flushing")
+
+
+def get_field(name, user):
+	# names of discussions and projects are numbers, so the first colon ends them
+	return f"{name}:{user}"
+
+
+def escape(value):
+	return GLOB_CHARACTERS.sub(r"\\\1", cstr(value))
+
+
+def max_visit(*visits):
+	visits = [get_datetime(visit) for visit in visits if visit]
+	return max(visits) if visits else None